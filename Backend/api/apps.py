@@ -1,6 +1,14 @@
+import os
+
 from django.apps import AppConfig
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Precarga opcional de todos los modelos entrenados (por defecto se cargan al primer uso)
+        if os.environ.get('ML_PRELOAD_MODELS') == '1':
+            from .model_registry import model_registry
+            model_registry.warm()
@@ -0,0 +1,146 @@
+"""
+Caché de respuestas de los endpoints de solo lectura.
+
+Las respuestas se guardan en el caché ``api`` (ver CACHES en settings) con una
+clave que incluye la versión de los datos, la ruta y los parámetros. La versión
+combina el ``seq`` de ``sqlite_sequence`` para prediction (cambia con cada
+inserción) y el contador ``DataVersion`` (se incrementa con ``bump_data_version``
+tras ingestas o reconstrucciones). Al cambiar los datos cambian las claves: las
+entradas viejas no se vuelven a leer y el LRU las desaloja.
+
+Cada respuesta lleva un ``ETag`` derivado de la misma clave; si el cliente envía
+``If-None-Match`` con ese valor se responde 304 sin recalcular ni serializar.
+"""
+import hashlib
+import logging
+import os
+from datetime import date
+from functools import wraps
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'api'
+DATA_VERSION_NAME = 'prediction'
+DATA_VERSION_TABLE = DataVersion._meta.db_table
+
+_MISSING = object()
+
+
+class LRUFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache que desaloja por LRU en lugar de al azar: cada lectura
+    actualiza el mtime del archivo y ``_cull`` borra los menos usados.
+    La expiración se guarda dentro del archivo, así que tocar el mtime no la altera.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        try:
+            os.utime(self._key_to_file(key, version))
+        except FileNotFoundError:
+            pass
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+
+        def mtime(fname):
+            try:
+                return os.path.getmtime(fname)
+            except FileNotFoundError:
+                return 0
+
+        filelist.sort(key=mtime)
+        for fname in filelist[:num_entries // self._cull_frequency]:
+            self._delete(fname)
+
+
+def data_version():
+    """Versión actual de los datos de prediction (una consulta), o None si no se puede leer."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT (SELECT seq FROM sqlite_sequence WHERE name = 'prediction'), "
+                f"(SELECT version FROM {DATA_VERSION_TABLE} WHERE name = %s)",
+                [DATA_VERSION_NAME],
+            )
+            seq, version = cursor.fetchone()
+    except Exception as e:
+        logger.error(f"Error reading data version: {str(e)}")
+        return None
+    return f"{seq or 0}.{version or 0}"
+
+
+def bump_data_version():
+    """Invalidar las respuestas cacheadas tras cambios que no pasan por sqlite_sequence (ediciones, borrados)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {DATA_VERSION_TABLE} (name, version, updated_at) VALUES (%s, 1, %s) "
+            f"ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+            [DATA_VERSION_NAME, timezone.now()],
+        )
+
+
+def _cache_key(request, version, vary_on_day):
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.query_params.lists()))
+    raw = f'{request.path}?{query}'
+    if vary_on_day:
+        raw += f'@{date.today().isoformat()}'
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return f'response:{version}:{digest}', f'"{version}-{digest[:16]}"'
+
+
+def cache_response(vary_on_day=False):
+    """
+    Decorador para vistas ``@api_view`` de solo lectura (va debajo de ``@api_view``).
+    Solo se cachean respuestas 200 de DRF; los flujos (StreamingHttpResponse) y los
+    errores pasan sin tocar. ``vary_on_day`` agrega la fecha actual a la clave para
+    vistas cuyo resultado depende de ``now()`` (dashboard).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            version = data_version()
+            if version is None:
+                return view(request, *args, **kwargs)
+
+            key, etag = _cache_key(request, version, vary_on_day)
+            client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+            if etag in client_etags or '*' in client_etags:
+                return _with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+            cache = caches[CACHE_ALIAS]
+            data = cache.get(key, _MISSING)
+            if data is not _MISSING:
+                return _with_etag(Response(data), etag)
+
+            response = view(request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data)
+                _with_etag(response, etag)
+            return response
+        return wrapper
+    return decorator
+
+
+def _with_etag(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,265 @@
+"""
+Índices y columnas auxiliares para la tabla ``prediction``.
+
+La tabla es ``managed = False``, así que Django no crea índices por su cuenta.
+Este módulo concentra el DDL vigente (lo usa el comando ``optimize_prediction_db``)
+y las consultas representativas de cada endpoint para poder comparar su
+``EXPLAIN QUERY PLAN`` antes y después. Las migraciones guardan su propia copia
+del SQL de sus índices y la aplican con ``apply_indexes``: cambiar los
+diccionarios de aquí no altera lo que hace una migración ya publicada.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Año del evento como columna real (almacenada). SQLite no permite agregar columnas
+# generadas STORED con ALTER TABLE y las VIRTUAL no cuentan para índices covering,
+# así que se rellena con un backfill y se mantiene con triggers.
+EVENT_YEAR_EXPR = "CAST(substr({0}event_date, 1, 4) AS INTEGER)"
+
+EVENT_YEAR_COLUMN_SQL = [
+    "ALTER TABLE prediction ADD COLUMN event_year INTEGER",
+    f"UPDATE prediction SET event_year = {EVENT_YEAR_EXPR.format('')}",
+]
+
+EVENT_YEAR_TRIGGERS = {
+    'trg_prediction_event_year_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_prediction_event_year_insert
+        AFTER INSERT ON prediction
+        WHEN NEW.event_year IS NOT {EVENT_YEAR_EXPR.format('NEW.')}
+        BEGIN
+            UPDATE prediction SET event_year = {EVENT_YEAR_EXPR.format('NEW.')}
+            WHERE record_id = NEW.record_id;
+        END
+    """,
+    'trg_prediction_event_year_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_prediction_event_year_update
+        AFTER UPDATE OF event_date, event_year ON prediction
+        WHEN NEW.event_year IS NOT {EVENT_YEAR_EXPR.format('NEW.')}
+        BEGIN
+            UPDATE prediction SET event_year = {EVENT_YEAR_EXPR.format('NEW.')}
+            WHERE record_id = NEW.record_id;
+        END
+    """,
+}
+
+# SQLite no tiene INCLUDE: las columnas agregadas van al final de la clave para
+# que los índices sean "covering" (sin volver a leer la tabla).
+PREDICTION_INDEXES = {
+    # Filtros por país + orden por fecha + agregados (countries/, all-years/, details)
+    'idx_prediction_country_date': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_country_date ON prediction (
+            country_code, event_date,
+            max_mag_last90d, prob_m45_next7d, prob_m50_next30d, prob_m60_next90d
+        )
+    """,
+    # Filtros por año (y país dentro del año) para statistics/year/ y countries/<c>/year/
+    'idx_prediction_year_country': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_year_country ON prediction (
+            event_year, country_code, event_date,
+            max_mag_last90d, prob_m45_next7d, prob_m50_next30d, prob_m60_next90d
+        )
+    """,
+    # Rangos de fecha sin país fijo (dashboard/, historial global)
+    'idx_prediction_date_country': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_date_country ON prediction (
+            event_date, country_code, max_mag_last90d
+        )
+    """,
+}
+
+# Paginación por cursor (api/pagination.py): ORDER BY event_date DESC, record_id DESC.
+# record_id es el rowid y va implícito al final de cada índice, así que terminar la
+# clave en event_date da el orden completo sin ordenar en un B-tree temporal.
+KEYSET_INDEXES = {
+    'idx_prediction_country_date_keyset': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_country_date_keyset ON prediction (
+            country_code, event_date
+        )
+    """,
+    'idx_prediction_country_year_keyset': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_country_year_keyset ON prediction (
+            country_code, event_year, event_date
+        )
+    """,
+}
+
+# Clave natural del catálogo (id de evento estilo USGS): destino del UPSERT de api/ingest.py
+INGEST_INDEXES = {
+    'idx_prediction_cell_id': """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_prediction_cell_id ON prediction (cell_id)
+    """,
+}
+
+# Todos los índices del esquema vigente (optimize_prediction_db, ingesta diferida y tests)
+ALL_PREDICTION_INDEXES = {**PREDICTION_INDEXES, **KEYSET_INDEXES, **INGEST_INDEXES}
+
+SAMPLE_COUNTRY = 'Chile'
+SAMPLE_YEAR = 2024
+SAMPLE_DATE = '2025-08-01'
+SOUTH_AMERICAN_COUNTRIES = [
+    'Argentina', 'Bolivia', 'Brazil', 'Chile', 'Colombia',
+    'Ecuador', 'Guyana', 'Paraguay', 'Peru', 'Suriname',
+    'Uruguay', 'Venezuela'
+]
+_IN_COUNTRIES = ','.join(['?'] * len(SOUTH_AMERICAN_COUNTRIES))
+
+# Consultas representativas por endpoint: (sql anterior, sql actual, parámetros anteriores, parámetros actuales)
+ENDPOINT_QUERIES = {
+    'countries/south-american/': (
+        "SELECT COUNT(*), AVG(max_mag_last90d), MAX(max_mag_last90d), AVG(prob_m45_next7d), "
+        "AVG(prob_m50_next30d), AVG(prob_m60_next90d), MAX(event_date) FROM prediction WHERE country_code = ?",
+        None, [SAMPLE_COUNTRY], None,
+    ),
+    'countries/<c>/': (
+        "SELECT country_code, event_date, location, max_mag_last90d FROM prediction "
+        "WHERE country_code = ? ORDER BY event_date DESC LIMIT 10",
+        None, [SAMPLE_COUNTRY], None,
+    ),
+    'statistics/year/<y>/': (
+        "SELECT COUNT(*), AVG(max_mag_last90d), MAX(max_mag_last90d), MIN(event_date), MAX(event_date) "
+        "FROM prediction WHERE strftime('%Y', event_date) = ?",
+        "SELECT COUNT(*), AVG(max_mag_last90d), MAX(max_mag_last90d), MIN(event_date), MAX(event_date) "
+        "FROM prediction WHERE event_year = ?",
+        [str(SAMPLE_YEAR)], [SAMPLE_YEAR],
+    ),
+    'countries/<c>/year/<y>/ (eventos)': (
+        "SELECT event_date, location, max_mag_last90d, prob_m45_next7d, prob_m50_next30d, prob_m60_next90d "
+        "FROM prediction WHERE country_code = ? AND strftime('%Y', event_date) = ? ORDER BY event_date DESC",
+        "SELECT event_date, location, max_mag_last90d, prob_m45_next7d, prob_m50_next30d, prob_m60_next90d "
+        "FROM prediction WHERE country_code = ? AND event_year = ? ORDER BY event_date DESC",
+        [SAMPLE_COUNTRY, str(SAMPLE_YEAR)], [SAMPLE_COUNTRY, SAMPLE_YEAR],
+    ),
+    'countries/<c>/all-years/': (
+        "SELECT substr(event_date, 1, 4), COUNT(*), AVG(max_mag_last90d), MAX(max_mag_last90d) "
+        "FROM prediction WHERE country_code = ? GROUP BY substr(event_date, 1, 4)",
+        "SELECT event_year, COUNT(*), AVG(max_mag_last90d), MAX(max_mag_last90d) "
+        "FROM prediction WHERE country_code = ? GROUP BY event_year",
+        [SAMPLE_COUNTRY], None,
+    ),
+    'statistics/all-years/': (
+        "SELECT COUNT(*), AVG(max_mag_last90d), MAX(max_mag_last90d), MIN(event_date), MAX(event_date) "
+        f"FROM prediction WHERE country_code IN ({_IN_COUNTRIES})",
+        None, SOUTH_AMERICAN_COUNTRIES, None,
+    ),
+    'dashboard/': (
+        "SELECT country_code, COUNT(*), AVG(max_mag_last90d), MAX(max_mag_last90d), MAX(event_date) "
+        f"FROM prediction WHERE event_date >= ? AND country_code IN ({_IN_COUNTRIES}) GROUP BY country_code",
+        None, [SAMPLE_DATE] + SOUTH_AMERICAN_COUNTRIES, None,
+    ),
+    'countries/<c>/year/<y>/ (página por cursor)': (
+        "SELECT event_date, location, max_mag_last90d, record_id FROM prediction "
+        "WHERE country_code = ? AND event_year = ? AND (event_date, record_id) < (?, ?) "
+        "ORDER BY event_date DESC, record_id DESC LIMIT 101",
+        None, [SAMPLE_COUNTRY, SAMPLE_YEAR, SAMPLE_DATE, 2 ** 62], None,
+    ),
+    'predictions/history': (
+        "SELECT country_code, event_date, max_mag_last90d FROM prediction ORDER BY event_date DESC LIMIT 100",
+        None, [], None,
+    ),
+}
+
+
+def prediction_table_exists(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prediction'")
+    return cursor.fetchone() is not None
+
+
+def prediction_columns(cursor):
+    cursor.execute("PRAGMA table_info(prediction)")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def apply_event_year(cursor):
+    """Agregar la columna event_year (con backfill) y sus triggers si faltan; devuelve las acciones realizadas."""
+    actions = []
+    if 'event_year' not in prediction_columns(cursor):
+        for sql in EVENT_YEAR_COLUMN_SQL:
+            cursor.execute(sql)
+        actions.append('ADD COLUMN event_year (backfill)')
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'prediction'")
+    existing_triggers = {row[0] for row in cursor.fetchall()}
+    for name, sql in EVENT_YEAR_TRIGGERS.items():
+        if name not in existing_triggers:
+            cursor.execute(sql)
+            actions.append(f'CREATE TRIGGER {name}')
+    return actions
+
+
+def apply_indexes(cursor, indexes):
+    """
+    Crear los índices de ``indexes`` (nombre -> SQL) que falten y ejecutar ANALYZE.
+    Es idempotente; devuelve la lista de acciones realizadas.
+    """
+    if not prediction_table_exists(cursor):
+        logger.warning("Table 'prediction' not found; skipping index creation")
+        return []
+
+    actions = []
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'prediction'")
+    existing = {row[0] for row in cursor.fetchall()}
+    for name, sql in indexes.items():
+        if name not in existing:
+            cursor.execute(sql)
+            actions.append(f'CREATE INDEX {name}')
+
+    cursor.execute("ANALYZE prediction")
+    actions.append('ANALYZE prediction')
+    logger.info(f"Prediction indexes applied: {actions}")
+    return actions
+
+
+def apply_prediction_indexes(cursor):
+    """
+    Crear la columna event_year (con sus triggers), los índices covering y ejecutar ANALYZE.
+    Es idempotente; devuelve la lista de acciones realizadas.
+    """
+    if not prediction_table_exists(cursor):
+        logger.warning("Table 'prediction' not found; skipping index creation")
+        return []
+    return apply_event_year(cursor) + apply_indexes(cursor, ALL_PREDICTION_INDEXES)
+
+
+def drop_indexes(cursor, names):
+    for name in names:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def drop_event_year(cursor):
+    """Revertir apply_event_year (los índices sobre event_year tienen que haberse borrado antes)."""
+    for name in EVENT_YEAR_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    if 'event_year' in prediction_columns(cursor):
+        cursor.execute("ALTER TABLE prediction DROP COLUMN event_year")
+
+
+def drop_prediction_indexes(cursor):
+    """Revertir apply_prediction_indexes."""
+    if not prediction_table_exists(cursor):
+        return
+    drop_indexes(cursor, ALL_PREDICTION_INDEXES)
+    drop_event_year(cursor)
+
+
+def explain_query_plan(raw_connection, sql, params):
+    """
+    Devolver las líneas de detalle de EXPLAIN QUERY PLAN para una consulta.
+    Recibe la conexión sqlite3 subyacente (``connection.connection``) porque el
+    SQL de ENDPOINT_QUERIES usa el estilo de parámetros ``?``.
+    """
+    rows = raw_connection.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def endpoint_query_plans(raw_connection, legacy=False):
+    """EXPLAIN QUERY PLAN de cada endpoint (con el SQL anterior o el actual)."""
+    plans = {}
+    for endpoint, (legacy_sql, sql, legacy_params, params) in ENDPOINT_QUERIES.items():
+        if legacy:
+            plans[endpoint] = explain_query_plan(raw_connection, legacy_sql, legacy_params)
+        else:
+            plans[endpoint] = explain_query_plan(
+                raw_connection, sql or legacy_sql, params if params is not None else legacy_params
+            )
+    return plans
@@ -0,0 +1,185 @@
+"""
+Features sísmicos de ventana móvil calculados de forma incremental a partir de eventos crudos.
+
+Las columnas ``eq_count_m3_last7d``, ``eq_count_m4_last30d``, ``max_mag_last90d``,
+``energy_sum_last365d``, ``days_since_last_m5``, ``gr_b_value_last365d``,
+``gr_a_value_last365d`` y ``aftershock_rate`` de prediction se calculan fuera de
+línea. ``FeatureEngine`` las deriva de un flujo de eventos ``(celda, día, magnitud)``
+manteniendo por celda el estado de cada ventana, de modo que agregar un día de
+eventos cuesta O(eventos nuevos) en lugar de releer un año de historia por celda:
+
+  - conteos (7 y 30 días): una cola con los días de los eventos que superan el umbral
+  - máximo de 90 días y mínimo de 365 días: colas monótonas (cada evento entra y
+    sale una sola vez)
+  - energía, cantidad y suma de magnitudes de 365 días: sumas corrientes; la energía
+    se acumula en enteros para que restar un evento grande al salir de la ventana
+    no deje error de redondeo
+
+Un día ``d`` incluye en la ventana de N días los eventos de los días ``d - N + 1``
+a ``d``. Gutenberg-Richter usa el estimador de Aki con la magnitud mínima de la
+ventana como magnitud de completitud: ``b = log10(e) / (media - Mmin)`` y
+``a = log10(N) + b * Mmin`` (las mismas relaciones que cumplen las columnas de prediction).
+
+La ingesta (``ingest_catalog(derive_features=True)``, ``manage.py ingest_catalog
+--derive-features``) lo usa para completar estas columnas a partir de la magnitud
+de cada evento del catálogo.
+"""
+import math
+from collections import deque
+from datetime import date
+
+M3_WINDOW_DAYS = 7
+M4_WINDOW_DAYS = 30
+MAX_MAG_WINDOW_DAYS = 90
+YEAR_WINDOW_DAYS = 365
+GR_MIN_EVENTS = 5
+LOG10_E = math.log10(math.e)
+
+FEATURE_COLUMNS = [
+    'eq_count_m3_last7d', 'eq_count_m4_last30d', 'max_mag_last90d', 'energy_sum_last365d',
+    'days_since_last_m5', 'gr_b_value_last365d', 'gr_a_value_last365d', 'aftershock_rate',
+]
+
+
+def event_energy(magnitude):
+    """Energía liberada en joules (Gutenberg-Richter: log10 E = 1.5 M + 4.8), redondeada a entero."""
+    return round(10 ** (1.5 * magnitude + 4.8))
+
+
+def _day(value):
+    return value.toordinal() if isinstance(value, date) else int(value)
+
+
+class CellWindows:
+    """Estado de las ventanas móviles de una celda."""
+
+    def __init__(self):
+        self.day = None
+        self.m3_days = deque()
+        self.m4_days = deque()
+        # (día, magnitud) con magnitudes decrecientes / crecientes: el frente es el máximo / mínimo
+        self.max_90 = deque()
+        self.min_365 = deque()
+        # (día, magnitud, energía) de los últimos 365 días y sus sumas
+        self.year = deque()
+        self.energy_sum = 0
+        self.magnitude_sum = 0.0
+        self.last_m5_day = None
+
+    def advance(self, day):
+        """Mover el final de las ventanas a ``day`` y descartar lo que quedó fuera."""
+        if self.day is not None and day < self.day:
+            raise ValueError(f"Los eventos deben llegar en orden de fecha ({date.fromordinal(day)} < "
+                             f"{date.fromordinal(self.day)})")
+        self.day = day
+        _expire_days(self.m3_days, day - M3_WINDOW_DAYS)
+        _expire_days(self.m4_days, day - M4_WINDOW_DAYS)
+        _expire_front(self.max_90, day - MAX_MAG_WINDOW_DAYS)
+        _expire_front(self.min_365, day - YEAR_WINDOW_DAYS)
+        cutoff = day - YEAR_WINDOW_DAYS
+        year = self.year
+        while year and year[0][0] <= cutoff:
+            _, magnitude, energy = year.popleft()
+            self.energy_sum -= energy
+            self.magnitude_sum -= magnitude
+        if not year:
+            # Sin eventos la suma de flotantes vuelve a cero exacto
+            self.magnitude_sum = 0.0
+
+    def add(self, day, magnitude):
+        self.advance(day)
+        if magnitude >= 3:
+            self.m3_days.append(day)
+        if magnitude >= 4:
+            self.m4_days.append(day)
+        if magnitude >= 5:
+            self.last_m5_day = day
+        while self.max_90 and self.max_90[-1][1] <= magnitude:
+            self.max_90.pop()
+        self.max_90.append((day, magnitude))
+        while self.min_365 and self.min_365[-1][1] >= magnitude:
+            self.min_365.pop()
+        self.min_365.append((day, magnitude))
+        energy = event_energy(magnitude)
+        self.year.append((day, magnitude, energy))
+        self.energy_sum += energy
+        self.magnitude_sum += magnitude
+
+    def features(self, day=None):
+        """Features al final de ``day`` (por defecto, el último día visto)."""
+        if day is not None:
+            self.advance(day)
+        day = self.day
+        count_m3 = len(self.m3_days)
+        events = len(self.year)
+        b_value = a_value = None
+        if events >= GR_MIN_EVENTS:
+            min_magnitude = self.min_365[0][1]
+            spread = self.magnitude_sum / events - min_magnitude
+            if spread > 1e-9:
+                b_value = LOG10_E / spread
+                a_value = math.log10(events) + b_value * min_magnitude
+        return {
+            'eq_count_m3_last7d': count_m3,
+            'eq_count_m4_last30d': len(self.m4_days),
+            'max_mag_last90d': self.max_90[0][1] if self.max_90 else None,
+            'energy_sum_last365d': float(self.energy_sum),
+            'days_since_last_m5': day - self.last_m5_day if self.last_m5_day is not None else None,
+            'gr_b_value_last365d': b_value,
+            'gr_a_value_last365d': a_value,
+            'aftershock_rate': count_m3 / M3_WINDOW_DAYS,
+        }
+
+
+def _expire_days(days, cutoff):
+    while days and days[0] <= cutoff:
+        days.popleft()
+
+
+def _expire_front(entries, cutoff):
+    while entries and entries[0][0] <= cutoff:
+        entries.popleft()
+
+
+class FeatureEngine:
+    """
+    Ventanas móviles por celda alimentadas con eventos crudos en orden de fecha.
+    Las fechas pueden ser ``date`` o días ordinales (``date.toordinal()``).
+    """
+
+    def __init__(self):
+        self.cells = {}
+
+    def _cell(self, cell):
+        windows = self.cells.get(cell)
+        if windows is None:
+            windows = self.cells[cell] = CellWindows()
+        return windows
+
+    def append(self, events):
+        """
+        Agregar eventos ``(celda, fecha, magnitud)`` posteriores (o iguales) a los ya vistos.
+        Devuelve el conjunto de celdas modificadas.
+        """
+        touched = set()
+        for cell, day, magnitude in events:
+            self._cell(cell).add(_day(day), magnitude)
+            touched.add(cell)
+        return touched
+
+    def features(self, cell, day=None):
+        """Features de ``cell`` al final de ``day`` (por defecto, su último día con eventos)."""
+        return self._cell(cell).features(None if day is None else _day(day))
+
+    def features_for_events(self, events):
+        """
+        Features de cada evento con la historia previa de su celda (sin el propio
+        evento) y luego agregarlo: las filas que guarda prediction para cada evento.
+        """
+        rows = []
+        for cell, day, magnitude in events:
+            windows = self._cell(cell)
+            day = _day(day)
+            rows.append(windows.features(day))
+            windows.add(day, magnitude)
+        return rows
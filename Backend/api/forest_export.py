@@ -0,0 +1,141 @@
+"""
+Exportación compacta de los bosques aleatorios para inferencia.
+
+``compact_model`` aplana todos los árboles de un RandomForestClassifier /
+RandomForestRegressor (o de un ``TargetRegressor``) en arreglos contiguos de
+nodos: ``feature``, ``threshold``, ``children`` (``left`` y ``right`` intercalados)
+y ``value``. Los hijos se guardan como índices globales y cada hoja apunta a sí
+misma, así que el recorrido es el mismo para todos los nodos: ``depth`` pasos de
+``take`` vectorizado sobre una matriz (filas x árboles) de nodos actuales, sin
+llamadas por árbol. Las filas se recorren en bloques de ``BLOCK_ROWS`` para que
+los índices intermedios quepan en caché.
+
+Los arreglos se guardan sin comprimir con joblib (``save_models``), de modo que
+``joblib.load(path, mmap_mode='r')`` los mapea desde disco en lugar de copiarlos.
+Las predicciones coinciden con ``predict`` de scikit-learn: X se compara en
+float32 como en los árboles y los valores de las hojas se suman en el mismo orden.
+"""
+import numpy as np
+
+CLASSIFIER = 'classifier'
+REGRESSOR = 'regressor'
+BLOCK_ROWS = 256
+
+
+class CompactForest:
+    """Bosque aplanado en arreglos de nodos, con ``predict`` vectorizado."""
+
+    def __init__(self, kind, roots, feature, threshold, children, value, depth, classes=None):
+        self.kind = kind
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * i] es el hijo izquierdo del nodo i y children[2 * i + 1] el derecho
+        self.children = children
+        self.value = value
+        self.depth = depth
+        self.classes = classes
+
+    @classmethod
+    def from_forest(cls, forest):
+        is_classifier = hasattr(forest, 'classes_')
+        if is_classifier and forest.n_outputs_ != 1:
+            raise ValueError('Solo se exportan clasificadores de una salida')
+
+        roots, features, thresholds, lefts, rights, values = [], [], [], [], [], []
+        offset, depth = 0, 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left < 0
+
+            roots.append(offset)
+            # Las hojas se apuntan a sí mismas y comparan la columna 0: el recorrido no cambia
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+
+            if is_classifier:
+                # Desde scikit-learn 1.4 tree_.value guarda fracciones por clase (lo que devuelve predict_proba)
+                value = tree.value[:, 0, :forest.n_classes_]
+            else:
+                value = tree.value[:, :, 0]
+            values.append(value)
+
+            offset += tree.node_count
+            depth = max(depth, tree.max_depth)
+
+        return cls(
+            kind=CLASSIFIER if is_classifier else REGRESSOR,
+            roots=np.asarray(roots, dtype=np.intp),
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            children=np.column_stack([np.concatenate(lefts), np.concatenate(rights)]).astype(np.intp).ravel(),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            depth=depth,
+            classes=forest.classes_ if is_classifier else None,
+        )
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def left(self):
+        return self.children[0::2]
+
+    @property
+    def right(self):
+        return self.children[1::2]
+
+    def apply(self, X):
+        """Índice de la hoja alcanzada por cada fila en cada árbol (filas x árboles)."""
+        return np.concatenate([self._apply_block(block) for block in self._blocks(X)])
+
+    @staticmethod
+    def _blocks(X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return [X[start:start + BLOCK_ROWS] for start in range(0, max(len(X), 1), BLOCK_ROWS)]
+
+    def _apply_block(self, X):
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        nodes = np.repeat(self.roots[None, :], n_rows, axis=0)
+        for _ in range(self.depth):
+            values = flat.take(row_offsets + self.feature.take(nodes))
+            # Igual que scikit-learn: a la izquierda si X <= umbral (X sin NaN: el pipeline imputa)
+            go_right = values > self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_right)
+        return nodes
+
+    def _mean_value(self, X):
+        # (árboles x filas x valores) sumado sobre el primer eje: árbol por árbol, como scikit-learn
+        total = np.concatenate([
+            self.value.take(self._apply_block(block).T, axis=0).sum(axis=0) for block in self._blocks(X)
+        ])
+        return total / self.n_estimators
+
+    def predict_proba(self, X):
+        return self._mean_value(X)
+
+    def predict(self, X):
+        mean = self._mean_value(X)
+        if self.kind == CLASSIFIER:
+            return self.classes.take(np.argmax(mean, axis=1))
+        return mean[:, 0] if mean.shape[1] == 1 else mean
+
+
+def compact_model(model):
+    """
+    Versión compacta de un modelo entrenado. Un ``TargetRegressor`` conserva su
+    escala de objetivos y reemplaza solo el bosque; otros modelos se devuelven tal cual.
+    """
+    forest = getattr(model, 'forest', model)
+    if not hasattr(forest, 'estimators_'):
+        return model
+    compact = CompactForest.from_forest(forest)
+    if forest is model:
+        return compact
+    return type(model)(compact, model.means, model.scales)
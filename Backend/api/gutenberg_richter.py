@@ -0,0 +1,140 @@
+"""
+Estimación Gutenberg-Richter (a, b y Mc) para todas las celdas a la vez.
+
+``estimate_gr`` recibe dos arreglos paralelos (celda y magnitud de cada evento) y
+calcula por celda, sin recorrer las celdas en Python:
+  - Mc por máxima curvatura: el intervalo de magnitud (``MAG_BIN``) más poblado del
+    histograma de la celda, más ``MAXC_CORRECTION`` (la máxima curvatura subestima Mc)
+  - b por máxima verosimilitud de Aki-Utsu con magnitudes agrupadas en intervalos:
+    ``b = log10(e) / (media(M >= Mc) - (Mc - MAG_BIN / 2))``
+  - a = log10(N(M >= Mc)) + b * Mc
+
+Las magnitudes se pasan a índices enteros de intervalo una sola vez. Los
+histogramas de todas las celdas son un solo ``bincount`` sobre
+``celda * intervalos + intervalo`` y las medias, otro ``bincount`` con pesos.
+
+La incertidumbre (``bootstrap > 0``) se estima remuestreando con reemplazo los
+eventos de cada celda (todas las celdas en la misma operación) y volviendo a
+estimar; las réplicas se reparten en bloques entre procesos de un
+``ProcessPoolExecutor``. Celdas con menos de ``min_events`` eventos sobre Mc
+quedan en NaN.
+"""
+import math
+import multiprocessing
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .features import GR_MIN_EVENTS
+from .training import available_cores
+
+MAG_BIN = 0.1
+MAXC_CORRECTION = 0.2
+BOOTSTRAP_CHUNK = 25
+LOG10_E = math.log10(math.e)
+
+ESTIMATE_COLUMNS = ['mc', 'b_value', 'a_value', 'events']
+
+
+class _Catalog:
+    """Eventos agrupados por celda: códigos de celda e índices enteros de intervalo de magnitud."""
+
+    def __init__(self, cells, magnitudes, mag_bin=MAG_BIN):
+        magnitudes = np.asarray(magnitudes, dtype=np.float64)
+        valid = np.isfinite(magnitudes)
+        self.labels, codes = np.unique(np.asarray(cells)[valid], return_inverse=True)
+        magnitudes = magnitudes[valid]
+        self.mag_bin = mag_bin
+        self.origin = math.floor(magnitudes.min() / mag_bin) * mag_bin if len(magnitudes) else 0.0
+        bins = np.rint((magnitudes - self.origin) / mag_bin).astype(np.intp)
+        # Ordenado por celda: el bootstrap remuestrea dentro de [inicio, inicio + conteo) de cada celda
+        order = np.argsort(codes, kind='stable')
+        self.codes = codes[order]
+        self.bins = bins[order]
+        self.n_cells = len(self.labels)
+        self.n_bins = int(bins.max()) + 1 if len(bins) else 1
+        self.counts = np.bincount(self.codes, minlength=self.n_cells)
+        self.starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]]).astype(np.intp)
+
+
+def _estimate(codes, bins, n_cells, n_bins, origin, mag_bin, min_events, correction):
+    """(mc, b, a, eventos sobre Mc) por celda a partir de códigos e intervalos de cada evento."""
+    histogram = np.bincount(codes * n_bins + bins, minlength=n_cells * n_bins).reshape(n_cells, n_bins)
+    mc_bin = histogram.argmax(axis=1) + int(round(correction / mag_bin))
+    above = bins >= mc_bin[codes]
+    above_codes = codes[above]
+    events = np.bincount(above_codes, minlength=n_cells)
+    bin_sums = np.bincount(above_codes, weights=bins[above], minlength=n_cells)
+
+    mc = origin + mc_bin * mag_bin
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Media de (intervalo - intervalo de Mc) más medio intervalo: media(M) - (Mc - ΔM / 2)
+        spread = (bin_sums / events - mc_bin + 0.5) * mag_bin
+        b_value = LOG10_E / spread
+        a_value = np.log10(events) + b_value * mc
+    invalid = (events < min_events) | ~(spread > 0)
+    b_value[invalid] = np.nan
+    a_value[invalid] = np.nan
+    return mc, b_value, a_value, events
+
+
+def _bootstrap_chunk(catalog_arrays, replicates, seed, min_events, correction):
+    """Réplicas de bootstrap: arreglos (réplicas x celdas) de mc, b y a."""
+    codes, bins, starts, counts, n_cells, n_bins, origin, mag_bin = catalog_arrays
+    rng = np.random.default_rng(seed)
+    event_starts, event_counts = starts[codes], counts[codes]
+    results = []
+    for _ in range(replicates):
+        sample = event_starts + (rng.random(len(codes)) * event_counts).astype(np.intp)
+        results.append(_estimate(codes, bins[sample], n_cells, n_bins, origin, mag_bin, min_events, correction)[:3])
+    return tuple(np.stack(values) for values in zip(*results))
+
+
+def estimate_gr(cells, magnitudes, mag_bin=MAG_BIN, correction=MAXC_CORRECTION, min_events=GR_MIN_EVENTS,
+                bootstrap=0, workers=None, seed=0):
+    """
+    Mc, b y a de Gutenberg-Richter por celda. Devuelve un DataFrame indexado por
+    celda con ``mc``, ``b_value``, ``a_value`` y ``events`` (eventos sobre Mc); con
+    ``bootstrap`` réplicas agrega ``mc_std``, ``b_std`` y ``a_std``.
+    """
+    catalog = _Catalog(cells, magnitudes, mag_bin)
+    mc, b_value, a_value, events = _estimate(
+        catalog.codes, catalog.bins, catalog.n_cells, catalog.n_bins, catalog.origin, mag_bin, min_events, correction,
+    )
+    result = pd.DataFrame(
+        dict(zip(ESTIMATE_COLUMNS, (mc, b_value, a_value, events))), index=pd.Index(catalog.labels, name='cell'),
+    )
+    if bootstrap:
+        replicates = bootstrap_gr(catalog, bootstrap, workers, seed, min_events, correction)
+        with warnings.catch_warnings():
+            # Celdas sin réplicas válidas: nanstd avisa y devuelve NaN, que ya lo indica
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for name, values in zip(('mc_std', 'b_std', 'a_std'), replicates):
+                result[name] = np.nanstd(values, axis=0)
+    return result
+
+
+def bootstrap_gr(catalog, replicates, workers=None, seed=0, min_events=GR_MIN_EVENTS, correction=MAXC_CORRECTION):
+    """
+    Réplicas de bootstrap de (mc, b, a), cada una de forma (réplicas x celdas).
+    Los bloques de ``BOOTSTRAP_CHUNK`` réplicas se reparten entre ``workers`` procesos.
+    """
+    arrays = (catalog.codes, catalog.bins, catalog.starts, catalog.counts,
+              catalog.n_cells, catalog.n_bins, catalog.origin, catalog.mag_bin)
+    sizes = [min(BOOTSTRAP_CHUNK, replicates - start) for start in range(0, replicates, BOOTSTRAP_CHUNK)]
+    # Una semilla por bloque: el resultado no depende de cuántos procesos haya
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = max(1, min(workers or available_cores(), len(sizes)))
+
+    if workers == 1:
+        chunks = [_bootstrap_chunk(arrays, size, chunk_seed, min_events, correction)
+                  for size, chunk_seed in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            chunks = list(pool.map(
+                _bootstrap_chunk, [arrays] * len(sizes), sizes, seeds,
+                [min_events] * len(sizes), [correction] * len(sizes),
+            ))
+    return tuple(np.concatenate(values) for values in zip(*chunks))
@@ -0,0 +1,291 @@
+"""
+Ingesta masiva de catálogos sísmicos (CSV o NDJSON) en la tabla prediction.
+
+Los archivos usan los nombres de columna de prediction: ``cell_id`` (id de evento
+estilo USGS), ``country_code`` y ``event_date`` son obligatorias, el resto
+opcionales y las desconocidas se ignoran. Las filas se escriben con un solo
+``executemany`` por bloque de ``batch_size`` filas, una transacción por bloque,
+con UPSERT sobre ``cell_id`` (índice único ``idx_prediction_cell_id``): un evento
+que ya existe se actualiza solo en las columnas presentes en el archivo.
+
+El trabajo por fila lo hace SQLite dentro del mismo INSERT: vacíos a NULL,
+``event_date`` recortada a la fecha (acepta ``2025-08-28T12:34:56Z``) y
+``event_year`` calculado, así el trigger de event_year no actualiza cada fila
+después. La base pasa a WAL (persistente en el archivo: los lectores no bloquean
+la ingesta) y la conexión usa ``synchronous=NORMAL`` mientras dura.
+
+Mantener los índices covering de prediction fila por fila es lo que más cuesta.
+Con ``defer_indexes=True`` se borran antes de cargar (salvo el único sobre
+``cell_id``, que necesita el UPSERT) y se reconstruyen al final con
+``apply_prediction_indexes``: conviene para cargas grandes, pero mientras dura
+las consultas de la API recorren la tabla completa.
+
+Con ``derive_features=True`` el archivo trae además la magnitud de cada evento
+(columna ``mag``, como los catálogos de USGS) y las columnas de ventana móvil que
+no estén en el archivo (``features.FEATURE_COLUMNS``) se calculan al leerlo con
+``FeatureEngine``, en lugar de recalcularlas fuera de línea releyendo la historia
+de cada celda. La celda es ``(country_code, admin_region)``; los eventos deben
+venir en orden de fecha y la historia es la de los archivos de la misma llamada.
+
+Al terminar se incrementa ``DataVersion`` (el caché de respuestas y el snapshot
+Parquet quedan invalidados) y se actualizan los rollups, desde cero si hubo filas
+actualizadas.
+"""
+import csv
+import json
+import logging
+import time
+from contextlib import contextmanager
+from datetime import date
+from itertools import chain, islice
+from operator import itemgetter
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from .cache import bump_data_version
+from .db_optimization import (
+    ALL_PREDICTION_INDEXES, INGEST_INDEXES, apply_prediction_indexes, drop_indexes, prediction_columns,
+    prediction_table_exists,
+)
+from .features import FEATURE_COLUMNS, FeatureEngine
+from .models import EarthquakePrediction
+from .rollups import refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = 100_000
+INGEST_CACHE_KB = 64 * 1024
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+MAGNITUDE_COLUMN = 'mag'
+
+# Las obligatorias van primero: el filtro de filas incompletas mira las tres primeras posiciones
+REQUIRED_COLUMNS = ('cell_id', 'country_code', 'event_date')
+INGEST_COLUMNS = list(REQUIRED_COLUMNS) + [
+    field.column for field in EarthquakePrediction._meta.concrete_fields
+    if field.column not in REQUIRED_COLUMNS + ('record_id', 'event_year')
+]
+
+
+def detect_format(path):
+    try:
+        return FORMATS[Path(path).suffix.lower()]
+    except KeyError:
+        raise ValueError(f"Formato no reconocido para {path} (use .csv, .ndjson o .jsonl, o indique el formato)")
+
+
+def _columns(names):
+    missing = [column for column in REQUIRED_COLUMNS if column not in names]
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(missing)}")
+    return [column for column in INGEST_COLUMNS if column in names]
+
+
+def _extra_columns(names, extra):
+    missing = [column for column in extra if column not in names]
+    if missing:
+        raise ValueError(f"Faltan columnas para derivar features: {', '.join(missing)}")
+
+
+def _csv_rows(f, extra=()):
+    reader = csv.reader(f)
+    header = [name.strip() for name in next(reader, [])]
+    columns = _columns(header)
+    _extra_columns(header, extra)
+    # Las columnas de ``extra`` van al final de cada fila, después de ``columns``
+    indexes = [header.index(column) for column in columns + list(extra)]
+    # itemgetter arma la tupla en C en el orden de ``columns``
+    getter, width = itemgetter(*indexes), max(indexes) + 1
+    # Una línea corta (p. ej. el final de un archivo truncado) se entrega vacía: el filtro de
+    # obligatorias la cuenta como rechazada en lugar de cortar la ingesta con IndexError.
+    # Las líneas en blanco se saltan.
+    empty = ('',) * len(indexes)
+    return columns, (getter(row) if len(row) >= width else empty for row in reader if row)
+
+
+def _ndjson_rows(f, extra=()):
+    objects = map(json.loads, filter(str.strip, f))
+    first = next(objects, None)
+    if first is None:
+        return list(REQUIRED_COLUMNS), iter(())
+    columns = _columns(first)
+    _extra_columns(first, extra)
+    keys = columns + list(extra)
+    return columns, (tuple(map(obj.get, keys)) for obj in chain((first,), objects))
+
+
+def _event_day(value):
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _magnitude(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _with_features(columns, rows, engine):
+    """
+    Quitar la magnitud (última posición de cada fila) y agregar las columnas de
+    ventana móvil que falten, calculadas con la historia previa de la celda.
+    """
+    derived = [column for column in FEATURE_COLUMNS if column not in columns]
+    region = columns.index('admin_region') if 'admin_region' in columns else None
+    no_features = (None,) * len(derived)
+
+    def rows_with_features():
+        for *values, magnitude in rows:
+            day = _event_day(values[2]) if values[0] and values[1] else None
+            if day is None:
+                # La fila se rechaza (o no tiene fecha válida): no entra en la historia de la celda
+                yield (*values, *no_features)
+                continue
+            cell = (values[1], (values[region] or None) if region is not None else None)
+            magnitude = _magnitude(magnitude)
+            if magnitude is None:
+                features = engine.features(cell, day)
+            else:
+                features = engine.features_for_events([(cell, day, magnitude)])[0]
+            yield (*values, *map(features.get, derived))
+
+    return columns + derived, rows_with_features()
+
+
+def _upsert_sql(columns, with_year):
+    values = [
+        "substr(NULLIF(%s, ''), 1, 10)" if column == 'event_date' else "NULLIF(%s, '')" for column in columns
+    ]
+    targets = list(columns)
+    if with_year:
+        # ?3 vuelve a leer el tercer parámetro (event_date, ver REQUIRED_COLUMNS) sin enviarlo dos veces
+        targets.append('event_year')
+        values.append("CAST(substr(?3, 1, 4) AS INTEGER)")
+    updates = ', '.join(f"{column} = excluded.{column}" for column in targets if column != 'cell_id')
+    return (
+        f"INSERT INTO prediction ({', '.join(targets)}) VALUES ({', '.join(values)}) "
+        f"ON CONFLICT (cell_id) DO UPDATE SET {updates}"
+    )
+
+
+@contextmanager
+def bulk_load_settings(cursor):
+    """
+    Pasar la base a WAL (queda guardado en el archivo) y, mientras dura el bloque,
+    usar ``synchronous=NORMAL`` y una caché de páginas más grande. Devuelve el modo
+    de journal. Dentro de una transacción (o en una base en memoria) SQLite no
+    permite cambiarlos y se deja la conexión como está.
+    """
+    cursor.execute("PRAGMA journal_mode")
+    mode = cursor.fetchone()[0]
+    if connection.in_atomic_block or mode == 'memory':
+        yield mode
+        return
+
+    cursor.execute("PRAGMA journal_mode=WAL")
+    mode = cursor.fetchone()[0]
+    cursor.execute("PRAGMA synchronous")
+    synchronous = cursor.fetchone()[0]
+    cursor.execute("PRAGMA cache_size")
+    cache_size = cursor.fetchone()[0]
+    # Con WAL, NORMAL solo arriesga la última transacción ante un corte de luz, no la integridad
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # Las páginas de los índices se modifican en cada bloque: que quepan en caché
+    cursor.execute(f"PRAGMA cache_size=-{INGEST_CACHE_KB}")
+    try:
+        yield mode
+    finally:
+        cursor.execute(f"PRAGMA synchronous={int(synchronous)}")
+        cursor.execute(f"PRAGMA cache_size={int(cache_size)}")
+
+
+def ingest_catalog(paths, fmt=None, batch_size=INGEST_BATCH_SIZE, defer_indexes=False, on_batch=None,
+                   derive_features=False):
+    """
+    Cargar uno o más archivos de catálogo en prediction con UPSERT sobre ``cell_id``.
+    ``defer_indexes`` reconstruye los índices secundarios al final en lugar de
+    mantenerlos fila por fila. ``derive_features`` calcula las columnas de ventana
+    móvil a partir de la columna ``mag`` (ver el docstring del módulo). ``on_batch`` recibe las estadísticas acumuladas
+    tras cada bloque confirmado.
+    Devuelve un dict con filas leídas, insertadas, actualizadas, rechazadas,
+    segundos y filas por segundo.
+    """
+    start = time.perf_counter()
+    stats = {
+        'files': 0, 'rows': 0, 'inserted': 0, 'updated': 0, 'rejected': 0,
+        'journal_mode': None, 'index_seconds': 0.0,
+    }
+
+    with connection.cursor() as cursor:
+        if not prediction_table_exists(cursor):
+            raise ValueError("La tabla prediction no existe")
+        with_year = 'event_year' in prediction_columns(cursor)
+        # Un solo motor para todos los archivos: la historia de cada celda sigue de uno al siguiente
+        engine = FeatureEngine() if derive_features else None
+        with bulk_load_settings(cursor) as journal_mode:
+            stats['journal_mode'] = journal_mode
+            if defer_indexes:
+                drop_indexes(cursor, [name for name in ALL_PREDICTION_INDEXES if name not in INGEST_INDEXES])
+            try:
+                for path in paths:
+                    _ingest_file(
+                        cursor, path, fmt or detect_format(path), batch_size, with_year, stats, start, on_batch,
+                        engine,
+                    )
+                    stats['files'] += 1
+            finally:
+                if defer_indexes:
+                    index_start = time.perf_counter()
+                    with transaction.atomic():
+                        apply_prediction_indexes(cursor)
+                    stats['index_seconds'] = time.perf_counter() - index_start
+                # También si un archivo falla a mitad: los bloques ya confirmados quedan en la tabla
+                if stats['inserted'] or stats['updated']:
+                    bump_data_version()
+                    # Los rollups son incrementales por record_id: las filas actualizadas exigen reconstruirlos
+                    refresh_rollups(full=stats['updated'] > 0)
+
+    _update_rate(stats, start)
+    logger.info(
+        f"Catalog ingested: {stats['rows']} rows ({stats['inserted']} inserted, {stats['updated']} updated, "
+        f"{stats['rejected']} rejected) in {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s)"
+    )
+    return stats
+
+
+def _ingest_file(cursor, path, fmt, batch_size, with_year, stats, start, on_batch, engine=None):
+    readers = {'csv': _csv_rows, 'ndjson': _ndjson_rows}
+    if fmt not in readers:
+        raise ValueError(f"Formato desconocido: {fmt}")
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if engine is None:
+            columns, rows = readers[fmt](f)
+        else:
+            columns, rows = _with_features(*readers[fmt](f, (MAGNITUDE_COLUMN,)), engine)
+        sql = _upsert_sql(columns, with_year)
+        while batch := list(islice(rows, batch_size)):
+            valid = [row for row in batch if row[0] and row[1] and row[2]]
+            stats['rows'] += len(batch)
+            stats['rejected'] += len(batch) - len(valid)
+            if not valid:
+                continue
+            with transaction.atomic():
+                cursor.execute("SELECT COALESCE(MAX(record_id), 0) FROM prediction")
+                last_record_id = cursor.fetchone()[0]
+                cursor.executemany(sql, valid)
+                cursor.execute("SELECT COUNT(*) FROM prediction WHERE record_id > %s", [last_record_id])
+                inserted = cursor.fetchone()[0]
+            stats['inserted'] += inserted
+            stats['updated'] += len(valid) - inserted
+            if on_batch:
+                on_batch(_update_rate(stats, start))
+
+
+def _update_rate(stats, start):
+    stats['seconds'] = time.perf_counter() - start
+    stats['rows_per_second'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
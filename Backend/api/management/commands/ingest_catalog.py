@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.ingest import INGEST_BATCH_SIZE, ingest_catalog
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Cargar catálogos sísmicos (CSV o NDJSON) en prediction con UPSERT sobre cell_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Archivos .csv, .ndjson o .jsonl con columnas de prediction (cell_id, country_code y event_date obligatorias)',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'ndjson'],
+            help='Formato de los archivos (por defecto, según la extensión)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=INGEST_BATCH_SIZE,
+            help=f'Filas por transacción (por defecto {INGEST_BATCH_SIZE:,})',
+        )
+        parser.add_argument(
+            '--defer-indexes',
+            action='store_true',
+            help='Borrar los índices secundarios durante la carga y reconstruirlos al final (cargas grandes)',
+        )
+        parser.add_argument(
+            '--derive-features',
+            action='store_true',
+            help='Calcular las columnas de ventana móvil que falten a partir de la magnitud (columna mag) '
+                 'de cada evento; los eventos deben venir en orden de fecha',
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        batch_size = options['batch_size']
+
+        if batch_size < 1:
+            raise CommandError('--batch-size debe ser un entero positivo')
+        missing = [path for path in paths if not Path(path).is_file()]
+        if missing:
+            raise CommandError(f'No existe: {", ".join(missing)}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'📥 Ingestando {len(paths)} archivo(s) en "prediction"...')
+        )
+
+        def report(stats):
+            self.stdout.write(
+                f"  {stats['rows']:,} filas ({stats['rows_per_second']:,.0f} filas/s)"
+            )
+
+        try:
+            stats = ingest_catalog(
+                paths, fmt=options.get('format'), batch_size=batch_size,
+                defer_indexes=options.get('defer_indexes', False), on_batch=report,
+                derive_features=options.get('derive_features', False),
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error durante la ingesta: {str(e)}')
+            )
+            logger.error(f"Error ingesting catalog: {str(e)}")
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ {stats['rows']:,} filas en {stats['seconds']:.2f}s "
+                f"({stats['rows_per_second']:,.0f} filas/s, modo {stats['journal_mode']})"
+            )
+        )
+        if stats['index_seconds']:
+            self.stdout.write(f"  - Índices reconstruidos en {stats['index_seconds']:.2f}s")
+        self.stdout.write(f"  - Insertadas: {stats['inserted']:,}")
+        self.stdout.write(f"  - Actualizadas: {stats['updated']:,}")
+        if stats['rejected']:
+            self.stdout.write(
+                self.style.WARNING(f"  - Rechazadas (sin cell_id, country_code o event_date): {stats['rejected']:,}")
+            )
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from api.db_optimization import apply_prediction_indexes, endpoint_query_plans
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Crear índices covering y la columna event_year en prediction.db, y comparar EXPLAIN QUERY PLAN'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar los planes de consulta actuales, sin modificar la base de datos',
+        )
+
+    def _print_plans(self, title, plans):
+        self.stdout.write(f'\n{title}')
+        for endpoint, lines in plans.items():
+            self.stdout.write(f'  {endpoint}')
+            for line in lines:
+                self.stdout.write(f'    - {line}')
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+
+        self.stdout.write(
+            self.style.SUCCESS('🔧 Optimizando tabla "prediction"...')
+        )
+
+        try:
+            connection.ensure_connection()
+            raw = connection.connection
+
+            before = endpoint_query_plans(raw, legacy=True)
+            self._print_plans('📋 Planes ANTES (SQL anterior, sin índices nuevos):', before)
+
+            if dry_run:
+                self.stdout.write(self.style.WARNING('\n--dry-run: no se aplicaron cambios'))
+                return
+
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    actions = apply_prediction_indexes(cursor)
+
+            self.stdout.write('\n✅ Cambios aplicados:')
+            for action in actions:
+                self.stdout.write(f'  - {action}')
+
+            after = endpoint_query_plans(raw)
+            self._print_plans('📋 Planes DESPUÉS (SQL actual con event_year e índices covering):', after)
+
+            scans_before = sum(1 for lines in before.values() for l in lines if l.startswith('SCAN prediction'))
+            scans_after = sum(1 for lines in after.values() for l in lines if l.startswith('SCAN prediction'))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'\n✅ Recorridos completos de tabla: {scans_before} antes → {scans_after} después'
+                )
+            )
+
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error optimizando la base de datos: {str(e)}')
+            )
+            logger.error(f"Error optimizing prediction table: {str(e)}")
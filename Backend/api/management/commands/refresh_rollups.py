@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from api.rollups import refresh_rollups
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Actualizar los rollups por país/año/mes de la tabla prediction'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Reconstruir los rollups desde cero (necesario tras editar o borrar filas)',
+        )
+
+    def handle(self, *args, **options):
+        full = options.get('full', False)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'🔄 Actualizando rollups ({"completo" if full else "incremental"})...')
+        )
+
+        try:
+            start = time.perf_counter()
+            new_rows = refresh_rollups(full=full)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                self.style.SUCCESS(f'✅ {new_rows:,} registros nuevos agregados en {elapsed:.2f}s')
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error actualizando rollups: {str(e)}')
+            )
+            logger.error(f"Error refreshing rollups: {str(e)}")
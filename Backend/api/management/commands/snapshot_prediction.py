@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from api.snapshot import SNAPSHOT_BATCH_SIZE, SNAPSHOT_DIR, write_snapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Exportar la tabla prediction a un snapshot Parquet particionado por país y año'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            type=str,
+            default=str(SNAPSHOT_DIR),
+            help='Directorio de snapshots (por defecto PREDICTION_SNAPSHOT_DIR)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SNAPSHOT_BATCH_SIZE,
+            help='Filas leídas de la base de datos por bloque',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(f'📦 Exportando prediction a {options["dir"]}...')
+        )
+
+        try:
+            manifest = write_snapshot(options['dir'], batch_size=options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'✅ Snapshot {manifest["name"]}: {manifest["rows"]:,} filas en '
+                    f'{manifest["files"]} archivos ({manifest["seconds"]:.2f}s)'
+                )
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error exportando el snapshot: {str(e)}')
+            )
+            logger.error(f"Error writing prediction snapshot: {str(e)}")
@@ -1,6 +1,8 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from api.ml_service import ml_service
+from api.training import GLOBAL_JOB, available_cores, countries_with_data, plan_workers, train_all
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +15,26 @@ class Command(BaseCommand):
             type=str,
             help='País específico para entrenar (opcional)',
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Entrenar por bloques de N filas sobre todo el catálogo (sin el límite de 10.000 filas)',
+        )
+        parser.add_argument(
+            '--all-countries',
+            action='store_true',
+            help='Entrenar en paralelo cada país con datos y el modelo global',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Procesos en paralelo con --all-countries (por defecto, uno por núcleo)',
+        )
+        parser.add_argument(
+            '--cores',
+            type=int,
+            help='Núcleos totales a usar con --all-countries, repartidos entre procesos y n_jobs',
+        )
         parser.add_argument(
             '--force',
             action='store_true',
@@ -22,6 +44,12 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         country = options.get('country')
         force = options.get('force', False)
+        chunk_size = options.get('chunk_size')
+        
+        if options.get('all_countries'):
+            if country:
+                raise CommandError('--country y --all-countries son excluyentes')
+            return self.handle_all_countries(chunk_size, options.get('cores'), options.get('workers'))
         
         self.stdout.write(
             self.style.SUCCESS(f'Iniciando entrenamiento de modelos ML...')
@@ -32,9 +60,12 @@ class Command(BaseCommand):
         else:
             self.stdout.write('Entrenando modelos globales')
         
+        if chunk_size:
+            self.stdout.write(f'Modo por bloques: {chunk_size} filas por bloque')
+        
         try:
             # Entrenar modelos
-            success = ml_service.train_models(country_code=country)
+            success = ml_service.train_models(country_code=country, chunk_size=chunk_size)
             
             if success:
                 self.stdout.write(
@@ -46,8 +77,7 @@ class Command(BaseCommand):
                 # Mostrar información de los modelos
                 self.stdout.write('\n📊 Información de los modelos:')
                 self.stdout.write(f'  - Clasificador de riesgo: {"✅" if ml_service.models["risk_classifier"] else "❌"}')
-                self.stdout.write(f'  - Regresor de magnitud: {"✅" if ml_service.models["magnitude_regressor"] else "❌"}')
-                self.stdout.write(f'  - Regresor de frecuencia: {"✅" if ml_service.models["frequency_regressor"] else "❌"}')
+                self.stdout.write(f'  - Regresor de magnitud y frecuencia: {"✅" if ml_service.models["target_regressor"] else "❌"}')
                 self.stdout.write(f'  - Escalador: {"✅" if ml_service.scaler else "❌"}')
                 
             else:
@@ -60,3 +90,45 @@ class Command(BaseCommand):
                 self.style.ERROR(f'❌ Error durante el entrenamiento: {str(e)}')
             )
             logger.error(f"Error training models: {str(e)}")
+
+    def handle_all_countries(self, chunk_size, cores, workers):
+        for name, value in (('--cores', cores), ('--workers', workers)):
+            if value is not None and value < 1:
+                raise CommandError(f'{name} debe ser un entero positivo')
+        
+        countries = countries_with_data()
+        jobs = countries + [GLOBAL_JOB]
+        cores = cores or available_cores()
+        workers, n_jobs = plan_workers(len(jobs), cores, workers)
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Iniciando entrenamiento de modelos ML para {len(countries)} países + global...')
+        )
+        self.stdout.write(f'🧵 {workers} procesos × {n_jobs} núcleos por bosque (presupuesto: {cores} núcleos)')
+        if chunk_size:
+            self.stdout.write(f'Modo por bloques: {chunk_size} filas por bloque')
+        
+        def report(result):
+            if result['success']:
+                peak = result['peak_rss_mb']
+                memory = f", pico RSS {peak:.0f} MB" if peak is not None else ""
+                self.stdout.write(self.style.SUCCESS(f"  ✅ {result['key']}: {result['seconds']:.1f}s{memory}"))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f"  ❌ {result['key']}: {result['error'] or 'error al entrenar los modelos'}"
+                ))
+        
+        start = time.perf_counter()
+        results = train_all(jobs, cores=cores, workers=workers, chunk_size=chunk_size, on_result=report)
+        elapsed = time.perf_counter() - start
+        
+        failed = [result['key'] for result in results if not result['success']]
+        job_seconds = sum(result['seconds'] or 0 for result in results)
+        self.stdout.write(
+            f'\n⏱️  {elapsed:.1f}s en total ({job_seconds:.1f}s sumando trabajos, {job_seconds / elapsed:.1f}x)'
+        )
+        if failed:
+            self.stdout.write(self.style.ERROR(f'❌ Fallaron: {", ".join(failed)}'))
+            logger.error(f"Parallel training failed for: {failed}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(results)} modelos entrenados'))
@@ -0,0 +1,89 @@
+from django.db import migrations, models
+
+from api.db_optimization import apply_indexes, drop_indexes, prediction_columns, prediction_table_exists
+
+# Copia fija de la columna event_year, sus triggers y los índices de esta migración
+# (el DDL de db_optimization puede cambiar después)
+EVENT_YEAR_COLUMN_SQL = [
+    "ALTER TABLE prediction ADD COLUMN event_year INTEGER",
+    "UPDATE prediction SET event_year = CAST(substr(event_date, 1, 4) AS INTEGER)",
+]
+
+EVENT_YEAR_TRIGGERS = {
+    'trg_prediction_event_year_insert': """
+        CREATE TRIGGER IF NOT EXISTS trg_prediction_event_year_insert
+        AFTER INSERT ON prediction
+        WHEN NEW.event_year IS NOT CAST(substr(NEW.event_date, 1, 4) AS INTEGER)
+        BEGIN
+            UPDATE prediction SET event_year = CAST(substr(NEW.event_date, 1, 4) AS INTEGER)
+            WHERE record_id = NEW.record_id;
+        END
+    """,
+    'trg_prediction_event_year_update': """
+        CREATE TRIGGER IF NOT EXISTS trg_prediction_event_year_update
+        AFTER UPDATE OF event_date, event_year ON prediction
+        WHEN NEW.event_year IS NOT CAST(substr(NEW.event_date, 1, 4) AS INTEGER)
+        BEGIN
+            UPDATE prediction SET event_year = CAST(substr(NEW.event_date, 1, 4) AS INTEGER)
+            WHERE record_id = NEW.record_id;
+        END
+    """,
+}
+
+INDEXES = {
+    'idx_prediction_country_date': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_country_date ON prediction (
+            country_code, event_date,
+            max_mag_last90d, prob_m45_next7d, prob_m50_next30d, prob_m60_next90d
+        )
+    """,
+    'idx_prediction_year_country': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_year_country ON prediction (
+            event_year, country_code, event_date,
+            max_mag_last90d, prob_m45_next7d, prob_m50_next30d, prob_m60_next90d
+        )
+    """,
+    'idx_prediction_date_country': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_date_country ON prediction (
+            event_date, country_code, max_mag_last90d
+        )
+    """,
+}
+
+
+def forwards(apps, schema_editor):
+    # prediction es managed=False: en BD nuevas (p. ej. la de tests) la tabla no existe y no se hace nada
+    with schema_editor.connection.cursor() as cursor:
+        if prediction_table_exists(cursor):
+            if 'event_year' not in prediction_columns(cursor):
+                for sql in EVENT_YEAR_COLUMN_SQL:
+                    cursor.execute(sql)
+            for sql in EVENT_YEAR_TRIGGERS.values():
+                cursor.execute(sql)
+            apply_indexes(cursor, INDEXES)
+
+
+def backwards(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        if prediction_table_exists(cursor):
+            drop_indexes(cursor, INDEXES)
+            for name in EVENT_YEAR_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            if 'event_year' in prediction_columns(cursor):
+                cursor.execute("ALTER TABLE prediction DROP COLUMN event_year")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='earthquakeprediction',
+            name='event_year',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
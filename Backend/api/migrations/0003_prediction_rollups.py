@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_prediction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_record_id', models.IntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PredictionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country_code', models.CharField(max_length=100)),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('event_count', models.IntegerField(default=0)),
+                ('magnitude_count', models.IntegerField(default=0)),
+                ('magnitude_sum', models.FloatField(default=0)),
+                ('magnitude_max', models.FloatField(blank=True, null=True)),
+                ('magnitude_min', models.FloatField(blank=True, null=True)),
+                ('prob_7d_count', models.IntegerField(default=0)),
+                ('prob_7d_sum', models.FloatField(default=0)),
+                ('prob_30d_count', models.IntegerField(default=0)),
+                ('prob_30d_sum', models.FloatField(default=0)),
+                ('prob_90d_count', models.IntegerField(default=0)),
+                ('prob_90d_sum', models.FloatField(default=0)),
+                ('first_date', models.DateField(blank=True, null=True)),
+                ('last_date', models.DateField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('country_code', 'year', 'month'), name='uq_rollup_country_year_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+from api.db_optimization import apply_indexes, drop_indexes
+
+# Copia fija de los índices de esta migración (los de db_optimization pueden cambiar después)
+INDEXES = {
+    'idx_prediction_country_date_keyset': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_country_date_keyset ON prediction (
+            country_code, event_date
+        )
+    """,
+    'idx_prediction_country_year_keyset': """
+        CREATE INDEX IF NOT EXISTS idx_prediction_country_year_keyset ON prediction (
+            country_code, event_year, event_date
+        )
+    """,
+}
+
+
+def forwards(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        apply_indexes(cursor, INDEXES)
+
+
+def backwards(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        drop_indexes(cursor, INDEXES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_prediction_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+from api.db_optimization import apply_indexes, drop_indexes
+
+# Copia fija del índice de esta migración (los de db_optimization pueden cambiar después)
+INDEXES = {
+    'idx_prediction_cell_id': """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_prediction_cell_id ON prediction (cell_id)
+    """,
+}
+
+
+def forwards(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        apply_indexes(cursor, INDEXES)
+
+
+def backwards(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        drop_indexes(cursor, INDEXES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_data_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
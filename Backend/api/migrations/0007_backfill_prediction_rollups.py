@@ -0,0 +1,62 @@
+from django.db import migrations
+from django.utils import timezone
+
+from api.db_optimization import prediction_table_exists
+
+# 0003 crea los rollups vacíos: sin esta carga inicial la marca de agua queda en 0 y cada
+# request de estadísticas agrega todo prediction. Copia fija del SQL de api/rollups.py
+# (puede cambiar después); equivale a refresh_rollups(full=True).
+BACKFILL_SQL = """
+    INSERT INTO api_predictionrollup (
+        country_code, year, month, event_count,
+        magnitude_count, magnitude_sum, magnitude_max, magnitude_min,
+        prob_7d_count, prob_7d_sum, prob_30d_count, prob_30d_sum, prob_90d_count, prob_90d_sum,
+        first_date, last_date
+    )
+    SELECT
+        country_code,
+        CAST(substr(event_date, 1, 4) AS INTEGER),
+        CAST(substr(event_date, 6, 2) AS INTEGER),
+        COUNT(*),
+        COUNT(max_mag_last90d), TOTAL(max_mag_last90d), MAX(max_mag_last90d), MIN(max_mag_last90d),
+        COUNT(prob_m45_next7d), TOTAL(prob_m45_next7d),
+        COUNT(prob_m50_next30d), TOTAL(prob_m50_next30d),
+        COUNT(prob_m60_next90d), TOTAL(prob_m60_next90d),
+        MIN(event_date), MAX(event_date)
+    FROM prediction
+    WHERE record_id <= %s AND country_code IS NOT NULL AND event_date IS NOT NULL
+    GROUP BY 1, 2, 3
+"""
+
+
+def forwards(apps, schema_editor):
+    # prediction es managed=False: en BD nuevas (p. ej. la de tests) la tabla no existe y no se hace nada
+    with schema_editor.connection.cursor() as cursor:
+        if not prediction_table_exists(cursor):
+            return
+        cursor.execute("SELECT COALESCE(MAX(record_id), 0) FROM prediction")
+        max_record_id = cursor.fetchone()[0]
+        cursor.execute("DELETE FROM api_predictionrollup")
+        cursor.execute(BACKFILL_SQL, [max_record_id])
+        cursor.execute("DELETE FROM api_rollupstate WHERE name = 'prediction'")
+        cursor.execute(
+            "INSERT INTO api_rollupstate (name, last_record_id, refreshed_at) VALUES ('prediction', %s, %s)",
+            [max_record_id, timezone.now()],
+        )
+
+
+def backwards(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM api_predictionrollup")
+        cursor.execute("DELETE FROM api_rollupstate WHERE name = 'prediction'")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_prediction_cell_id_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
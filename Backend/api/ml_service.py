@@ -9,17 +9,151 @@ import joblib
 import os
 from datetime import datetime, timedelta
 import logging
+from .forest_export import compact_model
+from .model_registry import model_registry, artifact_key, artifact_path, PIPELINE_NAME
+from . import snapshot
 
 logger = logging.getLogger(__name__)
 
+PREDICTION_COLUMNS = """
+    record_id, country_code, event_date, location,
+    eq_count_m3_last7d, eq_count_m4_last30d, max_mag_last90d,
+    energy_sum_last365d, days_since_last_m5, gr_b_value_last365d,
+    gr_a_value_last365d, aftershock_rate, dist_to_fault_km,
+    fault_slip_rate_mm_yr, depth_to_slab_km, strain_rate,
+    gps_uplift_mm_yr, heat_flow_mw_m2, catalog_completeness_mc,
+    station_density, detection_threshold,
+    prob_m45_next7d, prob_m50_next30d, prob_m60_next90d,
+    label_m45_next7d, label_m50_next30d, label_m60_next90d
+"""
+
+PREDICTION_COLUMN_NAMES = [column.strip() for column in PREDICTION_COLUMNS.split(',')]
+
+# Columnas no numéricas de PREDICTION_COLUMNS; el resto se convierte a float
+NON_NUMERIC_COLUMNS = ('country_code', 'event_date', 'location')
+
+# Lo único que usa el entrenamiento: record_id (partición de evaluación), event_date, los
+# features base (también alimentan los derivados y los objetivos) y prob_m45_next7d (riesgo)
+TRAINING_COLUMN_NAMES = [
+    'record_id', 'event_date',
+    'eq_count_m3_last7d', 'eq_count_m4_last30d', 'max_mag_last90d',
+    'energy_sum_last365d', 'days_since_last_m5', 'gr_b_value_last365d',
+    'gr_a_value_last365d', 'aftershock_rate', 'dist_to_fault_km',
+    'fault_slip_rate_mm_yr', 'depth_to_slab_km', 'strain_rate',
+    'gps_uplift_mm_yr', 'heat_flow_mw_m2', 'catalog_completeness_mc',
+    'station_density', 'detection_threshold',
+    'prob_m45_next7d',
+]
+
+
+# Entrenamiento por bloques (train_models_chunked)
+TRAINING_CHUNK_SIZE = int(os.environ.get('ML_TRAINING_CHUNK_SIZE', 50_000))
+# Muestra uniforme acotada para ajustar medianas y scaler sin cargar todo el catálogo
+TRAINING_SAMPLE_SIZE = 100_000
+# Filas de reserva por clase de riesgo, para completar bloques que no traen todas las clases
+CLASS_ANCHOR_SIZE = 200
+# record_id % TEST_MODULO == 0 queda fuera del entrenamiento para evaluar (20%)
+TEST_MODULO = 5
+# Objetivos de regresión, en el orden de las columnas de TargetRegressor.predict
+TARGET_COLUMNS = ['max_mag_last90d', 'actividad_reciente']
+
+# Reglas de riesgo: cada factor suma 1 por cada umbral alcanzado (valor >= umbral)
+MAGNITUDE_THRESHOLDS = [4.5, 5.0, 5.5, 6.0]
+FREQUENCY_THRESHOLDS = [2, 5, 10]
+PROBABILITY_THRESHOLDS = [0.1, 0.2, 0.3]
+# Score total (0..10) -> 0 low, 1 medium, 2 high, 3 very-high
+RISK_SCORE_THRESHOLDS = [3, 6, 8]
+RISK_LEVELS = np.array(['low', 'medium', 'high', 'very-high'], dtype=object)
+
+
+def _threshold_factor(values, thresholds):
+    """Cantidad de umbrales alcanzados por cada valor; NaN no alcanza ninguno (como ``NaN >= x``)"""
+    values = np.asarray(values, dtype=float)
+    factor = np.digitize(values, thresholds)
+    factor[np.isnan(values)] = 0
+    return factor
+
+
+def risk_labels(max_magnitude, eq_count_7d, prob_7d):
+    """Etiqueta numérica de riesgo (0-3) para columnas completas de magnitud, frecuencia y probabilidad"""
+    score = (
+        _threshold_factor(max_magnitude, MAGNITUDE_THRESHOLDS)
+        + _threshold_factor(eq_count_7d, FREQUENCY_THRESHOLDS)
+        + _threshold_factor(prob_7d, PROBABILITY_THRESHOLDS)
+    )
+    return np.digitize(score, RISK_SCORE_THRESHOLDS)
+
+
+class FeaturePipeline:
+    """Imputación por medianas + StandardScaler, ajustados al entrenar y congelados para inferencia"""
+
+    def __init__(self, features, medians, scaler):
+        self.features = list(features)
+        self.medians = medians
+        self.scaler = scaler
+
+    @classmethod
+    def fit(cls, df, features):
+        X = df[features].astype(float)
+        # Columnas sin ningún valor no tienen mediana: se imputan con 0
+        medians = X.median().fillna(0.0)
+        scaler = StandardScaler().fit(X.fillna(medians))
+        return cls(features, medians, scaler)
+
+    def transform(self, df):
+        """Solo transform: no modifica las medianas ni el scaler entrenados"""
+        X = df.reindex(columns=self.features).astype(float).fillna(self.medians)
+        return self.scaler.transform(X)
+
+
+class TargetRegressor:
+    """
+    Un solo RandomForestRegressor multi-salida para todos los objetivos de TARGET_COLUMNS
+    (magnitud y actividad reciente) en lugar de un bosque por objetivo. Los objetivos se
+    estandarizan para que ninguno domine el criterio de división; ``predict`` devuelve
+    una columna por objetivo en su escala original.
+    """
+
+    def __init__(self, forest, means, scales):
+        self.forest = forest
+        self.means = means
+        self.scales = scales
+
+    @classmethod
+    def for_targets(cls, y, **forest_params):
+        """Escala ajustada sobre ``y`` (filas x objetivos); el bosque queda sin entrenar"""
+        y = np.asarray(y, dtype=float)
+        scales = y.std(axis=0)
+        scales[scales == 0] = 1.0
+        return cls(RandomForestRegressor(**forest_params), y.mean(axis=0), scales)
+
+    @property
+    def n_jobs(self):
+        return self.forest.n_jobs
+
+    @n_jobs.setter
+    def n_jobs(self, value):
+        self.forest.n_jobs = value
+
+    def scale(self, y):
+        return (np.asarray(y, dtype=float) - self.means) / self.scales
+
+    def fit(self, X, y):
+        self.forest.fit(X, self.scale(y))
+        return self
+
+    def predict(self, X):
+        return self.forest.predict(X) * self.scales + self.means
+
+
 class EarthquakePredictionML:
     def __init__(self):
         self.scaler = StandardScaler()
+        self.pipeline = None
         self.label_encoder = LabelEncoder()
         self.models = {
             'risk_classifier': None,
-            'magnitude_regressor': None,
-            'frequency_regressor': None
+            'target_regressor': None
         }
         self.feature_columns = [
             'eq_count_m3_last7d', 'eq_count_m4_last30d', 'max_mag_last90d',
@@ -34,44 +168,40 @@ class EarthquakePredictionML:
             'energia_acumulada_365d', 'ratio_aftershock', 'tension_geologica'
         ]
 
-    def load_data_from_db(self, country_code=None, limit=None):
-        """Cargar datos desde la base de datos prediction.db"""
+    def load_data_from_db(self, country_code=None, limit=None, columns=None):
+        """
+        Cargar datos desde el snapshot Parquet si está vigente, o desde la base de datos prediction.db.
+        Con ``columns`` solo se leen esas columnas; del snapshot, como arreglos NumPy (``read_columns``).
+        """
+        if columns:
+            df = self._load_columns_from_snapshot(columns, country_code, limit)
+        else:
+            df = self._load_from_snapshot(country_code, limit)
+        if df is not None:
+            return df
         try:
             with connection.cursor() as cursor:
-                query = """
-                    SELECT 
-                        record_id, country_code, event_date, location,
-                        eq_count_m3_last7d, eq_count_m4_last30d, max_mag_last90d,
-                        energy_sum_last365d, days_since_last_m5, gr_b_value_last365d,
-                        gr_a_value_last365d, aftershock_rate, dist_to_fault_km,
-                        fault_slip_rate_mm_yr, depth_to_slab_km, strain_rate,
-                        gps_uplift_mm_yr, heat_flow_mw_m2, catalog_completeness_mc,
-                        station_density, detection_threshold,
-                        prob_m45_next7d, prob_m50_next30d, prob_m60_next90d,
-                        label_m45_next7d, label_m50_next30d, label_m60_next90d
-                    FROM prediction
-                """
+                select = ', '.join(columns) if columns else PREDICTION_COLUMNS
+                query = f"SELECT {select} FROM prediction"
                 
                 params = []
                 if country_code:
                     query += " WHERE country_code = %s"
                     params.append(country_code)
                 
-                query += " ORDER BY event_date DESC"
+                query += " ORDER BY event_date DESC, record_id DESC"
                 
                 if limit:
                     query += " LIMIT %s"
                     params.append(limit)
                 
                 cursor.execute(query, params)
-                columns = [desc[0] for desc in cursor.description]
-                data = cursor.fetchall()
+                df = self._records_to_frame(cursor)
                 
-                if not data:
+                if df.empty:
                     logger.warning(f"No data found for country: {country_code}")
-                    return pd.DataFrame()
+                    return df
                 
-                df = pd.DataFrame(data, columns=columns)
                 logger.info(f"Loaded {len(df)} records from database")
                 return df
                 
@@ -79,6 +209,75 @@ class EarthquakePredictionML:
             logger.error(f"Error loading data from database: {str(e)}")
             return pd.DataFrame()
 
+    def _load_from_snapshot(self, country_code=None, limit=None):
+        """Mismas filas y orden que la consulta de load_data_from_db, leídas del snapshot (None si no está vigente)"""
+        try:
+            if limit:
+                # Solo las particiones de los años más nuevos, no el catálogo entero
+                table = snapshot.read_latest(PREDICTION_COLUMN_NAMES, limit, country_code)
+            else:
+                table = snapshot.read_table(PREDICTION_COLUMN_NAMES, country_code)
+                if table is not None:
+                    table = table.sort_by(snapshot.ORDER_KEYS)
+            if table is None:
+                return None
+            df = table.to_pandas(split_blocks=True)
+            logger.info(f"Loaded {len(df)} records from snapshot")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Error loading data from snapshot: {str(e)}")
+            return None
+
+    def _load_columns_from_snapshot(self, columns, country_code=None, limit=None):
+        """Solo ``columns`` del snapshot, sin pasar por una tabla de pandas intermedia (None si no está vigente)"""
+        try:
+            arrays = snapshot.read_columns(columns, country_code, limit)
+            if arrays is None:
+                return None
+            # copy=False: el DataFrame usa los arreglos de read_columns en lugar de consolidarlos
+            df = pd.DataFrame(arrays, columns=list(columns), copy=False)
+            logger.info(f"Loaded {len(df)} records ({len(columns)} columns) from snapshot")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Error loading data from snapshot: {str(e)}")
+            return None
+
+    def load_latest_records(self, countries):
+        """Registro más reciente de cada país en una sola consulta (ROW_NUMBER por país)"""
+        try:
+            with connection.cursor() as cursor:
+                placeholders = ','.join(['%s'] * len(countries))
+                cursor.execute(f"""
+                    SELECT {PREDICTION_COLUMNS} FROM (
+                        SELECT *, ROW_NUMBER() OVER (
+                            PARTITION BY country_code ORDER BY event_date DESC, record_id DESC
+                        ) AS row_number
+                        FROM prediction
+                        WHERE country_code IN ({placeholders})
+                    )
+                    WHERE row_number = 1
+                """, list(countries))
+                df = self._records_to_frame(cursor)
+                logger.info(f"Loaded latest records for {len(df)} of {len(countries)} countries")
+                return df
+                
+        except Exception as e:
+            logger.error(f"Error loading latest records from database: {str(e)}")
+            return pd.DataFrame()
+
+    @staticmethod
+    def _records_to_frame(cursor):
+        columns = [desc[0] for desc in cursor.description]
+        df = pd.DataFrame(cursor.fetchall(), columns=columns)
+        if df.empty:
+            return df
+        # Columnas con solo NULL llegan como object (None); convertirlas a NaN
+        numeric_columns = [col for col in df.columns if col not in NON_NUMERIC_COLUMNS]
+        df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+        return df
+
     def create_derived_features(self, df):
         """Crear features derivados para mejorar las predicciones"""
         try:
@@ -130,53 +329,12 @@ class EarthquakePredictionML:
     def create_risk_labels(self, df):
         """Crear etiquetas de riesgo basadas en reglas de negocio"""
         try:
-            # Reglas para clasificación de riesgo
-            def calculate_risk_level(row):
-                # Factores de riesgo
-                magnitude_factor = 0
-                if row['max_mag_last90d'] >= 6.0:
-                    magnitude_factor = 4
-                elif row['max_mag_last90d'] >= 5.5:
-                    magnitude_factor = 3
-                elif row['max_mag_last90d'] >= 5.0:
-                    magnitude_factor = 2
-                elif row['max_mag_last90d'] >= 4.5:
-                    magnitude_factor = 1
-                
-                frequency_factor = 0
-                if row['eq_count_m3_last7d'] >= 10:
-                    frequency_factor = 3
-                elif row['eq_count_m3_last7d'] >= 5:
-                    frequency_factor = 2
-                elif row['eq_count_m3_last7d'] >= 2:
-                    frequency_factor = 1
-                
-                probability_factor = 0
-                if row['prob_m45_next7d'] >= 0.3:
-                    probability_factor = 3
-                elif row['prob_m45_next7d'] >= 0.2:
-                    probability_factor = 2
-                elif row['prob_m45_next7d'] >= 0.1:
-                    probability_factor = 1
-                
-                # Calcular score total
-                total_score = magnitude_factor + frequency_factor + probability_factor
-                
-                # Clasificar riesgo
-                if total_score >= 8:
-                    return 'very-high'
-                elif total_score >= 6:
-                    return 'high'
-                elif total_score >= 3:
-                    return 'medium'
-                else:
-                    return 'low'
-            
-            df['risk_level'] = df.apply(calculate_risk_level, axis=1)
+            # Reglas para clasificación de riesgo, evaluadas por columnas completas
+            labels = risk_labels(df['max_mag_last90d'], df['eq_count_m3_last7d'], df['prob_m45_next7d'])
+            df['risk_level'] = RISK_LEVELS[labels]
             
-            # Crear etiquetas numéricas para el modelo
-            risk_mapping = {'low': 0, 'medium': 1, 'high': 2, 'very-high': 3}
-            df['risk_label'] = df['risk_level'].map(risk_mapping)
+            # Etiquetas numéricas para el modelo (0 low, 1 medium, 2 high, 3 very-high)
+            df['risk_label'] = labels
             
             logger.info("Risk labels created successfully")
             return df
@@ -186,7 +344,7 @@ class EarthquakePredictionML:
             return df
 
     def prepare_features(self, df):
-        """Preparar features para el modelo de ML"""
+        """Preparar features para entrenar: ajusta y guarda el pipeline (medianas + scaler)"""
         try:
             # Seleccionar features base
             feature_cols = self.feature_columns + self.derived_features
@@ -194,14 +352,10 @@ class EarthquakePredictionML:
             # Filtrar columnas que existen en el DataFrame
             available_features = [col for col in feature_cols if col in df.columns]
             
-            # Crear matriz de features
-            X = df[available_features].copy()
-            
-            # Manejar valores nulos
-            X = X.fillna(X.median())
-            
-            # Normalizar features
-            X_scaled = self.scaler.fit_transform(X)
+            # Manejar valores nulos y normalizar features
+            self.pipeline = FeaturePipeline.fit(df, available_features)
+            self.scaler = self.pipeline.scaler
+            X_scaled = self.pipeline.transform(df)
             
             logger.info(f"Prepared {X_scaled.shape[1]} features for ML model")
             return X_scaled, available_features
@@ -210,11 +364,16 @@ class EarthquakePredictionML:
             logger.error(f"Error preparing features: {str(e)}")
             return None, []
 
-    def train_models(self, country_code=None):
-        """Entrenar modelos de machine learning"""
+    def train_models(self, country_code=None, chunk_size=None, n_jobs=None):
+        """
+        Entrenar modelos de machine learning (con ``chunk_size``, por bloques y sin límite de filas).
+        ``n_jobs`` son los núcleos que usa cada bosque (None: uno, como en scikit-learn).
+        """
+        if chunk_size:
+            return self.train_models_chunked(country_code=country_code, chunk_size=chunk_size, n_jobs=n_jobs)
         try:
             # Cargar datos
-            df = self.load_data_from_db(country_code=country_code, limit=10000)
+            df = self.load_data_from_db(country_code=country_code, limit=10000, columns=TRAINING_COLUMN_NAMES)
             
             if df.empty:
                 logger.error("No data available for training")
@@ -226,6 +385,9 @@ class EarthquakePredictionML:
             # Crear etiquetas de riesgo
             df = self.create_risk_labels(df)
             
+            # Los regresores no admiten objetivos nulos
+            df = df.dropna(subset=['max_mag_last90d', 'actividad_reciente']).reset_index(drop=True)
+            
             # Preparar features
             X, feature_names = self.prepare_features(df)
             
@@ -233,45 +395,31 @@ class EarthquakePredictionML:
                 logger.error("Failed to prepare features")
                 return False
             
-            # Dividir datos para entrenamiento
-            y_risk = df['risk_label'].values
-            y_magnitude = df['max_mag_last90d'].values
-            y_frequency = df['actividad_reciente'].values
-            
-            X_train, X_test, y_risk_train, y_risk_test = train_test_split(
-                X, y_risk, test_size=0.2, random_state=42, stratify=y_risk
-            )
-            
-            _, _, y_mag_train, y_mag_test = train_test_split(
-                X, y_magnitude, test_size=0.2, random_state=42
-            )
-            
-            _, _, y_freq_train, y_freq_test = train_test_split(
-                X, y_frequency, test_size=0.2, random_state=42
+            # Una sola partición (estratificada por riesgo) para todos los objetivos
+            y_risk = df['risk_label'].to_numpy()
+            y_targets = df[TARGET_COLUMNS].to_numpy(dtype=float)
+            train_idx, test_idx = train_test_split(
+                np.arange(len(df)), test_size=0.2, random_state=42, stratify=y_risk
             )
+            X_train, X_test = X[train_idx], X[test_idx]
             
             # Entrenar modelo de clasificación de riesgo
             self.models['risk_classifier'] = RandomForestClassifier(
-                n_estimators=100, random_state=42, max_depth=10
-            )
-            self.models['risk_classifier'].fit(X_train, y_risk_train)
-            
-            # Entrenar modelo de regresión de magnitud
-            self.models['magnitude_regressor'] = RandomForestRegressor(
-                n_estimators=100, random_state=42, max_depth=10
+                n_estimators=100, random_state=42, max_depth=10, n_jobs=n_jobs
             )
-            self.models['magnitude_regressor'].fit(X_train, y_mag_train)
+            self.models['risk_classifier'].fit(X_train, y_risk[train_idx])
             
-            # Entrenar modelo de regresión de frecuencia
-            self.models['frequency_regressor'] = RandomForestRegressor(
-                n_estimators=100, random_state=42, max_depth=10
+            # Entrenar un solo bosque multi-salida para magnitud y frecuencia
+            self.models['target_regressor'] = TargetRegressor.for_targets(
+                y_targets[train_idx], n_estimators=100, random_state=42, max_depth=10, n_jobs=n_jobs
             )
-            self.models['frequency_regressor'].fit(X_train, y_freq_train)
+            self.models['target_regressor'].fit(X_train, y_targets[train_idx])
             
             # Evaluar modelos
-            risk_accuracy = accuracy_score(y_risk_test, self.models['risk_classifier'].predict(X_test))
-            mag_mse = mean_squared_error(y_mag_test, self.models['magnitude_regressor'].predict(X_test))
-            freq_mse = mean_squared_error(y_freq_test, self.models['frequency_regressor'].predict(X_test))
+            risk_accuracy = accuracy_score(y_risk[test_idx], self.models['risk_classifier'].predict(X_test))
+            mag_mse, freq_mse = mean_squared_error(
+                y_targets[test_idx], self.models['target_regressor'].predict(X_test), multioutput='raw_values'
+            )
             
             logger.info(f"Models trained successfully:")
             logger.info(f"Risk classifier accuracy: {risk_accuracy:.3f}")
@@ -287,67 +435,231 @@ class EarthquakePredictionML:
             logger.error(f"Error training models: {str(e)}")
             return False
 
-    def predict(self, country_code, features_dict=None):
-        """Realizar predicción para un país específico"""
-        try:
-            # Cargar datos más recientes del país
-            df = self.load_data_from_db(country_code=country_code, limit=100)
+    def iter_data_chunks(self, country_code=None, chunk_size=TRAINING_CHUNK_SIZE, columns=PREDICTION_COLUMN_NAMES):
+        """
+        Recorrer prediction en bloques de hasta ``chunk_size`` filas: del snapshot
+        Parquet si está vigente, si no desde la base de datos (keyset por record_id).
+        ``columns`` debe incluir record_id.
+        """
+        tables = snapshot.iter_batches(columns, country_code, chunk_size)
+        if tables is not None:
+            for table in tables:
+                yield table.to_pandas()
+            return
+        
+        last_record_id = 0
+        while True:
+            with connection.cursor() as cursor:
+                query = f"SELECT {', '.join(columns)} FROM prediction WHERE record_id > %s"
+                params = [last_record_id]
+                if country_code:
+                    query += " AND country_code = %s"
+                    params.append(country_code)
+                query += " ORDER BY record_id LIMIT %s"
+                params.append(chunk_size)
+                cursor.execute(query, params)
+                df = self._records_to_frame(cursor)
             
             if df.empty:
-                logger.warning(f"No data found for country: {country_code}")
-                return self._generate_fallback_prediction(country_code)
+                return
+            last_record_id = int(df['record_id'].iloc[-1])
+            yield df
+
+    def _iter_training_chunks(self, country_code, chunk_size):
+        """Bloques con features derivados, etiquetas de riesgo y objetivos no nulos"""
+        for df in self.iter_data_chunks(country_code, chunk_size, columns=TRAINING_COLUMN_NAMES):
+            df = self.create_risk_labels(self.create_derived_features(df))
+            df = df.dropna(subset=TARGET_COLUMNS).reset_index(drop=True)
+            if not df.empty:
+                yield df
+
+    def train_models_chunked(self, country_code=None, chunk_size=TRAINING_CHUNK_SIZE, n_estimators=100, n_jobs=None):
+        """
+        Entrenar sobre todo el catálogo sin cargarlo en memoria. Tres pasadas por bloques:
+          1. conteo, muestra uniforme acotada (para el pipeline) y filas de reserva por clase
+          2. entrenamiento: cada bloque agrega árboles a los bosques (warm_start), n_estimators en total
+          3. evaluación sobre las filas reservadas (record_id % TEST_MODULO == 0)
+        La memoria queda acotada por chunk_size, TRAINING_SAMPLE_SIZE y la profundidad de los árboles.
+        """
+        try:
+            rng = np.random.default_rng(42)
+            feature_cols = self.feature_columns + self.derived_features
             
-            # Crear features derivados
-            df = self.create_derived_features(df)
+            # 1. Muestra uniforme (menores claves aleatorias) y reservas por clase
+            sample, anchors, train_rows, chunks, train_chunks = None, {}, 0, 0, 0
+            for df in self._iter_training_chunks(country_code, chunk_size):
+                chunks += 1
+                train = df[df['record_id'] % TEST_MODULO != 0]
+                train_rows += len(train)
+                train_chunks += not train.empty
+                keyed = train.assign(_sample_key=rng.random(len(train)))
+                sample = keyed if sample is None else pd.concat([sample, keyed])
+                sample = sample.nsmallest(TRAINING_SAMPLE_SIZE, '_sample_key')
+                for label, rows in train.groupby('risk_label'):
+                    have = anchors.get(label)
+                    if have is None or len(have) < CLASS_ANCHOR_SIZE:
+                        rows = rows if have is None else pd.concat([have, rows])
+                        anchors[label] = rows.head(CLASS_ANCHOR_SIZE)
+            
+            if not train_rows:
+                logger.error("No data available for training")
+                return False
             
-            # Usar el registro más reciente
-            latest_record = df.iloc[0]
-            
-            # Preparar features para predicción
-            X, feature_names = self.prepare_features(df.head(1))
-            
-            if X is None or len(X) == 0:
-                return self._generate_fallback_prediction(country_code)
-            
-            # Cargar modelos si no están cargados
-            if not self._models_loaded():
-                self.load_models(country_code)
-            
-            # Realizar predicciones
-            risk_prediction = self.models['risk_classifier'].predict(X)[0]
-            magnitude_prediction = self.models['magnitude_regressor'].predict(X)[0]
-            frequency_prediction = self.models['frequency_regressor'].predict(X)[0]
-            
-            # Mapear predicción de riesgo
-            risk_mapping = {0: 'low', 1: 'medium', 2: 'high', 3: 'very-high'}
-            risk_level = risk_mapping.get(risk_prediction, 'medium')
-            
-            # Calcular probabilidades basadas en campos de la base de datos
-            # Usar los campos específicos: prob_m45_next7d, prob_m50_next30d, prob_m60_next90d
-            prob_7d = min(latest_record.get('prob_m45_next7d', 0.1), 0.6)
-            prob_30d = min(latest_record.get('prob_m50_next30d', 0.2), 0.8)
-            prob_90d = min(latest_record.get('prob_m60_next90d', 0.3), 0.9)
-            
-            # Generar predicción
-            prediction = {
-                'country': country_code,
-                'risk': risk_level,
-                'totalEarthquakes': int(frequency_prediction * 30),  # Estimación mensual
-                'earthquakesPerDay': max(frequency_prediction, 0.1),
-                'averageMagnitude': max(magnitude_prediction, 3.0),
-                'probability7d': prob_7d * 100,
-                'probability30d': prob_30d * 100,
-                'probability90d': prob_90d * 100,
-                'predictionDate': datetime.now().isoformat(),
-                'confidence': self._calculate_confidence(latest_record)
+            available_features = [col for col in feature_cols if col in sample.columns]
+            self.pipeline = FeaturePipeline.fit(sample.drop(columns='_sample_key'), available_features)
+            self.scaler = self.pipeline.scaler
+            
+            # 2. Bosques que crecen bloque a bloque. Los n_estimators árboles se reparten entre los
+            # bloques con filas de entrenamiento: el bloque i agrega floor((i+1)·n/k) - floor(i·n/k).
+            # Con más bloques que árboles algunos bloques no agregan ninguno (subir chunk_size)
+            def trees_for(i):
+                return (i + 1) * n_estimators // train_chunks - i * n_estimators // train_chunks
+            
+            forest_params = dict(n_estimators=0, warm_start=True, random_state=42, max_depth=10, n_jobs=n_jobs)
+            regressor = TargetRegressor.for_targets(sample[TARGET_COLUMNS], **forest_params)
+            self.models = {
+                'risk_classifier': RandomForestClassifier(**forest_params),
+                'target_regressor': regressor,
             }
+            del sample
+            all_classes = set(anchors)
+            
+            planted, chunk_index = 0, 0
+            for df in self._iter_training_chunks(country_code, chunk_size):
+                train = df[df['record_id'] % TEST_MODULO != 0]
+                if train.empty:
+                    continue
+                # El tope cubre también bloques que aparezcan entre la pasada 1 y esta
+                trees = min(trees_for(chunk_index), n_estimators - planted)
+                chunk_index += 1
+                if trees <= 0:
+                    continue
+                planted += trees
+                X = self.pipeline.transform(train)
+                self._grow_forest(regressor.forest, trees, X, regressor.scale(train[TARGET_COLUMNS]))
+                
+                # Todos los árboles del clasificador deben ver las mismas clases
+                missing = all_classes - set(train['risk_label'].unique())
+                if missing:
+                    train = pd.concat([train] + [anchors[label] for label in sorted(missing)])
+                    X = self.pipeline.transform(train)
+                self._grow_forest(self.models['risk_classifier'], trees, X, train['risk_label'])
+            
+            # 3. Evaluación incremental sobre las filas reservadas
+            test_rows, risk_hits, target_se = 0, 0, np.zeros(len(TARGET_COLUMNS))
+            for df in self._iter_training_chunks(country_code, chunk_size):
+                test = df[df['record_id'] % TEST_MODULO == 0]
+                if test.empty:
+                    continue
+                X = self.pipeline.transform(test)
+                test_rows += len(test)
+                risk_hits += int((self.models['risk_classifier'].predict(X) == test['risk_label'].to_numpy()).sum())
+                target_se += ((regressor.predict(X) - test[TARGET_COLUMNS].to_numpy(dtype=float)) ** 2).sum(axis=0)
+            
+            logger.info(f"Models trained in {chunks} chunks of up to {chunk_size} rows ({train_rows} training rows):")
+            if test_rows:
+                logger.info(f"Risk classifier accuracy: {risk_hits / test_rows:.3f}")
+                mag_mse, freq_mse = target_se / test_rows
+                logger.info(f"Magnitude regressor MSE: {mag_mse:.3f}")
+                logger.info(f"Frequency regressor MSE: {freq_mse:.3f}")
             
-            logger.info(f"Prediction generated for {country_code}: {risk_level}")
-            return prediction
+            # Guardar modelos
+            self.save_models(country_code)
+            
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error training models in chunks: {str(e)}")
+            return False
+
+    @staticmethod
+    def _grow_forest(forest, trees, X, y):
+        forest.n_estimators += trees
+        forest.fit(X, np.asarray(y))
+
+    def predict(self, country_code, features_dict=None):
+        """Realizar predicción para un país específico"""
+        return self.predict_many([country_code])[country_code]
+
+    def predict_many(self, countries):
+        """
+        Predicciones para varios países en una pasada: una consulta para el último
+        registro de cada país, una matriz de features por bundle de modelos y una
+        llamada a cada modelo por matriz. Devuelve un dict país -> predicción.
+        """
+        predictions = {}
+        try:
+            df = self.load_latest_records(countries)
+            if not df.empty:
+                # Crear features derivados
+                df = self.create_derived_features(df).set_index('country_code', drop=False)
+            
+            # Agrupar países por bundle (modelos del país o globales desde el registro)
+            groups = {}
+            for country_code in countries:
+                if country_code not in df.index:
+                    logger.warning(f"No data found for country: {country_code}")
+                    continue
+                bundle = model_registry.get(country_code)
+                if bundle is None:
+                    logger.warning(f"No trained models for {country_code}; using fallback prediction")
+                    continue
+                groups.setdefault(bundle.key, (bundle, []))[1].append(country_code)
+            
+            for bundle, group in groups.values():
+                try:
+                    batch = df.loc[group]
+                    # Features con el pipeline congelado del entrenamiento (solo transform)
+                    X = bundle.pipeline.transform(batch)
+                    
+                    # Realizar predicciones (una llamada por modelo para todo el grupo)
+                    risk_predictions = bundle.models['risk_classifier'].predict(X)
+                    # Magnitud y frecuencia salen del mismo bosque (columnas en orden de TARGET_COLUMNS)
+                    magnitude_predictions, frequency_predictions = bundle.models['target_regressor'].predict(X).T
+                    
+                    for i, country_code in enumerate(group):
+                        predictions[country_code] = self._build_prediction(
+                            country_code, batch.iloc[i],
+                            risk_predictions[i], magnitude_predictions[i], frequency_predictions[i]
+                        )
+                except Exception as e:
+                    logger.error(f"Error generating predictions for {group}: {str(e)}")
             
         except Exception as e:
-            logger.error(f"Error generating prediction for {country_code}: {str(e)}")
-            return self._generate_fallback_prediction(country_code)
+            logger.error(f"Error generating predictions for {countries}: {str(e)}")
+        
+        for country_code in countries:
+            if country_code not in predictions:
+                predictions[country_code] = self._generate_fallback_prediction(country_code)
+        return predictions
+
+    def _build_prediction(self, country_code, latest_record, risk_prediction, magnitude_prediction, frequency_prediction):
+        # Mapear predicción de riesgo
+        risk_mapping = {0: 'low', 1: 'medium', 2: 'high', 3: 'very-high'}
+        risk_level = risk_mapping.get(risk_prediction, 'medium')
+        
+        # Calcular probabilidades basadas en campos de la base de datos
+        # Usar los campos específicos: prob_m45_next7d, prob_m50_next30d, prob_m60_next90d
+        prob_7d = min(self._record_value(latest_record, 'prob_m45_next7d', 0.1), 0.6)
+        prob_30d = min(self._record_value(latest_record, 'prob_m50_next30d', 0.2), 0.8)
+        prob_90d = min(self._record_value(latest_record, 'prob_m60_next90d', 0.3), 0.9)
+        
+        # Generar predicción
+        prediction = {
+            'country': country_code,
+            'risk': risk_level,
+            'totalEarthquakes': int(frequency_prediction * 30),  # Estimación mensual
+            'earthquakesPerDay': max(frequency_prediction, 0.1),
+            'averageMagnitude': max(magnitude_prediction, 3.0),
+            'probability7d': prob_7d * 100,
+            'probability30d': prob_30d * 100,
+            'probability90d': prob_90d * 100,
+            'predictionDate': datetime.now().isoformat(),
+            'confidence': self._calculate_confidence(latest_record)
+        }
+        
+        logger.info(f"Prediction generated for {country_code}: {risk_level}")
+        return prediction
 
     def _generate_fallback_prediction(self, country_code):
         """Generar predicción de fallback cuando no hay datos suficientes"""
@@ -409,6 +721,12 @@ class EarthquakePredictionML:
             'confidence': round(np.random.uniform(0.7, 0.95), 2)
         }
 
+    @staticmethod
+    def _record_value(record, column, default):
+        """Valor de una columna del registro, o ``default`` si falta o es NULL"""
+        value = record.get(column)
+        return default if value is None or pd.isna(value) else float(value)
+
     def _calculate_confidence(self, record):
         """Calcular nivel de confianza basado en la calidad de los datos"""
         try:
@@ -443,44 +761,71 @@ class EarthquakePredictionML:
         return all(model is not None for model in self.models.values())
 
     def save_models(self, country_code=None):
-        """Guardar modelos entrenados"""
+        """Guardar modelos entrenados y publicarlos en el registro"""
         try:
-            model_dir = 'Backend/api/models'
+            model_dir = model_registry.model_dir
             os.makedirs(model_dir, exist_ok=True)
             
-            suffix = f"_{country_code}" if country_code else "_global"
+            key = artifact_key(country_code)
+            compact_models = {}
             
             for model_name, model in self.models.items():
                 if model is not None:
-                    model_path = os.path.join(model_dir, f"{model_name}{suffix}.joblib")
-                    joblib.dump(model, model_path)
-            
-            # Guardar scaler
-            scaler_path = os.path.join(model_dir, f"scaler{suffix}.joblib")
-            joblib.dump(self.scaler, scaler_path)
+                    # Se sirve con pocas filas por predicción: no conservar los núcleos del entrenamiento
+                    model.n_jobs = None
+                    self._dump_atomic(model, artifact_path(model_dir, model_name, key))
+                    # Exportación compacta para inferencia (arreglos de nodos, se cargan con mmap)
+                    compact_models[model_name] = compact_model(model)
+                    self._dump_atomic(compact_models[model_name], artifact_path(model_dir, model_name, key, compact=True))
+            
+            # Guardar pipeline de features (al final: su mtime marca la versión para otros procesos)
+            self._dump_atomic(self.pipeline, artifact_path(model_dir, PIPELINE_NAME, key))
+            
+            if self._models_loaded():
+                if model_registry.mmap:
+                    # Releer desde disco: los arreglos quedan mapeados y compartidos con los demás workers
+                    model_registry.reload(key)
+                else:
+                    served = compact_models if model_registry.compact else self.models
+                    model_registry.publish(key, served, self.pipeline)
             
-            logger.info(f"Models saved successfully for {country_code or 'global'}")
+            logger.info(f"Models saved successfully for {key}")
             
         except Exception as e:
             logger.error(f"Error saving models: {str(e)}")
 
+    @staticmethod
+    def _dump_atomic(obj, path):
+        """
+        Escribir en un temporal del mismo directorio y renombrarlo: quien lea ``path``
+        ve el archivo anterior o el nuevo completo, nunca uno a medio escribir.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                # Sin comprimir: el registro carga los arreglos con mmap_mode='r'
+                joblib.dump(obj, f, compress=0)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
     def load_models(self, country_code=None):
-        """Cargar modelos entrenados"""
+        """Cargar modelos entrenados (del país o globales) desde el registro"""
         try:
-            model_dir = 'Backend/api/models'
-            suffix = f"_{country_code}" if country_code else "_global"
-            
-            for model_name in self.models.keys():
-                model_path = os.path.join(model_dir, f"{model_name}{suffix}.joblib")
-                if os.path.exists(model_path):
-                    self.models[model_name] = joblib.load(model_path)
+            bundle = model_registry.get(country_code)
+            if bundle is None:
+                logger.warning(f"No trained models found for {artifact_key(country_code)}")
+                return False
             
-            # Cargar scaler
-            scaler_path = os.path.join(model_dir, f"scaler{suffix}.joblib")
-            if os.path.exists(scaler_path):
-                self.scaler = joblib.load(scaler_path)
+            self.models = dict(bundle.models)
+            self.pipeline = bundle.pipeline
+            self.scaler = bundle.pipeline.scaler
             
-            logger.info(f"Models loaded successfully for {country_code or 'global'}")
+            logger.info(f"Models loaded successfully for {bundle.key}")
             return True
             
         except Exception as e:
@@ -0,0 +1,188 @@
+"""
+Registro de modelos ML por país, compartido por todo el proceso.
+
+Cada clave ('Chile', 'Peru', ..., o 'global') tiene un ``ModelBundle`` inmutable
+con sus modelos (clasificador de riesgo y regresor multi-salida) y su ``FeaturePipeline`` (medianas + scaler). Los bundles
+se cargan de forma perezosa y se guardan en un LRU acotado (``ML_REGISTRY_SIZE``);
+con ``ML_PRELOAD_MODELS=1`` se cargan todos al arrancar.
+
+Después de reentrenar, ``publish`` reemplaza el bundle de una clave en una sola
+asignación: las predicciones en curso terminan con la referencia que ya tenían y
+las siguientes ven el bundle nuevo, sin bloquearse. Si el reentrenamiento ocurre
+en otro proceso (``manage.py train_ml_models``), el registro lo detecta por el
+mtime del pipeline, que ``save_models`` escribe al final como marca de commit.
+
+Si junto a un bosque existe su exportación compacta (``forest_export``), el
+registro la carga en su lugar. ``ML_COMPACT_MODELS=0`` vuelve a los modelos de
+scikit-learn.
+
+Los artefactos se guardan sin comprimir y se cargan con ``mmap_mode='r'``
+(``ML_MMAP_MODELS=0`` para leerlos a memoria): los arreglos de nodos de la
+exportación compacta quedan mapeados desde el archivo, así que N workers
+comparten una sola copia en el page cache. Los árboles de scikit-learn copian
+sus nodos al deserializarse y no se benefician del mapeo.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = Path(os.environ.get('ML_MODEL_DIR', Path(__file__).resolve().parent / 'models'))
+MODEL_NAMES = ('risk_classifier', 'target_regressor')
+PIPELINE_NAME = 'pipeline'
+GLOBAL_KEY = 'global'
+
+ML_REGISTRY_SIZE = int(os.environ.get('ML_REGISTRY_SIZE', 16))
+ML_REGISTRY_CHECK_INTERVAL = float(os.environ.get('ML_REGISTRY_CHECK_INTERVAL', 5.0))
+ML_COMPACT_MODELS = os.environ.get('ML_COMPACT_MODELS', '1') == '1'
+ML_MMAP_MODELS = os.environ.get('ML_MMAP_MODELS', '1') == '1'
+
+_Entry = namedtuple('_Entry', ['bundle', 'version', 'checked_at'])
+
+
+def artifact_key(country_code=None):
+    return country_code or GLOBAL_KEY
+
+
+def artifact_path(model_dir, name, key, compact=False):
+    suffix = '.compact.joblib' if compact else '.joblib'
+    return Path(model_dir) / f"{name}_{key}{suffix}"
+
+
+class ModelBundle:
+    """Modelos y pipeline de features de una clave; no se modifica después de publicarse."""
+
+    def __init__(self, key, models, pipeline, version=None):
+        self.key = key
+        self.models = dict(models)
+        self.pipeline = pipeline
+        self.version = version
+        self.loaded_at = datetime.now()
+
+    def __repr__(self):
+        return f"ModelBundle({self.key!r}, version={self.version})"
+
+
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, max_size=ML_REGISTRY_SIZE,
+                 check_interval=ML_REGISTRY_CHECK_INTERVAL, compact=ML_COMPACT_MODELS,
+                 mmap=ML_MMAP_MODELS):
+        self.model_dir = Path(model_dir)
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.compact = compact
+        self.mmap = mmap
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializa las lecturas de disco; las búsquedas solo usan _lock
+        self._load_lock = threading.Lock()
+
+    def get(self, country_code=None):
+        """Bundle del país o, si no tiene artefactos, el global. None si no hay ninguno."""
+        keys = [country_code, GLOBAL_KEY] if country_code else [GLOBAL_KEY]
+        for key in keys:
+            bundle = self._get_key(key)
+            if bundle is not None:
+                return bundle
+        return None
+
+    def publish(self, key, models, pipeline):
+        """Reemplazar atómicamente el bundle de ``key`` (tras reentrenar en este proceso)."""
+        bundle = ModelBundle(key, models, pipeline, self._artifact_version(key))
+        self._store(key, _Entry(bundle, bundle.version, time.monotonic()))
+        logger.info(f"Model bundle published for {key}")
+        return bundle
+
+    def reload(self, key):
+        """Volver a leer ``key`` desde disco (p. ej. para mapear los artefactos recién guardados)."""
+        return self._refresh(key, None)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def warm(self):
+        """Cargar todos los bundles presentes en disco (hasta max_size)."""
+        if not self.model_dir.is_dir():
+            return []
+        prefix = f'{PIPELINE_NAME}_'
+        keys = sorted(p.stem[len(prefix):] for p in self.model_dir.glob(f'{prefix}*.joblib'))
+        loaded = [key for key in keys[:self.max_size] if self._get_key(key) is not None]
+        logger.info(f"Model registry warmed: {loaded}")
+        return loaded
+
+    def loaded_keys(self):
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry.bundle is not None]
+
+    def _get_key(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now - entry.checked_at < self.check_interval:
+                    return entry.bundle
+                # Solo este hilo revisa el disco; los demás siguen con el bundle actual
+                self._entries[key] = entry._replace(checked_at=now)
+        return self._refresh(key, entry)
+
+    def _refresh(self, key, entry):
+        with self._load_lock:
+            version = self._artifact_version(key)
+            if entry is not None and version == entry.version:
+                return entry.bundle
+
+            bundle = None
+            if version is not None:
+                try:
+                    bundle = self._load(key, version)
+                except Exception as e:
+                    logger.error(f"Error loading models for {key}: {str(e)}")
+                    if entry is not None:
+                        return entry.bundle
+            self._store(key, _Entry(bundle, version, time.monotonic()))
+            return bundle
+
+    def _load(self, key, version):
+        paths = [artifact_path(self.model_dir, name, key) for name in MODEL_NAMES]
+        if not all(path.exists() for path in paths):
+            return None
+        models = {name: self._load_model(name, key, path) for name, path in zip(MODEL_NAMES, paths)}
+        pipeline = joblib.load(artifact_path(self.model_dir, PIPELINE_NAME, key))
+        logger.info(f"Models loaded for {key}")
+        return ModelBundle(key, models, pipeline, version)
+
+    def _load_model(self, name, key, path):
+        mmap_mode = 'r' if self.mmap else None
+        compact_path = artifact_path(self.model_dir, name, key, compact=True)
+        if self.compact and compact_path.exists():
+            return joblib.load(compact_path, mmap_mode=mmap_mode)
+        return joblib.load(path, mmap_mode=mmap_mode)
+
+    def _artifact_version(self, key):
+        try:
+            return artifact_path(self.model_dir, PIPELINE_NAME, key).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+# Instancia global del registro de modelos
+model_registry = ModelRegistry()
@@ -33,6 +33,8 @@ class EarthquakePrediction(models.Model):
     label_m45_next7d = models.IntegerField(null=True, blank=True)
     label_m50_next30d = models.IntegerField(null=True, blank=True)
     label_m60_next90d = models.IntegerField(null=True, blank=True)
+    # Año de event_date, mantenido por triggers e indexado (ver api/db_optimization.py)
+    event_year = models.IntegerField(null=True, blank=True, editable=False)
 
     class Meta:
         db_table = 'prediction'
@@ -69,3 +71,50 @@ class CountrySummary(models.Model):
             return 'medium'
         else:
             return 'low'
+
+class PredictionRollup(models.Model):
+    """Agregados de prediction por (país, año, mes), mantenidos incrementalmente (ver api/rollups.py)"""
+    country_code = models.CharField(max_length=100)
+    year = models.IntegerField()
+    month = models.IntegerField()
+    event_count = models.IntegerField(default=0)
+    # Sumas y conteos de valores no nulos para recomponer AVG() sin releer prediction
+    magnitude_count = models.IntegerField(default=0)
+    magnitude_sum = models.FloatField(default=0)
+    magnitude_max = models.FloatField(null=True, blank=True)
+    magnitude_min = models.FloatField(null=True, blank=True)
+    prob_7d_count = models.IntegerField(default=0)
+    prob_7d_sum = models.FloatField(default=0)
+    prob_30d_count = models.IntegerField(default=0)
+    prob_30d_sum = models.FloatField(default=0)
+    prob_90d_count = models.IntegerField(default=0)
+    prob_90d_sum = models.FloatField(default=0)
+    first_date = models.DateField(null=True, blank=True)
+    last_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['country_code', 'year', 'month'], name='uq_rollup_country_year_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.country_code} {self.year}-{self.month:02d}: {self.event_count}"
+
+class RollupState(models.Model):
+    """Marca de agua de los rollups: último record_id de prediction ya agregado"""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_record_id = models.IntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_record_id}"
+
+
+class DataVersion(models.Model):
+    """Contador de versión de los datos; se incrementa en cada ingesta o reconstrucción"""
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,127 @@
+"""
+Paginación por cursor (keyset) y streaming NDJSON de eventos de ``prediction``.
+
+Los listados se ordenan por ``(event_date, record_id)`` descendente. El cursor
+codifica la clave de la última fila entregada, así que cada página es un rango
+sobre los índices ``*_keyset`` de db_optimization en lugar de un OFFSET que recorre
+todas las filas anteriores. ``record_id`` desempata eventos del mismo día.
+
+Parámetros de consulta:
+    limit   tamaño de página (1..MAX_PAGE_SIZE); activa la paginación
+    cursor  valor ``next_cursor`` devuelto por la página anterior
+    stream  ``ndjson`` para recibir los eventos como un flujo de líneas JSON
+"""
+import base64
+import json
+
+from django.db import connection
+from django.http import StreamingHttpResponse
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+EVENT_COLUMNS = """
+    event_date,
+    location,
+    max_mag_last90d,
+    prob_m45_next7d,
+    prob_m50_next30d,
+    prob_m60_next90d,
+    record_id
+"""
+
+
+class InvalidPageParams(ValueError):
+    pass
+
+
+def encode_cursor(event_date, record_id):
+    raw = json.dumps([str(event_date), record_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        event_date, record_id = json.loads(raw)
+        return str(event_date), int(record_id)
+    except (ValueError, TypeError):
+        raise InvalidPageParams('Cursor inválido')
+
+
+def parse_page_params(request):
+    """
+    Leer ``limit``, ``cursor`` y ``stream`` de la query string.
+    Devuelve ``(paginated, limit, cursor, stream)``; ``limit`` es None si no se pidió.
+    """
+    params = request.query_params
+    stream = params.get('stream')
+    if stream is not None and stream != 'ndjson':
+        raise InvalidPageParams("stream solo admite 'ndjson'")
+
+    limit = params.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise InvalidPageParams('limit debe ser un entero')
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise InvalidPageParams(f'limit debe estar entre 1 y {MAX_PAGE_SIZE}')
+
+    cursor = params.get('cursor')
+    if cursor is not None:
+        cursor = decode_cursor(cursor)
+        if limit is None and stream is None:
+            limit = DEFAULT_PAGE_SIZE
+
+    return limit is not None and stream is None, limit, cursor, stream is not None
+
+
+def _events_query(where, params, cursor, limit):
+    query = f"SELECT {EVENT_COLUMNS} FROM prediction WHERE {where}"
+    params = list(params)
+    if cursor is not None:
+        query += " AND (event_date, record_id) < (%s, %s)"
+        params += list(cursor)
+    query += " ORDER BY event_date DESC, record_id DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+def fetch_events_page(where, params, format_event, limit=None, cursor=None):
+    """
+    Devolver ``(eventos, next_cursor)`` para la condición ``where``.
+    Sin ``limit`` devuelve todos los eventos desde el cursor y ``next_cursor`` es None.
+    """
+    query, query_params = _events_query(where, params, cursor, limit + 1 if limit else None)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(query, query_params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][6])
+    return [format_event(row) for row in rows], next_cursor
+
+
+def stream_events(where, params, format_event, limit=None, cursor=None):
+    """
+    Respuesta NDJSON (una línea JSON por evento) que lee las filas por bloques
+    desde la base de datos, sin construir la lista completa en memoria.
+    """
+    query, query_params = _events_query(where, params, cursor, limit)
+
+    def generate():
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(query, query_params)
+            while True:
+                rows = db_cursor.fetchmany(STREAM_CHUNK_SIZE)
+                if not rows:
+                    break
+                yield ''.join(json.dumps(format_event(row)) + '\n' for row in rows)
+
+    return StreamingHttpResponse(generate(), content_type='application/x-ndjson')
@@ -0,0 +1,200 @@
+"""
+Rollups de la tabla prediction por (país, año, mes).
+
+Cada fila de ``PredictionRollup`` guarda conteos, sumas, máximo, mínimo y fechas
+extremas de un mes de un país. Los endpoints de estadísticas leen estos
+agregados (O(países × meses)) en lugar de recorrer prediction (O(filas)).
+
+La actualización es incremental: ``RollupState`` guarda el último ``record_id``
+ya agregado y ``refresh_rollups`` solo agrega las filas nuevas, fusionándolas con
+un UPSERT (sumas y conteos se suman, máximos y mínimos se combinan). Las
+ediciones o borrados de filas existentes requieren ``refresh_rollups(full=True)``.
+
+Solo escriben los rollups los caminos de escritura: la migración
+``0007_backfill_prediction_rollups`` (carga inicial en un deploy sobre una BD
+existente), la ingesta (``ingest_catalog``) y ``manage.py refresh_rollups`` (para
+cargas externas a la API). Las lecturas no escriben: ``rollup_stats`` suma, en la misma consulta, los
+rollups y las filas de prediction posteriores a la marca de agua (un rango de
+``record_id``, barato mientras se refresque tras cada carga), así que una request
+GET nunca compite por el lock de escritura ni ve datos sin agregar.
+"""
+import logging
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .models import PredictionRollup, RollupState
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = PredictionRollup._meta.db_table
+STATE_TABLE = RollupState._meta.db_table
+STATE_NAME = 'prediction'
+
+_MERGE_MAX = "MAX(COALESCE({0}, excluded.{0}), COALESCE(excluded.{0}, {0}))"
+_MERGE_MIN = "MIN(COALESCE({0}, excluded.{0}), COALESCE(excluded.{0}, {0}))"
+
+_ROLLUP_COLUMNS = """
+    country_code, year, month, event_count,
+    magnitude_count, magnitude_sum, magnitude_max, magnitude_min,
+    prob_7d_count, prob_7d_sum, prob_30d_count, prob_30d_sum, prob_90d_count, prob_90d_sum,
+    first_date, last_date
+"""
+
+# Filas de prediction con record_id en ({lower}, {upper}] agregadas con la forma de los rollups
+_GROUPED_ROWS_SQL = """
+    SELECT
+        country_code,
+        CAST(substr(event_date, 1, 4) AS INTEGER) AS year,
+        CAST(substr(event_date, 6, 2) AS INTEGER) AS month,
+        COUNT(*) AS event_count,
+        COUNT(max_mag_last90d) AS magnitude_count, TOTAL(max_mag_last90d) AS magnitude_sum,
+        MAX(max_mag_last90d) AS magnitude_max, MIN(max_mag_last90d) AS magnitude_min,
+        COUNT(prob_m45_next7d) AS prob_7d_count, TOTAL(prob_m45_next7d) AS prob_7d_sum,
+        COUNT(prob_m50_next30d) AS prob_30d_count, TOTAL(prob_m50_next30d) AS prob_30d_sum,
+        COUNT(prob_m60_next90d) AS prob_90d_count, TOTAL(prob_m60_next90d) AS prob_90d_sum,
+        MIN(event_date) AS first_date, MAX(event_date) AS last_date
+    FROM prediction
+    WHERE record_id > {lower} AND record_id <= {upper}
+        AND country_code IS NOT NULL AND event_date IS NOT NULL
+    GROUP BY 1, 2, 3
+"""
+
+_UPSERT_SQL = f"""
+    INSERT INTO {ROLLUP_TABLE} ({_ROLLUP_COLUMNS})
+    {_GROUPED_ROWS_SQL.format(lower='%s', upper='%s')}
+    ON CONFLICT (country_code, year, month) DO UPDATE SET
+        event_count = event_count + excluded.event_count,
+        magnitude_count = magnitude_count + excluded.magnitude_count,
+        magnitude_sum = magnitude_sum + excluded.magnitude_sum,
+        magnitude_max = {_MERGE_MAX.format('magnitude_max')},
+        magnitude_min = {_MERGE_MIN.format('magnitude_min')},
+        prob_7d_count = prob_7d_count + excluded.prob_7d_count,
+        prob_7d_sum = prob_7d_sum + excluded.prob_7d_sum,
+        prob_30d_count = prob_30d_count + excluded.prob_30d_count,
+        prob_30d_sum = prob_30d_sum + excluded.prob_30d_sum,
+        prob_90d_count = prob_90d_count + excluded.prob_90d_count,
+        prob_90d_sum = prob_90d_sum + excluded.prob_90d_sum,
+        first_date = {_MERGE_MIN.format('first_date')},
+        last_date = {_MERGE_MAX.format('last_date')}
+"""
+
+# Columnas agregadas sobre filas del rollup; el orden coincide con _row_to_stats
+_AGGREGATE_COLUMNS = """
+    SUM(event_count),
+    SUM(magnitude_count), SUM(magnitude_sum), MAX(magnitude_max), MIN(magnitude_min),
+    SUM(prob_7d_count), SUM(prob_7d_sum),
+    SUM(prob_30d_count), SUM(prob_30d_sum),
+    SUM(prob_90d_count), SUM(prob_90d_sum),
+    MIN(first_date), MAX(last_date)
+"""
+
+
+def refresh_rollups(full=False):
+    """
+    Agregar en los rollups las filas de prediction posteriores a la marca de agua.
+    Con ``full=True`` (o si prediction perdió filas) se reconstruye todo.
+    Devuelve el número de filas nuevas procesadas.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Escribir primero toma el lock de escritura de SQLite: dos refrescos
+            # concurrentes no pueden leer la misma marca de agua y sumar dos veces.
+            cursor.execute(
+                f"INSERT INTO {STATE_TABLE} (name, last_record_id, refreshed_at) VALUES (%s, 0, %s) "
+                f"ON CONFLICT (name) DO UPDATE SET refreshed_at = excluded.refreshed_at",
+                [STATE_NAME, timezone.now()],
+            )
+            cursor.execute(f"SELECT last_record_id FROM {STATE_TABLE} WHERE name = %s", [STATE_NAME])
+            watermark = cursor.fetchone()[0]
+            cursor.execute("SELECT COALESCE(MAX(record_id), 0) FROM prediction")
+            max_record_id = cursor.fetchone()[0]
+
+            if full or max_record_id < watermark:
+                cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+                watermark = 0
+                # Una reconstrucción refleja ediciones/borrados que no cambian sqlite_sequence
+                bump_data_version()
+            if max_record_id == watermark:
+                return 0
+
+            cursor.execute("SELECT COUNT(*) FROM prediction WHERE record_id > %s AND record_id <= %s",
+                           [watermark, max_record_id])
+            new_rows = cursor.fetchone()[0]
+            cursor.execute(_UPSERT_SQL, [watermark, max_record_id])
+            cursor.execute(f"UPDATE {STATE_TABLE} SET last_record_id = %s WHERE name = %s",
+                           [max_record_id, STATE_NAME])
+
+    logger.info(f"Rollups refreshed: {new_rows} new prediction rows (up to record_id {max_record_id})")
+    return new_rows
+
+
+def _merge_rows(rows):
+    """Combinar filas crudas de _AGGREGATE_COLUMNS (sumas/conteos se suman, extremos se combinan)."""
+    merged = None
+    for row in rows:
+        if merged is None:
+            merged = list(row)
+            continue
+        for i in range(11):
+            if i in (3, 4):
+                values = [v for v in (merged[i], row[i]) if v is not None]
+                merged[i] = (max if i == 3 else min)(values) if values else None
+            else:
+                merged[i] = (merged[i] or 0) + (row[i] or 0)
+        merged[11] = min((v for v in (merged[11], row[11]) if v is not None), default=None)
+        merged[12] = max((v for v in (merged[12], row[12]) if v is not None), default=None)
+    return merged or [0, 0, 0.0, None, None, 0, 0.0, 0, 0.0, 0, 0.0, None, None]
+
+
+def _row_to_stats(row):
+    (count, mag_count, mag_sum, mag_max, mag_min, p7_count, p7_sum,
+     p30_count, p30_sum, p90_count, p90_sum, first_date, last_date) = row
+    return {
+        'count': count or 0,
+        'avg_magnitude': mag_sum / mag_count if mag_count else None,
+        'max_magnitude': mag_max,
+        'min_magnitude': mag_min,
+        'avg_prob_7d': p7_sum / p7_count if p7_count else None,
+        'avg_prob_30d': p30_sum / p30_count if p30_count else None,
+        'avg_prob_90d': p90_sum / p90_count if p90_count else None,
+        'first_date': first_date,
+        'last_date': last_date,
+    }
+
+
+def rollup_stats(group_by='country_code', countries=None, year=None):
+    """
+    Estadísticas agrupadas por ``group_by`` ('country_code' o 'year') y su total,
+    en una sola consulta sobre los rollups. Filtra opcionalmente por países y año.
+    Devuelve ``(grupos, total)`` donde ``grupos`` es un dict ordenado por la clave.
+    Incluye las filas de prediction que todavía no se agregaron (posteriores a la marca de agua).
+    """
+    if group_by not in ('country_code', 'year'):
+        raise ValueError(f"group_by inválido: {group_by}")
+    where, params = [], []
+    if countries is not None:
+        where.append(f"country_code IN ({','.join(['%s'] * len(countries))})")
+        params.extend(countries)
+    if year is not None:
+        where.append("year = %s")
+        params.append(int(year))
+    # Una sola sentencia: SQLite la lee sobre una misma instantánea, así que un refresco
+    # concurrente no puede hacer contar dos veces (o ninguna) las filas que mueve a los rollups
+    watermark = f"(SELECT COALESCE(MAX(last_record_id), 0) FROM {STATE_TABLE} WHERE name = %s)"
+    rollups = (
+        f"SELECT {_ROLLUP_COLUMNS} FROM {ROLLUP_TABLE} UNION ALL "
+        + _GROUPED_ROWS_SQL.format(lower=watermark, upper='(SELECT COALESCE(MAX(record_id), 0) FROM prediction)')
+    )
+    params.insert(0, STATE_NAME)
+    query = f"SELECT {group_by}, {_AGGREGATE_COLUMNS} FROM ({rollups})"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" GROUP BY {group_by} ORDER BY {group_by} ASC"
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    groups = {row[0]: _row_to_stats(row[1:]) for row in rows}
+    total = _row_to_stats(_merge_rows(row[1:] for row in rows))
+    return groups, total
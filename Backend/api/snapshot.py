@@ -0,0 +1,313 @@
+"""
+Snapshot columnar (Parquet) de la tabla prediction, particionado por país y año.
+
+``write_snapshot`` (``manage.py snapshot_prediction``) recorre prediction con un
+solo cursor en bloques y escribe un dataset Parquet con particiones Hive
+``country_code=<país>/year=<año>/``. Cada snapshot va a su propio directorio y
+el archivo ``CURRENT`` (escrito con rename atómico) apunta al vigente, así que
+los lectores nunca ven un snapshot a medio escribir.
+
+El manifiesto guarda la versión de datos (``cache.data_version``) del momento de
+la exportación. ``current_snapshot`` solo devuelve el snapshot si esa versión
+coincide con la actual; si la tabla cambió, falta pyarrow o no hay snapshot, los
+lectores (``load_data_from_db``, ``iter_data_chunks``) usan el cursor como antes.
+
+Las lecturas solo cargan las columnas pedidas y filtran por país con la
+partición (sin abrir los archivos de otros países); con un límite de filas
+(``read_latest``) abren además solo los años más recientes que lo cubren.
+``read_columns`` entrega esas columnas como arreglos NumPy (sin copia cuando se
+puede): el entrenamiento lee así solo sus features y objetivos. Abrir las particiones tiene un
+costo fijo (~0,2 s con unas 200): el snapshot conviene para catálogos grandes.
+"""
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from django.db import connection
+
+from .cache import data_version
+from .models import EarthquakePrediction
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # Dependencia opcional: sin pyarrow se lee siempre con el cursor
+    pa = pc = ds = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = Path(os.environ.get(
+    'PREDICTION_SNAPSHOT_DIR', Path(__file__).resolve().parent.parent / 'snapshots' / 'prediction'
+))
+SNAPSHOT_BATCH_SIZE = 50_000
+SNAPSHOT_ROW_GROUP_SIZE = 64 * 1024
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = '_manifest.json'  # prefijo '_': pyarrow lo ignora al descubrir archivos
+# Orden de load_data_from_db (ORDER BY event_date DESC, record_id DESC)
+ORDER_KEYS = [('event_date', 'descending'), ('record_id', 'descending')]
+
+# event_year lo mantienen triggers y puede no existir; el año de la partición sale de event_date
+SNAPSHOT_COLUMNS = [
+    field.column for field in EarthquakePrediction._meta.concrete_fields if field.column != 'event_year'
+]
+
+
+def _arrow_type(field):
+    internal_type = field.get_internal_type()
+    if internal_type in ('AutoField', 'IntegerField', 'BigIntegerField'):
+        return pa.int64()
+    if internal_type == 'FloatField':
+        return pa.float64()
+    if internal_type == 'DateField':
+        return pa.date32()
+    return pa.string()
+
+
+def _schema():
+    fields = {field.column: field for field in EarthquakePrediction._meta.concrete_fields}
+    return pa.schema([(column, _arrow_type(fields[column])) for column in SNAPSHOT_COLUMNS])
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([('country_code', pa.string()), ('year', pa.int16())]), flavor='hive')
+
+
+def _iter_batches(schema, batch_size):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM prediction ORDER BY record_id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            columns = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            batch = pa.RecordBatch.from_arrays(columns, schema=schema)
+            year = pc.cast(pc.year(batch.column('event_date')), pa.int16())
+            yield batch.append_column('year', year)
+
+
+class _DatasetWriter:
+    """
+    ``ds.write_dataset`` en un hilo aparte alimentado por una cola acotada.
+    pyarrow consume los batches desde sus propios hilos; el cursor de Django es
+    de la conexión del hilo que llama, así que la lectura se queda aquí.
+    """
+
+    def __init__(self, path, schema):
+        self.queue = queue.Queue(maxsize=2)
+        self.error = None
+        self.thread = threading.Thread(target=self._write, args=(path, schema), daemon=True)
+
+    def _batches(self):
+        while (batch := self.queue.get()) is not None:
+            yield batch
+
+    def _write(self, path, schema):
+        try:
+            ds.write_dataset(
+                self._batches(), path, schema=schema,
+                format='parquet', partitioning=_partitioning(), basename_template='part-{i}.parquet',
+                # Acumular filas por partición: un row group por bloque leído dejaría miles de grupos diminutos
+                min_rows_per_group=SNAPSHOT_ROW_GROUP_SIZE, max_rows_per_group=SNAPSHOT_ROW_GROUP_SIZE * 16,
+            )
+        except BaseException as e:
+            self.error = e
+            # Vaciar la cola para no bloquear al productor
+            while self.queue.get() is not None:
+                pass
+
+    def put(self, batch):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(batch)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.queue.put(None)
+        self.thread.join()
+        if exc_type is None and self.error is not None:
+            raise self.error
+
+
+def write_snapshot(snapshot_dir=None, batch_size=SNAPSHOT_BATCH_SIZE):
+    """
+    Exportar prediction completa a un snapshot nuevo y marcarlo como vigente.
+    Devuelve el manifiesto (filas, archivos, versión de datos, segundos).
+    """
+    if pa is None:
+        raise RuntimeError('pyarrow no está instalado')
+
+    start = time.perf_counter()
+    snapshot_dir = Path(snapshot_dir or SNAPSHOT_DIR)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    # La versión se lee antes de exportar: si la tabla cambia durante la exportación, el snapshot ya nace viejo
+    version = data_version()
+    name = f"v{time.time_ns()}"
+    tmp_dir = snapshot_dir / f".{name}.tmp"
+
+    schema = _schema()
+    rows = 0
+    try:
+        with _DatasetWriter(tmp_dir, schema.append(pa.field('year', pa.int16()))) as writer:
+            for batch in _iter_batches(schema, batch_size):
+                rows += batch.num_rows
+                writer.put(batch)
+        manifest = {
+            'name': name,
+            'data_version': version,
+            'rows': rows,
+            'files': sum(1 for _ in tmp_dir.rglob('*.parquet')),
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+        (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest))
+        os.replace(tmp_dir, snapshot_dir / name)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    current_tmp = snapshot_dir / f".{CURRENT_FILE}.{os.getpid()}.tmp"
+    current_tmp.write_text(name)
+    os.replace(current_tmp, snapshot_dir / CURRENT_FILE)
+
+    # Los lectores que ya abrieron un snapshot anterior conservan sus archivos abiertos
+    for old in snapshot_dir.iterdir():
+        if old.is_dir() and old.name != name and not old.name.startswith('.'):
+            shutil.rmtree(old, ignore_errors=True)
+
+    logger.info(f"Prediction snapshot {name} written: {rows} rows in {manifest['files']} files")
+    return manifest
+
+
+def current_snapshot(snapshot_dir=None):
+    """Directorio del snapshot vigente, o None si no hay, falta pyarrow o está desactualizado."""
+    if pa is None:
+        return None
+    snapshot_dir = Path(snapshot_dir or SNAPSHOT_DIR)
+    try:
+        name = (snapshot_dir / CURRENT_FILE).read_text().strip()
+        manifest = json.loads((snapshot_dir / name / MANIFEST_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+    if manifest.get('data_version') != data_version():
+        logger.info(f"Prediction snapshot {name} is stale; reading from the database")
+        return None
+    return snapshot_dir / name
+
+
+def _dataset(path):
+    return ds.dataset(path, format='parquet', partitioning=_partitioning())
+
+
+def _country_filter(country_code):
+    return ds.field('country_code') == country_code if country_code else None
+
+
+def read_table(columns, country_code=None, snapshot=None):
+    """Tabla Arrow con ``columns`` desde el snapshot vigente, o None para usar el cursor."""
+    path = snapshot or current_snapshot()
+    if path is None:
+        return None
+    return _dataset(path).to_table(columns=list(columns), filter=_country_filter(country_code))
+
+
+def _latest_years(dataset, limit, country_code=None):
+    """Años más recientes (de las particiones) que juntan al menos ``limit`` filas, del más nuevo al más viejo."""
+    rows_by_year = {}
+    for fragment in dataset.get_fragments(filter=_country_filter(country_code)):
+        year = ds.get_partition_keys(fragment.partition_expression).get('year')
+        # Conteo desde los metadatos del Parquet, sin leer columnas
+        rows_by_year[year] = rows_by_year.get(year, 0) + fragment.count_rows()
+    years, rows = [], 0
+    # Sin event_date (año nulo) va al final, como en ORDER BY event_date DESC de SQLite
+    for year in sorted(rows_by_year, key=lambda y: (y is not None, y or 0), reverse=True):
+        years.append(year)
+        rows += rows_by_year[year]
+        if rows >= limit:
+            break
+    return years
+
+
+def read_latest(columns, limit, country_code=None, snapshot=None):
+    """
+    Las ``limit`` filas más recientes (event_date y record_id descendentes) con ``columns``,
+    o None para usar el cursor. Solo abre las particiones de los años más nuevos necesarios:
+    todo evento de un año es posterior a los de años anteriores.
+    """
+    path = snapshot or current_snapshot()
+    if path is None:
+        return None
+    dataset = _dataset(path)
+    years = _latest_years(dataset, limit, country_code)
+    year_filter = None
+    for year in years:
+        match = ds.field('year').is_null() if year is None else ds.field('year') == year
+        year_filter = match if year_filter is None else year_filter | match
+    country_filter = _country_filter(country_code)
+    if year_filter is None:
+        row_filter = country_filter
+    else:
+        row_filter = year_filter if country_filter is None else country_filter & year_filter
+    table = dataset.to_table(columns=list(columns), filter=row_filter)
+    return table.sort_by(ORDER_KEYS).slice(0, limit)
+
+
+def read_columns(columns, country_code=None, limit=None, snapshot=None):
+    """
+    Columnas como arreglos NumPy (dict nombre -> arreglo) con las filas en el orden de
+    ``load_data_from_db`` (con ``limit``, solo las más recientes), o None para usar el cursor.
+    Las columnas numéricas sin nulos de un solo bloque se entregan sin copia; las fechas,
+    como datetime64[D].
+    """
+    # Las claves de orden se leen aunque no se pidan
+    read = list(columns) + [key for key, _ in ORDER_KEYS if key not in columns]
+    if limit:
+        table = read_latest(read, limit, country_code, snapshot)
+    else:
+        table = read_table(read, country_code, snapshot)
+        if table is not None:
+            table = table.sort_by(ORDER_KEYS)
+    if table is None:
+        return None
+    return {name: _to_numpy(table.column(name)) for name in columns}
+
+
+def _to_numpy(chunked):
+    if chunked.num_chunks == 1:
+        return chunked.chunk(0).to_numpy(zero_copy_only=False)
+    return chunked.to_numpy()
+
+
+def iter_batches(columns, country_code=None, batch_size=SNAPSHOT_BATCH_SIZE, snapshot=None):
+    """Tablas Arrow de ``batch_size`` filas (la última puede ser menor), o None para usar el cursor."""
+    path = snapshot or current_snapshot()
+    if path is None:
+        return None
+    batches = _dataset(path).to_batches(
+        columns=list(columns), filter=_country_filter(country_code), batch_size=batch_size
+    )
+    return _rebatch(batches, batch_size)
+
+
+def _rebatch(batches, size):
+    # Los batches del scanner no cruzan archivos (uno por país y año): reagruparlos en bloques parejos
+    pending, rows = [], 0
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, size)
+            rest = table.slice(size)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(pending)
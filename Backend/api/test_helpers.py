@@ -0,0 +1,143 @@
+"""
+Implementaciones de referencia y datos sintéticos compartidos por ``api.tests`` y
+los benchmarks: los tests verifican paridad contra estas versiones originales
+(más lentas) sin depender del paquete ``benchmarks``.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+
+RISK_MAPPING = {'low': 0, 'medium': 1, 'high': 2, 'very-high': 3}
+
+
+def calculate_risk_level(row):
+    """Reglas originales de create_risk_labels (referencia para paridad)."""
+    magnitude_factor = 0
+    if row['max_mag_last90d'] >= 6.0:
+        magnitude_factor = 4
+    elif row['max_mag_last90d'] >= 5.5:
+        magnitude_factor = 3
+    elif row['max_mag_last90d'] >= 5.0:
+        magnitude_factor = 2
+    elif row['max_mag_last90d'] >= 4.5:
+        magnitude_factor = 1
+
+    frequency_factor = 0
+    if row['eq_count_m3_last7d'] >= 10:
+        frequency_factor = 3
+    elif row['eq_count_m3_last7d'] >= 5:
+        frequency_factor = 2
+    elif row['eq_count_m3_last7d'] >= 2:
+        frequency_factor = 1
+
+    probability_factor = 0
+    if row['prob_m45_next7d'] >= 0.3:
+        probability_factor = 3
+    elif row['prob_m45_next7d'] >= 0.2:
+        probability_factor = 2
+    elif row['prob_m45_next7d'] >= 0.1:
+        probability_factor = 1
+
+    total_score = magnitude_factor + frequency_factor + probability_factor
+
+    if total_score >= 8:
+        return 'very-high'
+    elif total_score >= 6:
+        return 'high'
+    elif total_score >= 3:
+        return 'medium'
+    else:
+        return 'low'
+
+
+def legacy_risk_labels(df):
+    risk_level = df.apply(calculate_risk_level, axis=1)
+    return risk_level, risk_level.map(RISK_MAPPING)
+
+
+def synthetic_frame(n, rng):
+    """Columnas con valores en los umbrales exactos, fuera de rango y NaN."""
+    magnitude = rng.choice([np.nan, 4.4, 4.5, 4.9, 5.0, 5.5, 5.99, 6.0, 7.2], size=n)
+    magnitude = np.where(rng.random(n) < 0.5, rng.uniform(2.0, 8.0, n), magnitude)
+    count = rng.choice([np.nan, 0, 1, 2, 4, 5, 9, 10, 40], size=n).astype(float)
+    prob = rng.choice([np.nan, 0.0, 0.0999, 0.1, 0.2, 0.29999, 0.3, 0.9], size=n)
+    prob = np.where(rng.random(n) < 0.5, rng.uniform(0.0, 0.5, n), prob)
+    return pd.DataFrame({'max_mag_last90d': magnitude, 'eq_count_m3_last7d': count, 'prob_m45_next7d': prob})
+
+
+N_FEATURES = 23
+
+
+def synthetic_data(n, rng):
+    """Features estandarizados y 4 clases de riesgo con ruido."""
+    X = rng.normal(size=(n, N_FEATURES))
+    score = X[:, 0] + 0.5 * X[:, 1] - 0.3 * X[:, 2] + rng.normal(scale=0.5, size=n)
+    return X, np.digitize(score, [-0.5, 0.5, 1.5])
+
+
+def synthetic_events(cells=500, days=3 * 365, events_per_day=400, seed=0):
+    """Eventos ``(celda, día ordinal, magnitud)`` ordenados por día."""
+    rng = np.random.default_rng(seed)
+    start = 737000
+    event_days = np.sort(rng.integers(start, start + days, size=days * events_per_day))
+    event_cells = rng.zipf(1.5, size=len(event_days)) % cells
+    magnitudes = np.round(2.5 + rng.exponential(1 / math.log(10), size=len(event_days)), 1)
+    return list(zip(event_cells.tolist(), event_days.tolist(), magnitudes.tolist()))
+
+
+def rescan_features(days, magnitudes, day):
+    """Features al final de ``day`` releyendo la historia de la celda (arreglos ordenados por día)."""
+    days = np.asarray(days)
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    end = np.searchsorted(days, day, side='right')
+
+    def window(n):
+        return magnitudes[np.searchsorted(days, day - n, side='right'):end]
+
+    last7, last30, last90, year = window(7), window(30), window(90), window(365)
+    m5_days = days[:end][magnitudes[:end] >= 5]
+    count_m3 = int((last7 >= 3).sum())
+    b_value = a_value = None
+    if len(year) >= 5 and year.mean() - year.min() > 1e-9:
+        b_value = math.log10(math.e) / (year.mean() - year.min())
+        a_value = math.log10(len(year)) + b_value * year.min()
+    return {
+        'eq_count_m3_last7d': count_m3,
+        'eq_count_m4_last30d': int((last30 >= 4).sum()),
+        'max_mag_last90d': float(last90.max()) if len(last90) else None,
+        'energy_sum_last365d': float(np.sum(10 ** (1.5 * year + 4.8))),
+        'days_since_last_m5': int(day - m5_days[-1]) if len(m5_days) else None,
+        'gr_b_value_last365d': b_value,
+        'gr_a_value_last365d': a_value,
+        'aftershock_rate': count_m3 / 7,
+    }
+
+
+def synthetic_catalog(cells=10_000, events=1_000_000, seed=0):
+    """(celda, magnitud) por evento: GR con b = 1 y detección que cae bajo M 2.5."""
+    rng = np.random.default_rng(seed)
+    magnitudes = 1.5 + rng.exponential(1 / math.log(10), size=events * 8)
+    detected = rng.random(len(magnitudes)) < 1 / (1 + np.exp(-(magnitudes - 2.3) * 8))
+    magnitudes = np.round(magnitudes[detected][:events], 1)
+    return rng.integers(0, cells, size=len(magnitudes)), magnitudes
+
+
+def per_cell_gr(cells, magnitudes, mag_bin=0.1, correction=0.2, min_events=5):
+    """Referencia: una estimación por celda en un bucle de Python."""
+    rows = {}
+    order = np.argsort(cells, kind='stable')
+    cells, magnitudes = np.asarray(cells)[order], np.asarray(magnitudes, dtype=float)[order]
+    labels, starts = np.unique(cells, return_index=True)
+    for label, cell_magnitudes in zip(labels, np.split(magnitudes, starts[1:])):
+        edges = np.arange(cell_magnitudes.min() - mag_bin / 2, cell_magnitudes.max() + mag_bin, mag_bin)
+        histogram, _ = np.histogram(cell_magnitudes, bins=edges)
+        mc = round(edges[histogram.argmax()] + mag_bin / 2 + correction, 1)
+        above = cell_magnitudes[cell_magnitudes >= mc - 1e-9]
+        b_value = a_value = math.nan
+        if len(above) >= min_events and above.mean() - (mc - mag_bin / 2) > 0:
+            b_value = math.log10(math.e) / (above.mean() - (mc - mag_bin / 2))
+            a_value = math.log10(len(above)) + b_value * mc
+        rows[label] = (mc, b_value, a_value, len(above))
+    return rows
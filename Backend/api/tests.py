@@ -1,3 +1,913 @@
-from django.test import TestCase
+import importlib
+import json
+import math
+import os
+import shutil
+import tempfile
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipIf
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from .cache import CACHE_ALIAS, bump_data_version, data_version
+from .db_optimization import ALL_PREDICTION_INDEXES, apply_prediction_indexes, drop_prediction_indexes
+from .features import FeatureEngine, event_energy
+from .forest_export import CompactForest, compact_model
+from .gutenberg_richter import estimate_gr
+from .ingest import ingest_catalog
+from .ml_service import (
+    PREDICTION_COLUMN_NAMES, TARGET_COLUMNS, TRAINING_COLUMN_NAMES, FeaturePipeline, TargetRegressor, ml_service,
+)
+from .model_registry import MODEL_NAMES, PIPELINE_NAME, ModelRegistry, artifact_path
+from .models import EarthquakePrediction, PredictionRollup, RollupState
+from .rollups import refresh_rollups
+from . import snapshot
+from .test_helpers import (
+    legacy_risk_labels, per_cell_gr, rescan_features, synthetic_catalog, synthetic_data, synthetic_events,
+    synthetic_frame,
+)
+from .training import plan_workers, train_job
+
+
+class PredictionTableTestCase(TestCase):
+    """Crea la tabla prediction (managed = False) en la base de datos de tests."""
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            editor.create_model(EarthquakePrediction)
+        with connection.cursor() as cursor:
+            apply_prediction_indexes(cursor)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            editor.delete_model(EarthquakePrediction)
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = []
+        for i, (country, date, magnitude) in enumerate([
+            ('Chile', '2024-01-15', 5.5),
+            ('Chile', '2024-06-02', 6.1),
+            ('Chile', '2023-03-10', 4.8),
+            ('Peru', '2024-02-20', 5.0),
+            ('Peru', '2022-11-05', None),
+            ('Argentina', '2024-07-30', 4.2),
+            ('Panama', '2024-05-05', 6.4),
+        ]):
+            rows.append(EarthquakePrediction(
+                cell_id=f'test{i}', country_code=country, event_date=date,
+                max_mag_last90d=magnitude, prob_m45_next7d=0.05 * (i + 1),
+            ))
+        EarthquakePrediction.objects.bulk_create(rows)
+
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+
+
+class StatisticsQueryCountTests(PredictionTableTestCase):
+    """
+    Cada endpoint de estadísticas debe costar un número fijo de consultas, sin importar
+    los países. Sin caché: data_version + una consulta agrupada (rollups y filas sin agregar).
+    """
+
+    def setUp(self):
+        super().setUp()
+        refresh_rollups(full=True)
+
+    def test_south_american_countries_single_grouped_query(self):
+        # La consulta agrupada incluye el fallback global
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/countries/south-american/')
+        self.assertEqual(response.status_code, 200)
+        by_name = {c['name']: c for c in response.json()}
+        self.assertEqual(len(by_name), 12)
+        self.assertEqual(by_name['Chile']['total_records'], 3)
+        self.assertEqual(by_name['Chile']['magnitude'], 6.1)
+        self.assertEqual(by_name['Uruguay']['total_records'], 0)
+
+    def test_yearly_statistics_single_grouped_query(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/statistics/year/2024/')
+        data = response.json()
+        self.assertEqual(data['general']['total_earthquakes'], 5)
+        self.assertEqual(data['general']['max_magnitude'], 6.4)
+        self.assertEqual(
+            [(c['country'], c['count']) for c in data['by_country']],
+            [('Argentina', 1), ('Chile', 2), ('Peru', 1)],
+        )
+
+    def test_all_years_statistics_single_grouped_query(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/statistics/all-years/')
+        data = response.json()
+        self.assertEqual(data['general']['total_earthquakes'], 6)
+        self.assertEqual(data['general']['first_date'], '2022-11-05')
+        self.assertAlmostEqual(data['general']['avg_magnitude'], (5.5 + 6.1 + 4.8 + 5.0 + 4.2) / 5)
+
+    def test_country_all_years_statistics_query_count(self):
+        # data_version + desglose por año + eventos
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/countries/Chile/all-years/')
+        data = response.json()
+        self.assertEqual(data['total_earthquakes'], 3)
+        self.assertEqual([y['year'] for y in data['yearly_breakdown']], ['2023', '2024'])
+
+    def test_new_rows_are_folded_in_incrementally(self):
+        EarthquakePrediction.objects.create(
+            cell_id='new', country_code='Chile', event_date='2024-09-09', max_mag_last90d=7.0,
+        )
+        rollups = list(PredictionRollup.objects.values_list('country_code', 'year', 'month', 'event_count'))
+        # Las filas sin agregar se suman al leer, sin escribir en los rollups desde el GET
+        response = self.client.get('/api/statistics/year/2024/')
+        chile = next(c for c in response.json()['by_country'] if c['country'] == 'Chile')
+        self.assertEqual(chile['count'], 3)
+        self.assertEqual(chile['max_magnitude'], 7.0)
+        self.assertEqual(chile['last_date'], '2024-09-09')
+        self.assertEqual(
+            list(PredictionRollup.objects.values_list('country_code', 'year', 'month', 'event_count')), rollups
+        )
+
+        # Tras el refresco (camino de escritura) la fila está en los rollups y no se cuenta dos veces
+        self.assertEqual(refresh_rollups(), 1)
+        self.assertEqual(PredictionRollup.objects.get(country_code='Chile', year=2024, month=9).event_count, 1)
+        caches[CACHE_ALIAS].clear()
+        response = self.client.get('/api/statistics/year/2024/')
+        chile = next(c for c in response.json()['by_country'] if c['country'] == 'Chile')
+        self.assertEqual(chile['count'], 3)
+
+
+class EventYearMigrationTests(PredictionTableTestCase):
+    """La migración 0002 agrega event_year (backfill + triggers) y el índice covering por año."""
+
+    def year_of(self, record_id):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT event_year FROM prediction WHERE record_id = %s", [record_id])
+            return cursor.fetchone()[0]
+
+    def test_migration_backfills_and_triggers_keep_event_year(self):
+        migration = importlib.import_module('api.migrations.0002_prediction_indexes')
+        schema_editor = SimpleNamespace(connection=connection)
+        with connection.cursor() as cursor:
+            # Estado anterior a 0002: sin índices, triggers ni columna event_year
+            drop_prediction_indexes(cursor)
+            migration.backwards(None, schema_editor)
+            cursor.execute("PRAGMA table_info(prediction)")
+            self.assertNotIn('event_year', {row[1] for row in cursor.fetchall()})
+            migration.forwards(None, schema_editor)
+
+            cursor.execute("SELECT COUNT(*) FROM prediction WHERE event_year IS NOT CAST(substr(event_date, 1, 4) AS INTEGER)")
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute("INSERT INTO prediction (cell_id, country_code, event_date) VALUES ('y', 'Chile', '2021-04-01')")
+            record_id = cursor.lastrowid
+            self.assertEqual(self.year_of(record_id), 2021)
+            cursor.execute("UPDATE prediction SET event_date = '2019-12-31' WHERE record_id = %s", [record_id])
+            self.assertEqual(self.year_of(record_id), 2019)
+            # Ni escribiendo event_year a mano se desincroniza
+            cursor.execute("UPDATE prediction SET event_year = 1900 WHERE record_id = %s", [record_id])
+            self.assertEqual(self.year_of(record_id), 2019)
+
+            cursor.execute(
+                "EXPLAIN QUERY PLAN SELECT COUNT(*), AVG(max_mag_last90d), MAX(max_mag_last90d), "
+                "MIN(event_date), MAX(event_date) FROM prediction WHERE event_year = %s AND country_code = %s",
+                [2024, 'Chile'],
+            )
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn('USING COVERING INDEX idx_prediction_year_country', plan)
+
+
+class RollupBackfillMigrationTests(PredictionTableTestCase):
+    """La migración 0007 deja los rollups cargados en una BD que ya tenía prediction."""
+
+    @staticmethod
+    def rollup_rows():
+        return list(
+            PredictionRollup.objects.order_by('country_code', 'year', 'month')
+            .values_list(*[f.name for f in PredictionRollup._meta.fields if f.name != 'id'])
+        )
+
+    def test_migration_matches_full_refresh(self):
+        migration = importlib.import_module('api.migrations.0007_backfill_prediction_rollups')
+        migration.forwards(None, SimpleNamespace(connection=connection))
+        backfilled = self.rollup_rows()
+        self.assertTrue(backfilled)
+        max_record_id = EarthquakePrediction.objects.order_by('-record_id').values_list('record_id', flat=True)[0]
+        self.assertEqual(RollupState.objects.get(name='prediction').last_record_id, max_record_id)
+        # Nada queda pendiente para las lecturas y el resultado es el de una reconstrucción completa
+        self.assertEqual(refresh_rollups(), 0)
+        refresh_rollups(full=True)
+        self.assertEqual(self.rollup_rows(), backfilled)
+
+        migration.backwards(None, SimpleNamespace(connection=connection))
+        self.assertEqual(self.rollup_rows(), [])
+        self.assertFalse(RollupState.objects.exists())
+
+
+class EventPaginationTests(PredictionTableTestCase):
+    """Paginación por cursor y streaming NDJSON de los listados de eventos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Varios eventos el mismo día para ejercitar el desempate por record_id
+        EarthquakePrediction.objects.bulk_create([
+            EarthquakePrediction(cell_id=f'dup{i}', country_code='Chile', event_date='2024-03-03',
+                                 max_mag_last90d=4.0 + i / 10)
+            for i in range(5)
+        ])
+
+    def walk_pages(self, url, limit):
+        events, cursor, pages = [], None, 0
+        while True:
+            params = {'limit': limit}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(url, params).json()
+            events.extend(data['recent_events'])
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                return events, pages
+
+    def test_pages_cover_full_listing_in_order(self):
+        for url in ('/api/countries/Chile/year/2024/', '/api/countries/Chile/all-years/'):
+            full = self.client.get(url).json()
+            self.assertNotIn('next_cursor', full)
+            events, pages = self.walk_pages(url, 2)
+            self.assertEqual(events, full['recent_events'])
+            self.assertEqual(pages, (len(events) + 1) // 2)
+
+    def test_ndjson_stream_matches_listing(self):
+        url = '/api/countries/Chile/all-years/'
+        response = self.client.get(url, {'stream': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.client.get(url).json()['recent_events'])
+
+        first_page = self.client.get(url, {'limit': 3}).json()
+        rest = self.client.get(url, {'stream': 'ndjson', 'cursor': first_page['next_cursor']})
+        streamed = [json.loads(line) for line in b''.join(rest.streaming_content).decode().splitlines()]
+        self.assertEqual(first_page['recent_events'] + streamed, self.client.get(url).json()['recent_events'])
+
+    def test_invalid_page_params(self):
+        for params in ({'limit': 0}, {'limit': 'x'}, {'cursor': 'no-es-un-cursor'}, {'stream': 'csv'}):
+            response = self.client.get('/api/countries/Chile/year/2024/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class ResponseCacheTests(PredictionTableTestCase):
+    """Caché de respuestas invalidado por versión de datos, con ETag / If-None-Match."""
+
+    url = '/api/statistics/year/2024/'
+
+    def test_cache_hit_costs_only_the_version_check(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"otro"').status_code, 200)
+
+    def test_query_params_are_part_of_the_key(self):
+        full = self.client.get('/api/countries/Chile/all-years/')
+        page = self.client.get('/api/countries/Chile/all-years/', {'limit': 1})
+        self.assertNotEqual(full['ETag'], page['ETag'])
+        self.assertEqual(len(page.json()['recent_events']), 1)
+
+    def test_insert_invalidates(self):
+        before = self.client.get(self.url)
+        EarthquakePrediction.objects.create(
+            cell_id='new', country_code='Chile', event_date='2024-09-09', max_mag_last90d=7.0,
+        )
+        after = self.client.get(self.url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(after.json()['general']['total_earthquakes'],
+                         before.json()['general']['total_earthquakes'] + 1)
+
+    def test_edit_invalidates_after_version_bump(self):
+        before = self.client.get(self.url)
+        EarthquakePrediction.objects.filter(country_code='Panama').update(max_mag_last90d=8.0)
+        self.assertEqual(self.client.get(self.url)['ETag'], before['ETag'])
+        refresh_rollups(full=True)
+        after = self.client.get(self.url)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(after.json()['general']['max_magnitude'], 8.0)
+
+    def test_bump_data_version_changes_etag(self):
+        before = self.client.get(self.url)['ETag']
+        bump_data_version()
+        self.assertNotEqual(self.client.get(self.url)['ETag'], before)
+
+    def test_streams_and_errors_are_not_cached(self):
+        stream = self.client.get('/api/countries/Chile/all-years/', {'stream': 'ndjson'})
+        self.assertFalse(stream.has_header('ETag'))
+        error = self.client.get('/api/countries/Chile/year/2019/')
+        self.assertEqual(error.status_code, 400)
+        self.assertFalse(error.has_header('ETag'))
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """Registro de modelos por país: carga perezosa, LRU y reemplazo atómico."""
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir)
+        self.registry = ModelRegistry(self.model_dir, max_size=2, check_interval=0)
+
+    def write_artifacts(self, key, tag):
+        for name in MODEL_NAMES + (PIPELINE_NAME,):
+            joblib.dump(f'{name}-{tag}', artifact_path(self.model_dir, name, key))
+
+    def test_country_bundle_with_global_fallback(self):
+        self.assertIsNone(self.registry.get('Chile'))
+        self.write_artifacts('global', 'g1')
+        self.assertEqual(self.registry.get('Chile').key, 'global')
+        self.write_artifacts('Chile', 'c1')
+        bundle = self.registry.get('Chile')
+        self.assertEqual(bundle.key, 'Chile')
+        self.assertEqual(bundle.models['risk_classifier'], 'risk_classifier-c1')
+        self.assertEqual(self.registry.get('Peru').key, 'global')
+
+    def test_lru_bound(self):
+        for key in ('Chile', 'Peru', 'Ecuador'):
+            self.write_artifacts(key, '1')
+            self.registry.get(key)
+        self.assertEqual(self.registry.loaded_keys(), ['Peru', 'Ecuador'])
+
+    def test_retraining_on_disk_is_picked_up(self):
+        self.write_artifacts('Chile', 'old')
+        in_flight = self.registry.get('Chile')
+        self.write_artifacts('Chile', 'new')
+        pipeline_path = artifact_path(self.model_dir, PIPELINE_NAME, 'Chile')
+        os.utime(pipeline_path, ns=(in_flight.version + 10**9, in_flight.version + 10**9))
+        self.assertEqual(self.registry.get('Chile').pipeline, 'pipeline-new')
+        # La referencia tomada antes del cambio no se modifica
+        self.assertEqual(in_flight.pipeline, 'pipeline-old')
+
+    def test_publish_swaps_without_touching_previous_bundle(self):
+        self.write_artifacts('Chile', 'old')
+        before = self.registry.get('Chile')
+        published = self.registry.publish('Chile', {name: 'fresh' for name in MODEL_NAMES}, 'pipeline-fresh')
+        self.assertIs(self.registry.get('Chile'), published)
+        self.assertEqual(before.models['risk_classifier'], 'risk_classifier-old')
+
+
+class FeaturePipelineTests(SimpleTestCase):
+    """El pipeline se ajusta al entrenar y en inferencia solo transforma."""
+
+    def test_transform_uses_training_medians_and_scaler(self):
+        train = pd.DataFrame({'a': [1.0, 2.0, 3.0, None], 'b': [10.0, 20.0, 30.0, 40.0], 'c': [None] * 4})
+        pipeline = FeaturePipeline.fit(train, ['a', 'b', 'c'])
+        mean, scale = pipeline.scaler.mean_.copy(), pipeline.scaler.scale_.copy()
+
+        row = pd.DataFrame({'a': [None], 'b': [20.0]})
+        X = pipeline.transform(row)
+        # 'a' se imputa con la mediana de entrenamiento y 'c' (ausente) con 0
+        expected = (np.array([[2.0, 20.0, 0.0]]) - mean) / scale
+        np.testing.assert_allclose(X, expected)
+        np.testing.assert_array_equal(pipeline.scaler.mean_, mean)
+        np.testing.assert_array_equal(pipeline.scaler.scale_, scale)
+
+
+class CompactForestTests(SimpleTestCase):
+    """Exportación compacta: mismas predicciones que scikit-learn, cargada con mmap."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(3)
+        cls.X, y = synthetic_data(600, rng)
+        cls.X_new, _ = synthetic_data(300, rng)
+        cls.classifier = RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0).fit(cls.X, y)
+        targets = np.column_stack([cls.X[:, 0] * 2 + 5, np.abs(cls.X[:, 1]) * 10])
+        cls.regressor = TargetRegressor.for_targets(targets, n_estimators=15, max_depth=6, random_state=0)
+        cls.regressor.fit(cls.X, targets)
+
+    def test_classifier_parity(self):
+        compact = compact_model(self.classifier)
+        self.assertIsInstance(compact, CompactForest)
+        np.testing.assert_array_equal(compact.predict(self.X_new), self.classifier.predict(self.X_new))
+        np.testing.assert_array_equal(compact.predict_proba(self.X_new), self.classifier.predict_proba(self.X_new))
+        self.assertEqual(compact.predict(self.X_new[:1]).shape, (1,))
+
+    def test_multi_output_regressor_parity(self):
+        compact = compact_model(self.regressor)
+        self.assertIsInstance(compact, TargetRegressor)
+        self.assertIsInstance(compact.forest, CompactForest)
+        np.testing.assert_array_equal(compact.predict(self.X_new), self.regressor.predict(self.X_new))
+
+    def test_registry_serves_memory_mapped_export(self):
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir)
+        models = {'risk_classifier': self.classifier, 'target_regressor': self.regressor}
+        for name, model in models.items():
+            joblib.dump(model, artifact_path(model_dir, name, 'Chile'))
+            joblib.dump(compact_model(model), artifact_path(model_dir, name, 'Chile', compact=True))
+        joblib.dump('pipeline', artifact_path(model_dir, PIPELINE_NAME, 'Chile'))
+
+        bundle = ModelRegistry(model_dir).get('Chile')
+        classifier = bundle.models['risk_classifier']
+        self.assertIsInstance(classifier, CompactForest)
+        self.assertIsInstance(classifier.value, np.memmap)
+        np.testing.assert_array_equal(classifier.predict(self.X_new), self.classifier.predict(self.X_new))
+        # Con la exportación desactivada se usan los modelos de scikit-learn
+        bundle = ModelRegistry(model_dir, compact=False).get('Chile')
+        self.assertIsInstance(bundle.models['risk_classifier'], RandomForestClassifier)
+
+
+@skipIf(snapshot.pa is None, 'pyarrow no está instalado')
+class PredictionSnapshotTests(PredictionTableTestCase):
+    """Snapshot Parquet de prediction: mismas filas que el cursor y descartado si queda viejo."""
+
+    def setUp(self):
+        super().setUp()
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        patcher = mock.patch('api.snapshot.SNAPSHOT_DIR', Path(snapshot_dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manifest = snapshot.write_snapshot()
+
+    def cursor_frame(self, **kwargs):
+        with mock.patch.object(snapshot, 'current_snapshot', return_value=None):
+            return ml_service.load_data_from_db(**kwargs)
+
+    def test_partitioned_by_country_and_year(self):
+        self.assertEqual(self.manifest['rows'], 7)
+        path = snapshot.current_snapshot()
+        self.assertTrue((path / 'country_code=Chile' / 'year=2024').is_dir())
+        columns = snapshot.read_columns(['record_id', 'max_mag_last90d'], country_code='Chile')
+        self.assertEqual(sorted(columns['record_id']), sorted(
+            EarthquakePrediction.objects.filter(country_code='Chile').values_list('record_id', flat=True)
+        ))
+
+    def test_load_matches_cursor(self):
+        for kwargs in ({}, {'country_code': 'Chile'}, {'limit': 3}, {'limit': 6}, {'country_code': 'Peru', 'limit': 1}):
+            expected = self.cursor_frame(**kwargs)
+            actual = ml_service.load_data_from_db(**kwargs)
+            self.assertEqual(list(actual.columns), PREDICTION_COLUMN_NAMES)
+            # Texto nulo: NaN en columnas str de Arrow, None en object del cursor
+            normalize = lambda frame: frame.astype(object).where(frame.notna(), None)
+            pd.testing.assert_frame_equal(normalize(actual), normalize(expected))
+
+    def test_training_columns_match_cursor(self):
+        for kwargs in ({}, {'country_code': 'Chile'}, {'limit': 3}, {'country_code': 'Peru', 'limit': 1}):
+            with self.subTest(**kwargs):
+                expected = self.cursor_frame(columns=TRAINING_COLUMN_NAMES, **kwargs)
+                actual = ml_service.load_data_from_db(columns=TRAINING_COLUMN_NAMES, **kwargs)
+                self.assertEqual(list(actual.columns), TRAINING_COLUMN_NAMES)
+                # Del snapshot event_date llega como datetime64; create_derived_features la convierte igual
+                for frame in (expected, actual):
+                    frame['event_date'] = pd.to_datetime(frame['event_date'])
+                pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    def test_training_reads_only_training_columns(self):
+        with mock.patch.object(snapshot, 'read_columns', wraps=snapshot.read_columns) as read_columns, \
+                mock.patch.object(snapshot, 'read_table', wraps=snapshot.read_table) as read_table, \
+                mock.patch.object(ml_service, 'save_models'):
+            ml_service.train_models()
+        self.assertEqual(read_columns.call_args.args[0], TRAINING_COLUMN_NAMES)
+        # Ninguna lectura de todas las columnas de prediction
+        self.assertTrue(all(call.args[0] != PREDICTION_COLUMN_NAMES for call in read_table.call_args_list))
+        chunks = list(ml_service.iter_data_chunks(chunk_size=3, columns=TRAINING_COLUMN_NAMES))
+        self.assertEqual(list(chunks[0].columns), TRAINING_COLUMN_NAMES)
+
+    def test_limit_reads_only_newest_years(self):
+        dataset = snapshot._dataset(snapshot.current_snapshot())
+        # 2024 tiene 5 filas: un límite de hasta 5 no abre las particiones de años anteriores
+        self.assertEqual(snapshot._latest_years(dataset, 5), [2024])
+        self.assertEqual(snapshot._latest_years(dataset, 6), [2024, 2023])
+        self.assertEqual(snapshot._latest_years(dataset, 2, country_code='Peru'), [2024, 2022])
+
+    def test_chunks_from_snapshot(self):
+        chunks = list(ml_service.iter_data_chunks(chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual(pd.concat(chunks)['record_id'].nunique(), 7)
+
+    def test_stale_snapshot_falls_back_to_cursor(self):
+        EarthquakePrediction.objects.create(cell_id='new', country_code='Chile', event_date='2025-01-01')
+        self.assertIsNone(snapshot.current_snapshot())
+        self.assertEqual(len(ml_service.load_data_from_db()), 8)
+
+
+class IngestCatalogTests(PredictionTableTestCase):
+    """Ingesta de catálogos CSV/NDJSON con UPSERT sobre cell_id."""
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write(self, name, content):
+        path = Path(self.tmpdir) / name
+        path.write_text(content)
+        return str(path)
+
+    def test_csv_inserts_updates_and_rejects(self):
+        path = self.write('catalog.csv', (
+            'cell_id,country_code,event_date,max_mag_last90d,location,mag\n'
+            'us7000new1,Chile,2025-08-28T12:34:56Z,6.2,,5.9\n'
+            'test0,Chile,2024-01-15,7.1,Valparaíso,7.0\n'
+            'us7000new2,,2025-08-29,5.0,,5.0\n'
+        ))
+        version = data_version()
+        stats = ingest_catalog([path], batch_size=2)
+
+        self.assertEqual((stats['rows'], stats['inserted'], stats['updated'], stats['rejected']), (3, 1, 1, 1))
+        new = EarthquakePrediction.objects.get(cell_id='us7000new1')
+        self.assertEqual((str(new.event_date), new.event_year, new.max_mag_last90d), ('2025-08-28', 2025, 6.2))
+        self.assertIsNone(new.location)
+        updated = EarthquakePrediction.objects.get(cell_id='test0')
+        self.assertEqual((updated.max_mag_last90d, updated.location), (7.1, 'Valparaíso'))
+        # Columnas ausentes del archivo no se tocan
+        self.assertAlmostEqual(updated.prob_m45_next7d, 0.05)
+
+        self.assertNotEqual(data_version(), version)
+        chile_2024 = PredictionRollup.objects.get(country_code='Chile', year=2024, month=1)
+        self.assertEqual(chile_2024.magnitude_max, 7.1)
+
+    def test_csv_short_lines_are_rejected(self):
+        # Línea en blanco en el medio y última línea truncada: no corta la ingesta a mitad
+        path = self.write('catalog.csv', (
+            'cell_id,country_code,event_date,max_mag_last90d,location\n'
+            'us7000new1,Chile,2025-08-28,6.2,Arica\n'
+            '\n'
+            'us7000new2,Peru,2025-08-29,5.0,Lima\n'
+            'us7000new3,Peru,2025-08-30,5.1,Lima\n'
+            'us7000new4,Peru,2025-0'
+        ))
+        version = data_version()
+        stats = ingest_catalog([path], batch_size=2)
+
+        self.assertEqual((stats['rows'], stats['inserted'], stats['rejected']), (4, 3, 1))
+        self.assertFalse(EarthquakePrediction.objects.filter(cell_id='us7000new4').exists())
+        self.assertNotEqual(data_version(), version)
+        self.assertEqual(PredictionRollup.objects.get(country_code='Peru', year=2025, month=8).event_count, 2)
+
+    def test_csv_derive_features_from_magnitudes(self):
+        rng = np.random.default_rng(5)
+        start = date(2025, 1, 1).toordinal()
+        events = [
+            (f'ev{i}', 'AB'[i % 2], start + i * 3, round(float(rng.uniform(2.5, 6.0)), 1)) for i in range(200)
+        ]
+        path = self.write('catalog.csv', 'cell_id,country_code,admin_region,event_date,mag\n' + ''.join(
+            f'{event_id},Chile,{region},{date.fromordinal(day)},{magnitude}\n'
+            for event_id, region, day, magnitude in events
+        ))
+        stats = ingest_catalog([path], batch_size=64, derive_features=True)
+        self.assertEqual(stats['inserted'], 200)
+
+        # Cada fila lleva los features de la historia previa de su región (sin el propio evento)
+        stored = {row.cell_id: row for row in EarthquakePrediction.objects.filter(cell_id__startswith='ev')}
+        history = {'A': ([], []), 'B': ([], [])}
+        for event_id, region, day, magnitude in events:
+            days, magnitudes = history[region]
+            row = stored[event_id]
+            self.assertEqual(row.admin_region, region)
+            expected = rescan_features(days, magnitudes, day)
+            for column, value in expected.items():
+                actual = getattr(row, column)
+                if value is None:
+                    self.assertIsNone(actual, column)
+                else:
+                    self.assertTrue(math.isclose(actual, value, rel_tol=1e-9), f'{column}: {actual} != {value}')
+            days.append(day)
+            magnitudes.append(magnitude)
+
+    def test_derive_features_requires_magnitude(self):
+        path = self.write('catalog.csv', 'cell_id,country_code,event_date\nus1,Chile,2025-01-01\n')
+        with self.assertRaisesMessage(ValueError, 'mag'):
+            ingest_catalog([path], derive_features=True)
+
+    def test_ndjson_with_deferred_indexes(self):
+        path = self.write('catalog.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'cell_id': f'nj{i}', 'country_code': 'Peru', 'event_date': '2025-01-0' + str(i + 1), 'mag': 5}
+            for i in range(5)
+        ]) + '\n')
+        stats = ingest_catalog([path], defer_indexes=True)
+
+        self.assertEqual((stats['inserted'], stats['updated']), (5, 0))
+        self.assertEqual(EarthquakePrediction.objects.filter(country_code='Peru', event_year=2025).count(), 5)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'prediction'")
+            self.assertLessEqual(set(ALL_PREDICTION_INDEXES), {row[0] for row in cursor.fetchall()})
+
+    def test_missing_required_column(self):
+        path = self.write('catalog.csv', 'cell_id,event_date\nus1,2025-01-01\n')
+        with self.assertRaisesMessage(ValueError, 'country_code'):
+            ingest_catalog([path])
+        with self.assertRaises(ValueError):
+            ingest_catalog([self.write('catalog.txt', '')])
+
+
+class FeatureEngineTests(SimpleTestCase):
+    """Ventanas móviles incrementales contra el reescaneo de la historia por celda."""
+
+    def assertFeaturesEqual(self, actual, expected):
+        for column, value in expected.items():
+            if value is None:
+                self.assertIsNone(actual[column], column)
+            else:
+                self.assertTrue(math.isclose(actual[column], value, rel_tol=1e-9), f'{column}: {actual[column]} != {value}')
+
+    def test_matches_rescan(self):
+        engine = FeatureEngine()
+        history = {}
+        events = synthetic_events(cells=20, days=500, events_per_day=15, seed=3)
+        for cell, day, magnitude in events:
+            engine.append([(cell, day, magnitude)])
+            days, magnitudes = history.setdefault(cell, ([], []))
+            days.append(day)
+            magnitudes.append(magnitude)
+            self.assertFeaturesEqual(engine.features(cell), rescan_features(days, magnitudes, day))
+        # Días sin eventos: las ventanas siguen venciendo
+        last_day = events[-1][1] + 40
+        for cell, (days, magnitudes) in history.items():
+            self.assertFeaturesEqual(engine.features(cell, last_day), rescan_features(days, magnitudes, last_day))
+
+    def test_window_edges(self):
+        engine = FeatureEngine()
+        engine.append([('c', date(2024, 1, 1), 5.5)])
+        self.assertEqual(engine.features('c', date(2024, 1, 7))['eq_count_m3_last7d'], 1)
+        self.assertEqual(engine.features('c', date(2024, 1, 8))['eq_count_m3_last7d'], 0)
+        self.assertEqual(engine.features('c', date(2024, 3, 30))['max_mag_last90d'], 5.5)
+        features = engine.features('c', date(2024, 3, 31))
+        self.assertIsNone(features['max_mag_last90d'])
+        self.assertEqual(features['days_since_last_m5'], 90)
+
+    def test_energy_is_exact_after_large_event_expires(self):
+        engine = FeatureEngine()
+        engine.append([('c', 1, 9.0), ('c', 300, 3.0)])
+        self.assertEqual(engine.features('c', 365)['energy_sum_last365d'], float(event_energy(9.0) + event_energy(3.0)))
+        self.assertEqual(engine.features('c', 366)['energy_sum_last365d'], float(event_energy(3.0)))
+
+    def test_features_for_events_use_previous_history(self):
+        rows = FeatureEngine().features_for_events([('c', 10, 4.2), ('c', 11, 4.5), ('d', 11, 3.0)])
+        self.assertEqual([row['eq_count_m3_last7d'] for row in rows], [0, 1, 0])
+        self.assertEqual(rows[1]['max_mag_last90d'], 4.2)
+        self.assertIsNone(rows[2]['max_mag_last90d'])
+
+    def test_out_of_order_events(self):
+        engine = FeatureEngine()
+        engine.append([('c', 10, 4.0)])
+        with self.assertRaises(ValueError):
+            engine.append([('c', 9, 4.0)])
+
+
+class GutenbergRichterTests(SimpleTestCase):
+    """Estimación GR agrupada contra el bucle por celda."""
+
+    def test_matches_per_cell_loop(self):
+        cells, magnitudes = synthetic_catalog(cells=300, events=20_000, seed=1)
+        result = estimate_gr(cells, magnitudes)
+        expected = per_cell_gr(cells, magnitudes)
+        self.assertEqual(list(result.index), sorted(expected))
+        np.testing.assert_allclose(result.to_numpy(dtype=float), [expected[cell] for cell in result.index])
+
+    def test_recovers_b_value(self):
+        cells, magnitudes = synthetic_catalog(cells=1, events=50_000, seed=2)
+        row = estimate_gr(cells, magnitudes).iloc[0]
+        self.assertAlmostEqual(row['b_value'], 1.0, delta=0.05)
+        self.assertAlmostEqual(row['mc'], 2.6)
+
+    def test_bootstrap_independent_of_workers(self):
+        cells, magnitudes = synthetic_catalog(cells=20, events=5_000, seed=3)
+        with mock.patch('api.gutenberg_richter.BOOTSTRAP_CHUNK', 10):
+            inline = estimate_gr(cells, magnitudes, bootstrap=30, workers=1, seed=7)
+            pooled = estimate_gr(cells, magnitudes, bootstrap=30, workers=2, seed=7)
+        pd.testing.assert_frame_equal(inline, pooled)
+        self.assertTrue((inline['b_std'] > 0).all())
+
+    def test_sparse_cells_are_nan(self):
+        result = estimate_gr(['a'] * 3 + ['b'] * 6, [3.0, 3.1, 3.5, 2.0, 2.1, 2.2, 2.4, 2.9, 3.3], correction=0)
+        self.assertTrue(np.isnan(result.loc['a', 'b_value']))
+        self.assertEqual(result.loc['b', 'events'], 6)
+        self.assertFalse(np.isnan(result.loc['b', 'b_value']))
+
+
+class _CountingModel:
+    """Modelo falso que registra el tamaño de cada lote que recibe."""
+
+    def __init__(self, value):
+        self.value = value
+        self.batches = []
+
+    def predict(self, X):
+        self.batches.append(len(X))
+        return np.full((len(X),) + np.shape(self.value), self.value)
+
+
+class _IdentityPipeline:
+    def transform(self, df):
+        return np.zeros((len(df), 1))
+
+
+class BatchPredictionTests(PredictionTableTestCase):
+    """predict_many: una consulta y una llamada por modelo para todos los países del bundle."""
+
+    def setUp(self):
+        super().setUp()
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir)
+        self.registry = ModelRegistry(self.model_dir)
+        patcher = mock.patch('api.ml_service.model_registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.models = {
+            'risk_classifier': _CountingModel(2),
+            'target_regressor': _CountingModel([5.5, 1.0]),
+        }
+        self.registry.publish('global', self.models, _IdentityPipeline())
+
+    def test_one_query_and_one_model_call_per_bundle(self):
+        with self.assertNumQueries(1):
+            predictions = ml_service.predict_many(['Chile', 'Peru', 'Argentina', 'Uruguay'])
+        self.assertEqual(set(predictions), {'Chile', 'Peru', 'Argentina', 'Uruguay'})
+        for model in self.models.values():
+            self.assertEqual(model.batches, [3])
+        self.assertEqual(predictions['Chile']['risk'], 'high')
+        self.assertEqual(predictions['Chile']['averageMagnitude'], 5.5)
+        # Sin datos para Uruguay: predicción de respaldo
+        self.assertIn(predictions['Uruguay']['risk'], ['low', 'medium', 'high', 'very-high'])
+
+    def test_uses_latest_record_per_country(self):
+        latest = ml_service.load_latest_records(['Chile', 'Peru'])
+        self.assertEqual(
+            dict(zip(latest['country_code'], latest['event_date'].astype(str))),
+            {'Chile': '2024-06-02', 'Peru': '2024-02-20'},
+        )
+
+    def test_country_bundles_are_grouped(self):
+        chile_models = {'risk_classifier': _CountingModel(0), 'target_regressor': _CountingModel([4.0, 0.5])}
+        self.registry.publish('Chile', chile_models, _IdentityPipeline())
+        predictions = ml_service.predict_many(['Chile', 'Peru', 'Argentina'])
+        self.assertEqual(predictions['Chile']['risk'], 'low')
+        self.assertEqual(predictions['Peru']['risk'], 'high')
+        self.assertEqual(chile_models['risk_classifier'].batches, [1])
+        self.assertEqual(self.models['risk_classifier'].batches, [2])
+
+    def test_batch_endpoint(self):
+        response = self.client.post('/api/predictions/generate-batch', {'countries': ['Peru', 'Chile']},
+                                    content_type='application/json')
+        self.assertEqual([p['country'] for p in response.json()['data']], ['Peru', 'Chile'])
+        response = self.client.post('/api/predictions/generate-batch', {}, content_type='application/json')
+        self.assertEqual(len(response.json()['data']), 12)
+        response = self.client.post('/api/predictions/generate-batch', {'countries': ['Chile', 'Narnia']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        # Cuerpos que no son un objeto (o JSON inválido) y países que no son texto: 400, no 500
+        for body in (['Chile'], '"Chile"', 7, 'Chile', {'countries': ['Chile', 3]}, {'countries': [['Chile']]},
+                     {'countries': 'Chile'}):
+            with self.subTest(body=body):
+                response = self.client.post('/api/predictions/generate-batch', body,
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+
+class RiskLabelParityTests(SimpleTestCase):
+    """create_risk_labels columnar debe coincidir exactamente con las reglas fila por fila."""
+
+    def test_matches_row_wise_rules(self):
+        rng = np.random.default_rng(0)
+        df = synthetic_frame(20_000, rng)
+        # Conteos enteros (sin NaN) como llegan de la base de datos
+        df_int = df.assign(eq_count_m3_last7d=rng.integers(0, 15, len(df)))
+        for frame in (df, df_int):
+            expected_levels, expected_labels = legacy_risk_labels(frame)
+            result = ml_service.create_risk_labels(frame.copy())
+            self.assertEqual(list(result['risk_level']), list(expected_levels))
+            np.testing.assert_array_equal(result['risk_label'].to_numpy(), expected_labels.to_numpy())
+
+
+class ChunkedTrainingTests(PredictionTableTestCase):
+    """Entrenamiento en memoria y por bloques sobre todo el catálogo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(1)
+        EarthquakePrediction.objects.bulk_create([
+            EarthquakePrediction(
+                cell_id=f'c{i}', country_code='Chile', event_date=f'2024-{i % 12 + 1:02d}-01',
+                max_mag_last90d=float(rng.uniform(3.5, 7.0)), eq_count_m3_last7d=int(rng.integers(0, 15)),
+                eq_count_m4_last30d=int(rng.integers(0, 30)), aftershock_rate=float(rng.random()),
+                strain_rate=float(rng.random()), fault_slip_rate_mm_yr=float(rng.uniform(0, 80)),
+                prob_m45_next7d=float(rng.uniform(0, 0.5)),
+            )
+            for i in range(120)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir)
+        self.registry = ModelRegistry(model_dir)
+        patcher = mock.patch('api.ml_service.model_registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_split_and_one_multi_output_forest(self):
+        with mock.patch('api.ml_service.train_test_split', wraps=train_test_split) as split:
+            self.assertTrue(ml_service.train_models(country_code='Chile'))
+        self.assertEqual(split.call_count, 1)
+        regressor = ml_service.models['target_regressor']
+        self.assertIsInstance(regressor, TargetRegressor)
+        self.assertEqual(regressor.forest.n_outputs_, len(TARGET_COLUMNS))
+        df = ml_service.create_derived_features(ml_service.load_data_from_db(country_code='Chile'))
+        predictions = regressor.predict(ml_service.pipeline.transform(df))
+        self.assertEqual(predictions.shape, (len(df), len(TARGET_COLUMNS)))
+        # Cada columna queda en la escala de su objetivo
+        for column, target in zip(predictions.T, TARGET_COLUMNS):
+            self.assertLess(np.abs(column - df[target]).mean(), df[target].std())
+
+    def test_chunks_cover_catalog_in_bounded_blocks(self):
+        chunks = list(ml_service.iter_data_chunks(chunk_size=25))
+        self.assertEqual([len(chunk) for chunk in chunks], [25, 25, 25, 25, 20])
+        record_ids = pd.concat(chunks)['record_id']
+        self.assertTrue(record_ids.is_monotonic_increasing)
+        self.assertEqual(record_ids.nunique(), 120)
+
+    def test_train_chunked_grows_forests_and_publishes(self):
+        self.assertTrue(ml_service.train_models(country_code='Chile', chunk_size=25))
+        classifier = ml_service.models['risk_classifier']
+        self.assertEqual(len(classifier.estimators_), 100)
+        self.assertEqual(len(ml_service.models['target_regressor'].forest.estimators_), 100)
+        # Cada árbol del clasificador vio todas las clases (gracias a las filas de reserva)
+        for tree in classifier.estimators_:
+            self.assertEqual(tree.n_classes_, len(classifier.classes_))
+        # El bundle publicado se relee desde disco, con los arreglos mapeados
+        bundle = self.registry.get('Chile')
+        self.assertEqual(bundle.pipeline.features, ml_service.pipeline.features)
+        self.assertIsInstance(bundle.models['risk_classifier'].value, np.memmap)
+        X = bundle.pipeline.transform(ml_service.load_latest_records(['Chile']).pipe(ml_service.create_derived_features))
+        self.assertEqual(bundle.models['risk_classifier'].predict(X).shape, (1,))
+
+    def test_train_chunked_plants_exactly_n_estimators(self):
+        # 120 filas en bloques de 25 (5 bloques) y de 7 (18 bloques): repartos con resto y con más bloques que árboles
+        for chunk_size, n_estimators in ((25, 12), (25, 3), (7, 5)):
+            with self.subTest(chunk_size=chunk_size, n_estimators=n_estimators):
+                self.assertTrue(ml_service.train_models_chunked(
+                    country_code='Chile', chunk_size=chunk_size, n_estimators=n_estimators,
+                ))
+                self.assertEqual(len(ml_service.models['risk_classifier'].estimators_), n_estimators)
+                self.assertEqual(len(ml_service.models['target_regressor'].forest.estimators_), n_estimators)
+
+
+class ParallelTrainingTests(SimpleTestCase):
+    """Reparto de núcleos y escritura atómica del entrenamiento en paralelo."""
+
+    def test_plan_never_oversubscribes(self):
+        self.assertEqual(plan_workers(jobs=10, cores=8), (8, 1))
+        self.assertEqual(plan_workers(jobs=3, cores=8), (3, 2))
+        self.assertEqual(plan_workers(jobs=10, cores=8, workers=2), (2, 4))
+        self.assertEqual(plan_workers(jobs=10, cores=2, workers=6), (2, 1))
+        for jobs in range(1, 13):
+            workers, n_jobs = plan_workers(jobs=jobs, cores=6)
+            self.assertLessEqual(workers * n_jobs, 6)
+
+    def test_job_reports_time_and_memory(self):
+        with mock.patch.object(ml_service, 'train_models', return_value=True) as train:
+            result = train_job('Chile', n_jobs=2, chunk_size=1000)
+        train.assert_called_once_with(country_code='Chile', chunk_size=1000, n_jobs=2)
+        self.assertEqual(result['key'], 'Chile')
+        self.assertTrue(result['success'])
+        self.assertGreaterEqual(result['seconds'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+
+    def test_job_without_resource_module(self):
+        # Windows no tiene el módulo resource: el trabajo entrena igual y no informa memoria
+        with mock.patch.dict('sys.modules', {'resource': None}), \
+                mock.patch.object(ml_service, 'train_models', return_value=True):
+            result = train_job('Chile', n_jobs=1, chunk_size=None)
+        self.assertTrue(result['success'])
+        self.assertIsNone(result['peak_rss_mb'])
+
+    def test_failed_dump_keeps_previous_artifact(self):
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir)
+        path = artifact_path(model_dir, PIPELINE_NAME, 'Chile')
+        ml_service._dump_atomic('v1', path)
+        with mock.patch('api.ml_service.joblib.dump', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                ml_service._dump_atomic('v2', path)
+        self.assertEqual(joblib.load(path), 'v1')
+        self.assertEqual(os.listdir(model_dir), [path.name])
@@ -0,0 +1,134 @@
+"""
+Entrenamiento en paralelo de varios países (``manage.py train_ml_models --all-countries``).
+
+Cada país (y el modelo global) es un trabajo independiente que corre en su propio
+proceso de un ``ProcessPoolExecutor``. El total de núcleos se reparte entre
+procesos externos y ``n_jobs`` de los bosques para no sobresuscribir la máquina:
+``workers * n_jobs <= cores``. Los hilos de BLAS/OpenMP de cada proceso se fijan
+al mismo ``n_jobs`` antes de importar numpy.
+
+Los procesos se crean con ``spawn`` y atienden un solo trabajo
+(``max_tasks_per_child=1``), así que el pico de RSS que reporta cada proceso es el
+de su país. Los artefactos se escriben con ``save_models`` (temporal + rename, el
+pipeline al final): un servidor en marcha nunca carga un archivo a medio escribir.
+
+Este módulo no importa numpy ni Django al cargarse: los procesos hijos lo
+importan antes de fijar los límites de hilos.
+"""
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+GLOBAL_JOB = None
+
+SOUTH_AMERICAN_COUNTRIES = [
+    'Argentina', 'Bolivia', 'Brazil', 'Chile', 'Colombia',
+    'Ecuador', 'Guyana', 'Paraguay', 'Peru', 'Suriname',
+    'Uruguay', 'Venezuela'
+]
+
+THREAD_LIMIT_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def available_cores():
+    """Núcleos que puede usar este proceso (respeta la afinidad de CPU del contenedor)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan_workers(jobs, cores=None, workers=None):
+    """
+    Repartir ``cores`` entre procesos y ``n_jobs`` por bosque.
+    Devuelve ``(workers, n_jobs)`` con ``workers * n_jobs <= cores``.
+    """
+    cores = max(1, cores or available_cores())
+    workers = max(1, min(workers or cores, jobs, cores))
+    return workers, max(1, cores // workers)
+
+
+def countries_with_data():
+    """Países sudamericanos con al menos una fila en prediction."""
+    from django.db import connection
+
+    placeholders = ','.join(['%s'] * len(SOUTH_AMERICAN_COUNTRIES))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT country_code FROM prediction WHERE country_code IN ({placeholders})",
+            SOUTH_AMERICAN_COUNTRIES,
+        )
+        found = {row[0] for row in cursor.fetchall()}
+    return [country for country in SOUTH_AMERICAN_COUNTRIES if country in found]
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso actual en MB (None donde no hay ``resource``, p. ej. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _init_worker(n_jobs):
+    for var in THREAD_LIMIT_VARS:
+        os.environ[var] = str(n_jobs)
+    import django
+    django.setup()
+
+
+def train_job(country_code, n_jobs, chunk_size=None):
+    """Entrenar un país (o el global con ``GLOBAL_JOB``) dentro de un proceso del pool."""
+    from .ml_service import ml_service
+    from .model_registry import artifact_key
+
+    start = time.perf_counter()
+    error = None
+    try:
+        success = ml_service.train_models(country_code=country_code, chunk_size=chunk_size, n_jobs=n_jobs)
+    except Exception as e:
+        success, error = False, str(e)
+    return {
+        'key': artifact_key(country_code),
+        'success': bool(success),
+        'seconds': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+        'error': error,
+    }
+
+
+def train_all(countries, cores=None, workers=None, chunk_size=None, on_result=None):
+    """
+    Entrenar ``countries`` en paralelo. ``on_result`` recibe el resultado de cada
+    trabajo apenas termina; se devuelven todos en orden de finalización.
+    """
+    from .model_registry import artifact_key
+
+    workers, n_jobs = plan_workers(len(countries), cores, workers)
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(n_jobs,),
+        max_tasks_per_child=1,
+    ) as pool:
+        futures = {pool.submit(train_job, country, n_jobs, chunk_size): country for country in countries}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # El proceso murió (p. ej. sin memoria) antes de devolver el resultado
+                result = {
+                    'key': artifact_key(futures[future]), 'success': False,
+                    'seconds': None, 'peak_rss_mb': None, 'error': str(e),
+                }
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    return results
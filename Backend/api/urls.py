@@ -12,6 +12,7 @@ urlpatterns = [
     path('dashboard/', views.dashboard_data, name='dashboard_data'),
     # Nuevos endpoints para predicciones
     path('predictions/generate', views.generate_prediction, name='generate_prediction'),
+    path('predictions/generate-batch', views.generate_predictions_batch, name='generate_predictions_batch'),
     path('predictions/history', views.prediction_history, name='prediction_history'),
     path('predictions/accuracy', views.prediction_accuracy, name='prediction_accuracy'),
     path('predictions/train', views.train_models, name='train_models'),
@@ -4,12 +4,16 @@ from rest_framework.response import Response
 from django.db import connection
 from .serializers import CountryDataSerializer
 from .ml_service import ml_service
+from .rollups import rollup_stats
+from .cache import cache_response
+from .pagination import InvalidPageParams, parse_page_params, fetch_events_page, stream_events
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 @api_view(['GET'])
+@cache_response()
 def south_american_countries(request):
     """Obtener datos de países sudamericanos desde prediction.db"""
     
@@ -31,90 +35,73 @@ def south_american_countries(request):
     
     countries_data = []
     
-    with connection.cursor() as cursor:
-        for country_name, country_info in south_american_data.items():
-            # Obtener datos del país desde prediction.db
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_records,
-                    AVG(max_mag_last90d) as avg_magnitude,
-                    MAX(max_mag_last90d) as max_magnitude,
-                    AVG(prob_m45_next7d) as avg_prob_7d,
-                    AVG(prob_m50_next30d) as avg_prob_30d,
-                    AVG(prob_m60_next90d) as avg_prob_90d,
-                    MAX(event_date) as latest_date
-                FROM prediction 
-                WHERE country_code = %s
-            """, [country_name])
+    # Una sola consulta agrupada: estadísticas de todos los países y el total global (fallback)
+    stats_by_country, global_stats = rollup_stats()
+    
+    for country_name, country_info in south_american_data.items():
+        stats = stats_by_country.get(country_name)
+        
+        if stats and stats['count'] > 0:
+            # País tiene datos en la base de datos
+            total_records = stats['count']
+            avg_mag, max_mag = stats['avg_magnitude'], stats['max_magnitude']
+            prob_7d, prob_30d, prob_90d = stats['avg_prob_7d'], stats['avg_prob_30d'], stats['avg_prob_90d']
+            latest_date = stats['last_date']
+            
+            # Calcular nivel de riesgo
+            if prob_7d and prob_7d > 0.3:
+                risk_level = 'very-high'
+            elif prob_7d and prob_7d > 0.2:
+                risk_level = 'high'
+            elif prob_7d and prob_7d > 0.1:
+                risk_level = 'medium'
+            else:
+                risk_level = 'low'
             
-            result = cursor.fetchone()
+            country_data = {
+                'id': country_name.lower().replace(' ', '-'),
+                'name': country_name,
+                'code': country_info['code'],
+                'coordinates': country_info['coordinates'],
+                'riskLevel': risk_level,
+                'lastEarthquake': str(latest_date) if latest_date else '2024-01-01',
+                'magnitude': max_mag if max_mag else avg_mag if avg_mag else 3.0,
+                'total_records': total_records,
+                'avg_prob_7d': prob_7d if prob_7d else 0.0,
+                'avg_prob_30d': prob_30d if prob_30d else 0.0,
+                'avg_prob_90d': prob_90d if prob_90d else 0.0,
+            }
+        else:
+            # País no tiene datos, usar datos de otros países como fallback
+            fallback_mag = global_stats['avg_magnitude'] or 4.0
+            fallback_prob = global_stats['avg_prob_7d'] or 0.1
             
-            if result and result[0] > 0:
-                # País tiene datos en la base de datos
-                total_records, avg_mag, max_mag, prob_7d, prob_30d, prob_90d, latest_date = result
-                
-                # Calcular nivel de riesgo
-                if prob_7d and prob_7d > 0.3:
-                    risk_level = 'very-high'
-                elif prob_7d and prob_7d > 0.2:
-                    risk_level = 'high'
-                elif prob_7d and prob_7d > 0.1:
-                    risk_level = 'medium'
-                else:
-                    risk_level = 'low'
-                
-                country_data = {
-                    'id': country_name.lower().replace(' ', '-'),
-                    'name': country_name,
-                    'code': country_info['code'],
-                    'coordinates': country_info['coordinates'],
-                    'riskLevel': risk_level,
-                    'lastEarthquake': str(latest_date) if latest_date else '2024-01-01',
-                    'magnitude': max_mag if max_mag else avg_mag if avg_mag else 3.0,
-                    'total_records': total_records,
-                    'avg_prob_7d': prob_7d if prob_7d else 0.0,
-                    'avg_prob_30d': prob_30d if prob_30d else 0.0,
-                    'avg_prob_90d': prob_90d if prob_90d else 0.0,
-                }
+            # Determinar riesgo basado en datos de fallback
+            if fallback_prob > 0.2:
+                risk_level = 'medium'
             else:
-                # País no tiene datos, usar datos de otros países como fallback
-                cursor.execute("""
-                    SELECT 
-                        AVG(max_mag_last90d) as avg_magnitude,
-                        AVG(prob_m45_next7d) as avg_prob_7d
-                    FROM prediction 
-                    WHERE country_code IS NOT NULL
-                """)
-                
-                fallback_result = cursor.fetchone()
-                fallback_mag = fallback_result[0] if fallback_result and fallback_result[0] else 4.0
-                fallback_prob = fallback_result[1] if fallback_result and fallback_result[1] else 0.1
-                
-                # Determinar riesgo basado en datos de fallback
-                if fallback_prob > 0.2:
-                    risk_level = 'medium'
-                else:
-                    risk_level = 'low'
-                
-                country_data = {
-                    'id': country_name.lower().replace(' ', '-'),
-                    'name': country_name,
-                    'code': country_info['code'],
-                    'coordinates': country_info['coordinates'],
-                    'riskLevel': risk_level,
-                    'lastEarthquake': '2024-01-01',
-                    'magnitude': fallback_mag,
-                    'total_records': 0,
-                    'avg_prob_7d': fallback_prob,
-                    'avg_prob_30d': fallback_prob * 1.5,
-                    'avg_prob_90d': fallback_prob * 2.0,
-                }
+                risk_level = 'low'
             
-            countries_data.append(country_data)
+            country_data = {
+                'id': country_name.lower().replace(' ', '-'),
+                'name': country_name,
+                'code': country_info['code'],
+                'coordinates': country_info['coordinates'],
+                'riskLevel': risk_level,
+                'lastEarthquake': '2024-01-01',
+                'magnitude': fallback_mag,
+                'total_records': 0,
+                'avg_prob_7d': fallback_prob,
+                'avg_prob_30d': fallback_prob * 1.5,
+                'avg_prob_90d': fallback_prob * 2.0,
+            }
+        
+        countries_data.append(country_data)
     
     return Response(countries_data)
 
 @api_view(['GET'])
+@cache_response()
 def country_details(request, country_code):
     """Obtener detalles específicos de un país"""
     
@@ -162,6 +149,7 @@ def country_details(request, country_code):
             return Response({'error': 'País no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
+@cache_response()
 def earthquake_statistics(request):
     """Obtener estadísticas generales de terremotos"""
     
@@ -215,6 +203,7 @@ def earthquake_statistics(request):
         return Response(statistics)
 
 @api_view(['GET'])
+@cache_response()
 def yearly_statistics(request, year):
     """Obtener estadísticas de sismos por año específico"""
     
@@ -233,77 +222,52 @@ def yearly_statistics(request, year):
         'Uruguay', 'Venezuela'
     ]
     
-    with connection.cursor() as cursor:
-        # Estadísticas generales del año
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_earthquakes,
-                AVG(max_mag_last90d) as avg_magnitude,
-                MAX(max_mag_last90d) as max_magnitude,
-                MIN(event_date) as first_date,
-                MAX(event_date) as last_date
-            FROM prediction 
-            WHERE strftime('%%Y', event_date) = %s
-        """, [str(year)])
-        
-        year_stats = cursor.fetchone()
-        
-        if not year_stats or year_stats[0] == 0:
-            return Response({
-                'year': year,
-                'general': {
-                    'total_earthquakes': 0,
-                    'avg_magnitude': 0,
-                    'max_magnitude': 0,
-                    'first_date': None,
-                    'last_date': None
-                },
-                'by_country': []
-            })
-        
-        total, avg_mag, max_mag, first_date, last_date = year_stats
-        
-        # Estadísticas por país sudamericano
-        countries_data = []
-        for country in south_american_countries:
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as count,
-                    AVG(max_mag_last90d) as avg_mag,
-                    MAX(max_mag_last90d) as max_mag,
-                    MIN(event_date) as first_date,
-                    MAX(event_date) as last_date
-                FROM prediction 
-                WHERE country_code = %s AND strftime('%%Y', event_date) = %s
-            """, [country, str(year)])
-            
-            country_stats = cursor.fetchone()
-            if country_stats and country_stats[0] > 0:
-                count, avg_mag_country, max_mag_country, first_date_country, last_date_country = country_stats
-                countries_data.append({
-                    'country': country,
-                    'count': count,
-                    'avg_magnitude': avg_mag_country,
-                    'max_magnitude': max_mag_country,
-                    'first_date': first_date_country,
-                    'last_date': last_date_country
-                })
-        
-        statistics = {
+    # Estadísticas del año por país y generales, en una sola consulta sobre los rollups
+    stats_by_country, year_stats = rollup_stats(year=year_int)
+    
+    if year_stats['count'] == 0:
+        return Response({
             'year': year,
             'general': {
-                'total_earthquakes': total,
-                'avg_magnitude': avg_mag,
-                'max_magnitude': max_mag,
-                'first_date': first_date,
-                'last_date': last_date
+                'total_earthquakes': 0,
+                'avg_magnitude': 0,
+                'max_magnitude': 0,
+                'first_date': None,
+                'last_date': None
             },
-            'by_country': countries_data
-        }
-        
-        return Response(statistics)
+            'by_country': []
+        })
+    
+    # Estadísticas por país sudamericano
+    countries_data = []
+    for country in south_american_countries:
+        country_stats = stats_by_country.get(country)
+        if country_stats and country_stats['count'] > 0:
+            countries_data.append({
+                'country': country,
+                'count': country_stats['count'],
+                'avg_magnitude': country_stats['avg_magnitude'],
+                'max_magnitude': country_stats['max_magnitude'],
+                'first_date': country_stats['first_date'],
+                'last_date': country_stats['last_date']
+            })
+    
+    statistics = {
+        'year': year,
+        'general': {
+            'total_earthquakes': year_stats['count'],
+            'avg_magnitude': year_stats['avg_magnitude'],
+            'max_magnitude': year_stats['max_magnitude'],
+            'first_date': year_stats['first_date'],
+            'last_date': year_stats['last_date']
+        },
+        'by_country': countries_data
+    }
+    
+    return Response(statistics)
 
 @api_view(['GET'])
+@cache_response()
 def country_yearly_statistics(request, country_code, year):
     """Obtener estadísticas de sismos de un país específico por año"""
     
@@ -315,6 +279,15 @@ def country_yearly_statistics(request, country_code, year):
     except ValueError:
         return Response({'error': 'Año inválido'}, status=status.HTTP_400_BAD_REQUEST)
     
+    try:
+        paginated, limit, page_cursor, stream = parse_page_params(request)
+    except InvalidPageParams as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    events_where = "country_code = %s AND event_year = %s"
+    if stream:
+        return stream_events(events_where, [country_code, year_int], _format_yearly_event, limit, page_cursor)
+    
     with connection.cursor() as cursor:
         # Estadísticas del país para el año específico
         cursor.execute("""
@@ -328,8 +301,8 @@ def country_yearly_statistics(request, country_code, year):
                 AVG(prob_m50_next30d) as avg_prob_30d,
                 AVG(prob_m60_next90d) as avg_prob_90d
             FROM prediction 
-            WHERE country_code = %s AND strftime('%%Y', event_date) = %s
-        """, [country_code, str(year)])
+            WHERE country_code = %s AND event_year = %s
+        """, [country_code, year_int])
         
         country_stats = cursor.fetchone()
         
@@ -350,32 +323,10 @@ def country_yearly_statistics(request, country_code, year):
         
         total, avg_mag, max_mag, first_date, last_date, avg_prob_7d, avg_prob_30d, avg_prob_90d = country_stats
         
-        # Obtener todos los eventos del país para el año (sin límite para permitir paginación en el frontend)
-        cursor.execute("""
-            SELECT 
-                event_date,
-                location,
-                max_mag_last90d as magnitude,
-                prob_m45_next7d,
-                prob_m50_next30d,
-                prob_m60_next90d
-            FROM prediction 
-            WHERE country_code = %s AND strftime('%%Y', event_date) = %s
-            ORDER BY event_date DESC
-        """, [country_code, str(year)])
-        
-        recent_events = cursor.fetchall()
-        
-        events_data = []
-        for event in recent_events:
-            events_data.append({
-                'date': event[0],
-                'location': event[1] or 'Ubicación no especificada',
-                'magnitude': event[2],
-                'prob_7d': event[3],
-                'prob_30d': event[4],
-                'prob_90d': event[5]
-            })
+        # Eventos del año: todos (sin parámetros) o una página por cursor (con limit/cursor)
+        events_data, next_cursor = fetch_events_page(
+            events_where, [country_code, year_int], _format_yearly_event, limit, page_cursor
+        )
         
         statistics = {
             'country_code': country_code,
@@ -390,10 +341,23 @@ def country_yearly_statistics(request, country_code, year):
             'avg_prob_90d': avg_prob_90d,
             'recent_events': events_data
         }
+        if paginated:
+            statistics['next_cursor'] = next_cursor
         
         return Response(statistics)
 
+def _format_yearly_event(event):
+    return {
+        'date': event[0],
+        'location': event[1] or 'Ubicación no especificada',
+        'magnitude': event[2],
+        'prob_7d': event[3],
+        'prob_30d': event[4],
+        'prob_90d': event[5]
+    }
+
 @api_view(['GET'])
+@cache_response(vary_on_day=True)
 def dashboard_data(request):
     """Obtener datos del dashboard para las últimas 24h, semana y mes"""
     
@@ -475,29 +439,27 @@ def dashboard_data(request):
                 'prob_90d': eq[7]
             })
         
-        # Obtener estadísticas solo por países sudamericanos
-        placeholders = ','.join(['%s' for _ in south_american_countries])
-        cursor.execute(f"""
-            SELECT 
-                country_code,
-                COUNT(*) as count,
-                AVG(max_mag_last90d) as avg_magnitude,
-                MAX(max_mag_last90d) as max_magnitude,
-                MAX(event_date) as last_date
-            FROM prediction 
-            WHERE event_date >= %s AND country_code IN ({placeholders})
-            GROUP BY country_code
-            ORDER BY count DESC
-        """, [limit_date.strftime('%Y-%m-%d')] + south_american_countries)
-        
-        country_stats = cursor.fetchall()
+        # Estadísticas por país calculadas sobre las mismas filas ya leídas
+        # (el rango es de días, más fino que los rollups mensuales, y evita otro recorrido)
+        stats_by_country = {}
+        for eq in earthquakes:
+            magnitude = eq[4]
+            stat = stats_by_country.setdefault(eq[1], {'count': 0, 'mag_sum': 0.0, 'mag_count': 0, 'max_mag': None, 'last_date': None})
+            stat['count'] += 1
+            if magnitude is not None:
+                stat['mag_sum'] += magnitude
+                stat['mag_count'] += 1
+                stat['max_mag'] = magnitude if stat['max_mag'] is None else max(stat['max_mag'], magnitude)
+            if stat['last_date'] is None or eq[2] > stat['last_date']:
+                stat['last_date'] = eq[2]
+        country_stats = sorted(stats_by_country.items(), key=lambda item: item[1]['count'], reverse=True)
         
         # Calcular niveles de riesgo basados en la actividad
         countries_with_risk = []
-        for stat in country_stats:
-            count = stat[1]
-            avg_mag = stat[2] or 0
-            max_mag = stat[3] or 0
+        for country_code, stat in country_stats:
+            count = stat['count']
+            avg_mag = stat['mag_sum'] / stat['mag_count'] if stat['mag_count'] else 0
+            max_mag = stat['max_mag'] or 0
             
             # Calcular nivel de riesgo basado en cantidad y magnitud
             if count > 50 or max_mag >= 6.0:
@@ -510,29 +472,16 @@ def dashboard_data(request):
                 risk_level = 'low'
             
             countries_with_risk.append({
-                'country_code': stat[0],
+                'country_code': country_code,
                 'count': count,
                 'avg_magnitude': avg_mag,
                 'max_magnitude': max_mag,
-                'last_date': stat[4],
+                'last_date': stat['last_date'],
                 'risk_level': risk_level
             })
         
-        # Obtener el último sismo registrado solo de países sudamericanos
-        placeholders_last = ','.join(['%s' for _ in south_american_countries])
-        cursor.execute(f"""
-            SELECT 
-                country_code,
-                event_date,
-                location,
-                max_mag_last90d as magnitude
-            FROM prediction 
-            WHERE event_date >= %s AND country_code IN ({placeholders_last})
-            ORDER BY event_date DESC
-            LIMIT 1
-        """, [limit_date.strftime('%Y-%m-%d')] + south_american_countries)
-        
-        last_earthquake = cursor.fetchone()
+        # El último sismo es la primera fila (ordenadas por event_date DESC)
+        last_earthquake = (earthquakes[0][1], earthquakes[0][2], earthquakes[0][3], earthquakes[0][4]) if earthquakes else None
         
         # Encontrar el país con mayor riesgo
         highest_risk_country = max(countries_with_risk, key=lambda x: x['count']) if countries_with_risk else None
@@ -555,6 +504,7 @@ def dashboard_data(request):
         return Response(dashboard_data)
 
 @api_view(['GET'])
+@cache_response()
 def all_years_statistics(request):
     """Obtener estadísticas de sismos de todos los años para países sudamericanos"""
     
@@ -565,77 +515,52 @@ def all_years_statistics(request):
         'Uruguay', 'Venezuela'
     ]
     
-    with connection.cursor() as cursor:
-        # Estadísticas generales de todos los años
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_earthquakes,
-                AVG(max_mag_last90d) as avg_magnitude,
-                MAX(max_mag_last90d) as max_magnitude,
-                MIN(event_date) as first_date,
-                MAX(event_date) as last_date
-            FROM prediction 
-            WHERE country_code IN ({})
-        """.format(','.join(['%s' for _ in south_american_countries])), south_american_countries)
-        
-        general_stats = cursor.fetchone()
-        
-        if not general_stats or general_stats[0] == 0:
-            return Response({
-                'period': 'Todos los años',
-                'general': {
-                    'total_earthquakes': 0,
-                    'avg_magnitude': 0,
-                    'max_magnitude': 0,
-                    'first_date': None,
-                    'last_date': None
-                },
-                'by_country': []
-            })
-        
-        total, avg_mag, max_mag, first_date, last_date = general_stats
-        
-        # Estadísticas por país sudamericano de todos los años
-        countries_data = []
-        for country in south_american_countries:
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as count,
-                    AVG(max_mag_last90d) as avg_mag,
-                    MAX(max_mag_last90d) as max_mag,
-                    MIN(event_date) as first_date,
-                    MAX(event_date) as last_date
-                FROM prediction 
-                WHERE country_code = %s
-            """, [country])
-            
-            country_stats = cursor.fetchone()
-            if country_stats and country_stats[0] > 0:
-                count, avg_mag_country, max_mag_country, first_date_country, last_date_country = country_stats
-                countries_data.append({
-                    'country': country,
-                    'count': count,
-                    'avg_magnitude': avg_mag_country,
-                    'max_magnitude': max_mag_country,
-                    'first_date': first_date_country,
-                    'last_date': last_date_country
-                })
-        
-        statistics = {
+    # Estadísticas por país y generales de todos los años, en una sola consulta sobre los rollups
+    stats_by_country, general_stats = rollup_stats(countries=south_american_countries)
+    
+    if general_stats['count'] == 0:
+        return Response({
             'period': 'Todos los años',
             'general': {
-                'total_earthquakes': total,
-                'avg_magnitude': avg_mag,
-                'max_magnitude': max_mag,
-                'first_date': first_date,
-                'last_date': last_date
+                'total_earthquakes': 0,
+                'avg_magnitude': 0,
+                'max_magnitude': 0,
+                'first_date': None,
+                'last_date': None
             },
-            'by_country': countries_data
-        }
-        
-        return Response(statistics)
+            'by_country': []
+        })
+    
+    # Estadísticas por país sudamericano de todos los años
+    countries_data = []
+    for country in south_american_countries:
+        country_stats = stats_by_country.get(country)
+        if country_stats and country_stats['count'] > 0:
+            countries_data.append({
+                'country': country,
+                'count': country_stats['count'],
+                'avg_magnitude': country_stats['avg_magnitude'],
+                'max_magnitude': country_stats['max_magnitude'],
+                'first_date': country_stats['first_date'],
+                'last_date': country_stats['last_date']
+            })
+    
+    statistics = {
+        'period': 'Todos los años',
+        'general': {
+            'total_earthquakes': general_stats['count'],
+            'avg_magnitude': general_stats['avg_magnitude'],
+            'max_magnitude': general_stats['max_magnitude'],
+            'first_date': general_stats['first_date'],
+            'last_date': general_stats['last_date']
+        },
+        'by_country': countries_data
+    }
+    
+    return Response(statistics)
 
 @api_view(['GET'])
+@cache_response()
 def country_all_years_statistics(request, country_code):
     """Obtener estadísticas de sismos de todos los años para un país específico"""
     
@@ -653,109 +578,60 @@ def country_all_years_statistics(request, country_code):
                 status=400
             )
         
-        with connection.cursor() as cursor:
-            # Obtener estadísticas por año individual para el país
-            cursor.execute("""
-                SELECT 
-                    substr(event_date, 1, 4) as year,
-                    COUNT(*) as total_earthquakes,
-                    AVG(max_mag_last90d) as avg_magnitude,
-                    MAX(max_mag_last90d) as max_magnitude,
-                    MIN(event_date) as first_date,
-                    MAX(event_date) as last_date,
-                    AVG(prob_m45_next7d) as avg_prob_7d,
-                    AVG(prob_m50_next30d) as avg_prob_30d,
-                    AVG(prob_m60_next90d) as avg_prob_90d
-                FROM prediction 
-                WHERE country_code = %s
-                GROUP BY substr(event_date, 1, 4)
-                ORDER BY year ASC
-            """, [country_code])
-            
-            yearly_stats = cursor.fetchall()
+        try:
+            paginated, limit, page_cursor, stream = parse_page_params(request)
+        except InvalidPageParams as e:
+            return Response({'error': str(e)}, status=400)
         
-            if not yearly_stats:
-                return Response({
-                    'country_code': country_code,
-                    'period': 'Todos los años',
-                    'total_earthquakes': 0,
-                    'avg_magnitude': 0,
-                    'max_magnitude': 0,
-                    'first_date': None,
-                    'last_date': None,
-                    'avg_prob_7d': 0,
-                    'avg_prob_30d': 0,
-                    'avg_prob_90d': 0,
-                    'recent_events': [],
-                    'yearly_breakdown': []
-                })
-            
-            # Calcular estadísticas generales sumando los totales de cada año
-            total_earthquakes = sum(row[1] for row in yearly_stats)
-            all_magnitudes = []
-            all_prob_7d = []
-            all_prob_30d = []
-            all_prob_90d = []
-            
-            for row in yearly_stats:
-                if row[2] is not None:  # Solo agregar si la magnitud no es None
-                    all_magnitudes.extend([row[2]] * row[1])  # Repetir la magnitud promedio por la cantidad de eventos
-                if row[6] is not None: 
-                    all_prob_7d.extend([row[6]] * row[1])
-                if row[7] is not None: 
-                    all_prob_30d.extend([row[7]] * row[1])
-                if row[8] is not None: 
-                    all_prob_90d.extend([row[8]] * row[1])
-            
-            # Calcular estadísticas generales ponderadas por cantidad de eventos
-            avg_magnitude = sum(all_magnitudes) / len(all_magnitudes) if all_magnitudes else 0
-            avg_prob_7d = sum(all_prob_7d) / len(all_prob_7d) if all_prob_7d else 0
-            avg_prob_30d = sum(all_prob_30d) / len(all_prob_30d) if all_prob_30d else 0
-            avg_prob_90d = sum(all_prob_90d) / len(all_prob_90d) if all_prob_90d else 0
-            
-            # Obtener magnitud máxima general y fechas extremas
-            max_magnitude = max((row[3] for row in yearly_stats if row[3] is not None), default=0)
-            first_date = min((row[4] for row in yearly_stats if row[4] is not None), default=None)
-            last_date = max((row[5] for row in yearly_stats if row[5] is not None), default=None)
-            
-            # Eventos recientes de todos los años
-            cursor.execute("""
-                SELECT 
-                    event_date,
-                    location,
-                    max_mag_last90d,
-                    prob_m45_next7d,
-                    prob_m50_next30d,
-                    prob_m60_next90d
-                FROM prediction 
-                WHERE country_code = %s
-                ORDER BY event_date DESC
-            """, [country_code])
-            
-            recent_events = []
-            for row in cursor.fetchall():
-                recent_events.append({
-                    'date': str(row[0]),
-                    'location': row[1] or 'N/A',
-                    'magnitude': row[2] or 0,
-                    'prob_7d': row[3] or 0,
-                    'prob_30d': row[4] or 0,
-                    'prob_90d': row[5] or 0
-                })
+        if stream:
+            return stream_events("country_code = %s", [country_code], _format_history_event, limit, page_cursor)
+        
+        # Estadísticas por año individual y generales del país (desde los rollups)
+        yearly_stats, totals = rollup_stats(group_by='year', countries=[country_code])
+        
+        if not yearly_stats:
+            return Response({
+                'country_code': country_code,
+                'period': 'Todos los años',
+                'total_earthquakes': 0,
+                'avg_magnitude': 0,
+                'max_magnitude': 0,
+                'first_date': None,
+                'last_date': None,
+                'avg_prob_7d': 0,
+                'avg_prob_30d': 0,
+                'avg_prob_90d': 0,
+                'recent_events': [],
+                'yearly_breakdown': []
+            })
+        
+        total_earthquakes = totals['count']
+        avg_magnitude = totals['avg_magnitude'] or 0
+        avg_prob_7d = totals['avg_prob_7d'] or 0
+        avg_prob_30d = totals['avg_prob_30d'] or 0
+        avg_prob_90d = totals['avg_prob_90d'] or 0
+        max_magnitude = totals['max_magnitude'] or 0
+        first_date = totals['first_date']
+        last_date = totals['last_date']
+        
+        # Eventos de todos los años: completos o paginados por cursor
+        recent_events, next_cursor = fetch_events_page(
+            "country_code = %s", [country_code], _format_history_event, limit, page_cursor
+        )
         
         # Crear desglose por año
         yearly_breakdown = []
-        for row in yearly_stats:
+        for year, stats in yearly_stats.items():
             yearly_breakdown.append({
-                'year': row[0],
-                'total_earthquakes': row[1],
-                'avg_magnitude': row[2],
-                'max_magnitude': row[3],
-                'first_date': row[4],
-                'last_date': row[5],
-                'avg_prob_7d': row[6],
-                'avg_prob_30d': row[7],
-                'avg_prob_90d': row[8]
+                'year': str(year),
+                'total_earthquakes': stats['count'],
+                'avg_magnitude': stats['avg_magnitude'],
+                'max_magnitude': stats['max_magnitude'],
+                'first_date': stats['first_date'],
+                'last_date': stats['last_date'],
+                'avg_prob_7d': stats['avg_prob_7d'],
+                'avg_prob_30d': stats['avg_prob_30d'],
+                'avg_prob_90d': stats['avg_prob_90d']
             })
         
         statistics = {
@@ -772,6 +648,8 @@ def country_all_years_statistics(request, country_code):
             'recent_events': recent_events,
             'yearly_breakdown': yearly_breakdown
         }
+        if paginated:
+            statistics['next_cursor'] = next_cursor
         
         return Response(statistics)
     
@@ -786,6 +664,16 @@ def country_all_years_statistics(request, country_code):
             status=500
         )
 
+def _format_history_event(row):
+    return {
+        'date': str(row[0]),
+        'location': row[1] or 'N/A',
+        'magnitude': row[2] or 0,
+        'prob_7d': row[3] or 0,
+        'prob_30d': row[4] or 0,
+        'prob_90d': row[5] or 0
+    }
+
 @api_view(['POST'])
 def generate_prediction(request):
     """Generar predicción sísmica usando machine learning"""
@@ -834,6 +722,54 @@ def generate_prediction(request):
             'error': f'Error interno del servidor: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+def generate_predictions_batch(request):
+    """Generar predicciones para varios países (por defecto todos los sudamericanos) en una pasada"""
+    # Fuera del try: un JSON mal formado lanza ParseError, que DRF responde con 400
+    if not isinstance(request.data, dict):
+        return Response(
+            {'error': 'El cuerpo debe ser un objeto JSON con la clave countries'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        south_american_countries = [
+            'Argentina', 'Bolivia', 'Brazil', 'Chile', 'Colombia', 
+            'Ecuador', 'Guyana', 'Paraguay', 'Peru', 'Suriname', 
+            'Uruguay', 'Venezuela'
+        ]
+        
+        countries = request.data.get('countries') or south_american_countries
+        
+        if not isinstance(countries, list) or not all(isinstance(country, str) for country in countries):
+            return Response(
+                {'error': 'countries debe ser una lista de países (texto)'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        invalid = [country for country in countries if country not in south_american_countries]
+        if invalid:
+            return Response(
+                {'error': f'Países no válidos o no sudamericanos: {", ".join(map(str, invalid))}'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Una consulta y una llamada por modelo para todo el lote
+        countries = list(dict.fromkeys(countries))
+        predictions = ml_service.predict_many(countries)
+        
+        return Response({
+            'success': True,
+            'data': [predictions[country] for country in countries]
+        })
+            
+    except Exception as e:
+        logger.error(f"Error generating batch predictions: {str(e)}")
+        return Response({
+            'success': False,
+            'error': f'Error interno del servidor: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 def prediction_history(request):
     """Obtener historial de predicciones"""
@@ -968,9 +904,21 @@ def train_models(request):
     try:
         data = request.data
         country = data.get('country')
+        chunk_size = data.get('chunk_size')
+        
+        if chunk_size is not None:
+            try:
+                chunk_size = int(chunk_size)
+                if chunk_size < 1:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return Response({
+                    'success': False,
+                    'error': 'chunk_size debe ser un entero positivo'
+                }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Entrenar modelos
-        success = ml_service.train_models(country_code=country)
+        # Entrenar modelos (por bloques si se indica chunk_size)
+        success = ml_service.train_models(country_code=country, chunk_size=chunk_size)
         
         if success:
             return Response({
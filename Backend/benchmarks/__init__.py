@@ -0,0 +1 @@
+# Benchmarks de rendimiento (ejecutar desde Backend/ con: python -m benchmarks.<nombre>)
@@ -0,0 +1,131 @@
+"""
+Prueba de carga de ``/auth/me`` y ``/auth/users``: handlers sync (Session en el
+threadpool) vs. async (AsyncSession sobre aiosqlite).
+
+Con ``--users`` usuarios en un SQLite temporal, lanza N clientes concurrentes
+(ASGI en proceso, sin red) que repiten la request durante ``--seconds`` segundos
+y mide requests/s, latencia y errores:
+  - before: los handlers sync originales (``legacy_router``), con el pool de
+            conexiones por defecto
+  - after:  ``fastapi_auth.routers.auth``
+
+Con 100 clientes o más los handlers sync se traban: cada sesión retiene su
+conexión hasta que el cierre del ``Depends`` consigue otro hilo, los 40 hilos
+quedan esperando una de las 15 conexiones del pool y las requests fallan por
+``pool_timeout`` (30 s). Esas mediciones tardan lo que tarde el timeout.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_auth_db
+    python -m benchmarks.bench_auth_db --clients 50 500 --seconds 5
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
+
+from benchmarks.bench_face_hashing import setup_app
+
+
+def legacy_router():
+    """``/auth/me`` y ``/auth/users`` como eran antes del motor async."""
+    from sqlalchemy.orm import Session
+
+    from fastapi_auth import models, schemas
+    from fastapi_auth.db import get_db
+    from fastapi_auth.security import decode_token
+
+    router = APIRouter()
+
+    @router.get("/users", response_model=List[schemas.UserOut])
+    def list_users(db: Session = Depends(get_db)):
+        return db.query(models.User).all()
+
+    @router.get("/me", response_model=schemas.UserOut)
+    def me(token: str, db: Session = Depends(get_db)):
+        try:
+            email = decode_token(token).get("sub")
+        except Exception:
+            raise HTTPException(status_code=401, detail="Token inválido")
+        user = db.query(models.User).filter(models.User.email == email).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        return user
+
+    return router
+
+
+def seed_users(app, count):
+    from fastapi_auth import models
+    from fastapi_auth.db import get_db
+
+    db = next(app.dependency_overrides[get_db]())
+    db.add_all(
+        models.User(username=f"user{i}", dni=f"{i:08d}", email=f"user{i}@local.test", face_hash=f"{i:016x}")
+        for i in range(count)
+    )
+    db.commit()
+    db.close()
+
+
+async def load(app, path, clients, seconds):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+        latencies, errors = [], 0
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get(path)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.asarray(latencies) * 1000, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 100, 250, 500])
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = setup_app(workdir)
+        from fastapi_auth.security import create_access_token
+
+        before = FastAPI()
+        before.include_router(legacy_router(), prefix="/auth")
+        before.dependency_overrides = app.dependency_overrides
+        seed_users(app, args.users)
+        paths = {"/auth/me": f"/auth/me?token={create_access_token('user0@local.test')}", "/auth/users": "/auth/users"}
+
+        async def run_all():
+            # Un solo event loop: las conexiones aiosqlite del pool quedan ligadas al loop que las abrió
+            for name, path in paths.items():
+                for clients in args.clients:
+                    for label, target in (("before", before), ("after", app)):
+                        rps, latencies, errors = await load(target, path, clients, args.seconds)
+                        p50, p95 = np.percentile(latencies, [50, 95]) if latencies.size else (np.nan, np.nan)
+                        print(f"{name:12}{clients:>9}{label:>8}{rps:>9.0f}{p50:>9.1f}{p95:>9.1f}{errors:>9}")
+
+        print(f"{args.users} usuarios, {args.seconds:g} s por medición\n")
+        print(f"{'':12}{'clientes':>9}{'':>8}{'req/s':>9}{'ms p50':>9}{'ms p95':>9}{'errores':>9}")
+        asyncio.run(run_all())
+        app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
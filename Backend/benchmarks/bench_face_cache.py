@@ -0,0 +1,75 @@
+"""
+Benchmark de la caché de pHash por contenido (``security.face_hash_cache``).
+
+Simula el loop de reintentos del login facial: ``--sessions`` capturas distintas
+(frames JPEG de 1280x720) y cada una enviada ``--attempts`` veces, intercaladas
+entre sesiones. Mide ``compute_face_hash_from_bytes`` por request:
+  - before: caché desactivada (``max_bytes=0``)
+  - after:  caché por defecto
+y verifica el tope de memoria llenando una caché con hashes distintos y
+comparando ``approx_bytes`` con lo medido por ``tracemalloc``.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_face_cache
+    python -m benchmarks.bench_face_cache --sessions 50 --attempts 3
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from fastapi_auth.test_helpers import synthetic_frame
+
+
+def requests_for(frames, attempts):
+    return [frame for _ in range(attempts) for frame in frames]
+
+
+def run(cache, payloads):
+    from fastapi_auth import security
+
+    security.face_hash_cache = cache
+    start = time.perf_counter()
+    hashes = [security.compute_face_hash_from_bytes(data) for data in payloads]
+    return hashes, (time.perf_counter() - start) * 1000 / len(payloads)
+
+
+def memory_check(cache):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(cache.max_entries):
+        data = os.urandom(32)
+        cache.put(cache.digest(data), f"{i:016x}")
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--attempts", type=int, default=5)
+    args = parser.parse_args()
+
+    from fastapi_auth.security import FaceHashCache
+
+    frames = [synthetic_frame(1280, 720, seed) for seed in range(args.sessions)]
+    payloads = requests_for(frames, args.attempts)
+    uncached, before_ms = run(FaceHashCache(max_bytes=0), payloads)
+    cache = FaceHashCache()
+    cached, after_ms = run(cache, payloads)
+    assert cached == uncached
+    stats = cache.stats()
+
+    print(f"{len(payloads)} requests ({args.sessions} frames x {args.attempts} intentos), 1280x720\n")
+    print(f"{'':8}{'ms/request':>12}{'hit rate':>10}")
+    print(f"{'before':8}{before_ms:>12.2f}{'-':>10}")
+    print(f"{'after':8}{after_ms:>12.2f}{stats['hit_rate']:>10.1%}   ({before_ms / after_ms:.1f}x)")
+
+    used, stats = memory_check(FaceHashCache())
+    print(f"\nCaché llena: {stats['entries']:,} entradas, approx_bytes {stats['approx_bytes'] / 1024:,.0f} KB, "
+          f"tracemalloc {used / 1024:,.0f} KB, desalojos {stats['evictions']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark de decodificación + pHash por imagen: JPEG completo vs. modo draft.
+
+Para frames JPEG sintéticos de webcam (640x480, 1280x720, 1920x1080, calidad 85)
+mide ``prepare_face_image`` + ``face_hash_from_image`` con:
+  - full:  decodificación completa a RGB, como antes (``draft=False``)
+  - draft: decodificación a luminancia reducida en la DCT (``draft=True``)
+e informa la distancia de Hamming entre ambos hashes de cada frame.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_face_decode
+    python -m benchmarks.bench_face_decode --frames 500 --quality 92
+"""
+import argparse
+import time
+
+import numpy as np
+
+from fastapi_auth.test_helpers import synthetic_frame
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def hash_all(frames, draft):
+    from fastapi_auth.security import face_hash_from_image, prepare_face_image
+
+    start = time.perf_counter()
+    hashes = [face_hash_from_image(prepare_face_image(data, draft=draft)) for data in frames]
+    return hashes, (time.perf_counter() - start) * 1000 / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--quality", type=int, default=85)
+    args = parser.parse_args()
+
+    from fastapi_auth.security import hamming_distance
+
+    print(f"{args.frames} frames por resolución, JPEG calidad {args.quality}. ms por imagen\n")
+    print(f"{'':>11}{'KB':>6}{'full':>8}{'draft':>8}{'':>7}{'idénticos':>11}{'dist. máx':>11}")
+    for width, height in RESOLUTIONS:
+        frames = [synthetic_frame(width, height, seed, args.quality) for seed in range(args.frames)]
+        hash_all(frames[:5], True)
+        full, full_ms = hash_all(frames, False)
+        draft, draft_ms = hash_all(frames, True)
+        distances = np.array([hamming_distance(a, b) for a, b in zip(full, draft)])
+        print(f"{width:>5}x{height:<5}{np.mean([len(f) for f in frames]) / 1024:>6.0f}{full_ms:>8.2f}{draft_ms:>8.2f}"
+              f"{full_ms / draft_ms:>6.1f}x{(distances == 0).mean():>11.1%}{distances.max():>11}")
+
+
+if __name__ == "__main__":
+    main()
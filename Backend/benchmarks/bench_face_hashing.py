@@ -0,0 +1,167 @@
+"""
+Benchmark de una ráfaga de logins faciales: hash en el hilo de la request vs. pool de procesos.
+
+Lanza ``--burst`` logins concurrentes contra la app (ASGI en proceso, sin red)
+con una foto JPEG sintética de ``--size`` px y, mientras tanto, sondea ``/health``
+y ``/auth/users``:
+  - before: pHash en una dependencia sync, como hacían los handlers originales
+  - after:  ``face_hash_from_form`` con el pool acotado (503 al llenarse la cola)
+
+La base de usuarios es un SQLite temporal con el rostro ya registrado.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_face_hashing
+    FACE_WORKERS=4 python -m benchmarks.bench_face_hashing --burst 400
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from fastapi_auth.test_helpers import synthetic_face
+
+
+def setup_app(workdir):
+    """
+    App FastAPI con índice facial y base de usuarios temporales en ``workdir``
+    (``get_async_db`` y, para handlers de referencia, ``get_db``). Sin caché de
+    pHash: los benchmarks repiten la misma imagen y medirían la caché.
+    """
+    os.environ["FACE_INDEX_PATH"] = os.path.join(workdir, "face_index.npz")
+    os.environ["FACE_HASH_CACHE_MAX_BYTES"] = "0"
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from fastapi_auth.db import Base, get_async_db, get_db
+    from fastapi_auth.face_index import face_index
+    from fastapi_auth.main import app
+
+    db_path = os.path.join(workdir, "users.db")
+    face_index.db_path = Path(db_path)
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    AsyncSession = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{db_path}"), expire_on_commit=False)
+
+    def temp_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def temp_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = temp_db
+    app.dependency_overrides[get_async_db] = temp_async_db
+    return app
+
+
+def percentiles(values):
+    if not values:
+        return "-"
+    p50, p95 = np.percentile(np.asarray(values) * 1000, [50, 95])
+    return f"{p50:.0f}/{p95:.0f}"
+
+
+async def probe(client, path, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.02)
+
+
+async def burst(app, image, count):
+    import httpx
+
+    # Los errores de la app (p. ej. sin conexiones libres en el pool de SQLAlchemy) cuentan como "otros"
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        stop = asyncio.Event()
+        health, users = [], []
+        probes = [asyncio.create_task(probe(client, "/health", stop, health)),
+                  asyncio.create_task(probe(client, "/auth/users", stop, users))]
+
+        async def login():
+            start = time.perf_counter()
+            response = await client.post("/auth/login/face", data={"face_image": image})
+            return response.status_code, time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(login() for _ in range(count)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*probes)
+
+    ok = [seconds for code, seconds in results if code == 200]
+    rejected = [seconds for code, seconds in results if code == 503]
+    return {
+        "elapsed": elapsed, "ok": ok, "rejected": rejected,
+        "other": len(results) - len(ok) - len(rejected), "health": health, "users": users,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--size", type=int, default=640)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = setup_app(workdir)
+
+        from fastapi import Form
+
+        from fastapi_auth.face_pool import face_hash_from_form, face_pool
+        from fastapi_auth.security import compute_face_hash_from_base64
+
+        def inline_hash(face_image: str = Form(...)) -> str:
+            return compute_face_hash_from_base64(face_image)
+
+        image = synthetic_face(args.size)
+        face_pool.start()
+        try:
+            async def run():
+                import httpx
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    response = await client.post("/auth/register", data={"username": "bench", "face_image": image})
+                    response.raise_for_status()
+
+                app.dependency_overrides[face_hash_from_form] = inline_hash
+                before = await burst(app, image, args.burst)
+                del app.dependency_overrides[face_hash_from_form]
+                after = await burst(app, image, args.burst)
+                return before, after
+
+            before, after = asyncio.run(run())
+            metrics = face_pool.metrics()
+        finally:
+            face_pool.shutdown()
+            app.dependency_overrides.clear()
+
+    print(f"{args.burst} logins concurrentes, JPEG {args.size}x{args.size}, "
+          f"pool de {face_pool.workers} procesos (capacidad {face_pool.capacity})\n")
+    print(f"{'':8}{'s':>7}{'200':>6}{'503':>6}{'otros':>7}{'login ms p50/p95':>19}"
+          f"{'503 ms p50':>12}{'/health ms':>13}{'/auth/users ms':>17}")
+    for label, result in (("before", before), ("after", after)):
+        rejected = percentiles(result["rejected"]).split("/")[0]
+        print(f"{label:8}{result['elapsed']:>7.2f}{len(result['ok']):>6}{len(result['rejected']):>6}"
+              f"{result['other']:>7}{percentiles(result['ok']):>19}{rejected:>12}"
+              f"{percentiles(result['health']):>13}{percentiles(result['users']):>17}")
+    print(f"\nEtapas en el pool (ms p50/p95): " + ", ".join(
+        f"{stage} {values['p50']:.1f}/{values['p95']:.1f}" for stage, values in metrics["latency_ms"].items()
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark del login facial: recorrido secuencial original vs. índice en memoria.
+
+Compara, para 1k/10k/100k/1M usuarios sintéticos:
+  - loop:   ``security.hamming_distance`` fila por fila (implementación original)
+  - brute:  XOR + popcount vectorizado sobre todos los hashes
+  - mih:    índice multi-band (``FaceIndex.best_match``), solo verifica candidatos
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_face_index
+    python -m benchmarks.bench_face_index --sizes 1000 10000 --queries 200
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from fastapi_auth.face_index import FaceIndex, HASH_BITS
+from fastapi_auth.security import FACE_MATCH_THRESHOLD, hamming_distance
+
+
+def synthetic_hashes(n, rng):
+    return rng.integers(0, 2**63, size=n, dtype=np.int64).astype(np.uint64) ^ (
+        rng.integers(0, 2, size=n, dtype=np.uint64) << np.uint64(63)
+    )
+
+
+def make_queries(hashes, count, rng):
+    """Mitad rostros registrados con ruido (1-8 bits), mitad rostros desconocidos."""
+    queries = []
+    for i in range(count):
+        if i % 2 == 0:
+            value = int(hashes[rng.integers(0, hashes.size)])
+            for bit in rng.choice(HASH_BITS, size=rng.integers(1, 9), replace=False):
+                value ^= 1 << int(bit)
+        else:
+            value = int(rng.integers(0, 2**63)) | (int(rng.integers(0, 2)) << 63)
+        queries.append(f"{value:016x}")
+    return queries
+
+
+def per_query_ms(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def run(n, args, rng):
+    hashes = synthetic_hashes(n, rng)
+    hex_hashes = [f"{int(h):016x}" for h in hashes]
+    rows = list(zip(range(1, n + 1), hex_hashes))
+    queries = make_queries(hashes, args.queries, rng)
+
+    start = time.perf_counter()
+    index = FaceIndex(bands=args.bands, path=None)
+    index.build(rows)
+    build_s = time.perf_counter() - start
+
+    # Persistencia: guardar y volver a cargar sin reconstruir
+    with tempfile.TemporaryDirectory() as tmp:
+        index.path = Path(tmp) / "face_index.npz"
+        index.save()
+        start = time.perf_counter()
+        reloaded = FaceIndex(bands=args.bands, path=index.path)
+        reloaded._signature = index._signature
+        with np.load(index.path) as data:
+            _ = data["ids"]
+        load_s = time.perf_counter() - start
+        size_mb = index.path.stat().st_size / 2**20
+        index.path = None
+
+    # Recorrido original (acotado y extrapolado para tamaños grandes)
+    loop_rows = rows[: min(n, args.loop_cap)]
+
+    def legacy_loop(q):
+        best, best_d = None, HASH_BITS
+        for user_id, h in loop_rows:
+            d = hamming_distance(h, q)
+            if d < best_d:
+                best, best_d = user_id, d
+        return best
+
+    loop_ms = per_query_ms(legacy_loop, queries[: args.loop_queries]) * n / len(loop_rows)
+
+    def brute(q):
+        ids, dist = index.distances(q)
+        pos = int(np.argmin(dist))
+        return ids[pos] if dist[pos] <= FACE_MATCH_THRESHOLD else None
+
+    brute_ms = per_query_ms(brute, queries)
+    mih_ms = per_query_ms(lambda q: index.best_match(q, FACE_MATCH_THRESHOLD), queries)
+
+    # Verificar que ambos métodos coinciden
+    mismatches = sum(
+        1 for q in queries if (brute(q) is None) != (index.best_match(q, FACE_MATCH_THRESHOLD)[0] is None)
+    )
+    estimated = "*" if len(loop_rows) < n else " "
+    print(
+        f"{n:>9,} | loop {loop_ms:>10.2f}{estimated}| brute {brute_ms:>8.3f} | mih {mih_ms:>8.3f} "
+        f"| build {build_s:>6.2f}s | archivo {size_mb:>6.1f} MB ({load_s * 1000:.0f} ms) | diffs {mismatches}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--bands", type=int, default=4)
+    parser.add_argument("--loop-cap", type=int, default=20_000, help="máximo de filas medidas con el loop original")
+    parser.add_argument("--loop-queries", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"Umbral={FACE_MATCH_THRESHOLD}, bandas={args.bands}. Tiempos en ms por login (* = extrapolado)")
+    for n in args.sizes:
+        run(n, args, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark del login facial: data URL en formulario vs. archivo binario multipart.
+
+Para fotos JPEG sintéticas de varios tamaños mide el cuerpo de la request y la
+latencia de punta a punta (ASGI en proceso, sin red) de ``--logins`` logins
+secuenciales por cada camino:
+  - dataurl: ``/auth/login/face`` con ``face_image`` en x-www-form-urlencoded,
+             como lo envía el frontend (base64 + escape de ``+``, ``/`` e ``=``)
+  - upload:  ``/auth/login/face/upload`` con ``face_file`` en multipart/form-data
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_face_upload
+    python -m benchmarks.bench_face_upload --sizes 480 1080 --logins 100
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_face_hashing import setup_app
+from fastapi_auth.test_helpers import synthetic_face, synthetic_jpeg
+
+
+def request_bytes(client, **kwargs):
+    request = client.build_request("POST", "/auth/login/face", **kwargs)
+    return len(request.read())
+
+
+async def timed_logins(client, path, count, **kwargs):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.post(path, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return np.asarray(latencies) * 1000
+
+
+async def run(app, sizes, count):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    rows = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for size in sizes:
+            jpeg, data_url = synthetic_jpeg(size, seed=size), synthetic_face(size, seed=size)
+            form = {"data": {"face_image": data_url}}
+            upload = {"files": {"face_file": ("face.jpg", jpeg, "image/jpeg")}}
+            response = await client.post("/auth/register/upload", data={"username": f"bench{size}"}, **upload)
+            response.raise_for_status()
+            for label, path, kwargs in (("dataurl", "/auth/login/face", form),
+                                        ("upload", "/auth/login/face/upload", upload)):
+                await timed_logins(client, path, 3, **kwargs)
+                latencies = await timed_logins(client, path, count, **kwargs)
+                rows.append((size, len(jpeg), label, request_bytes(client, **kwargs), latencies))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[320, 640, 1280, 1920])
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = setup_app(workdir)
+        from fastapi_auth.face_pool import face_pool
+        face_pool.start()
+        try:
+            rows = asyncio.run(run(app, args.sizes, args.logins))
+        finally:
+            face_pool.shutdown()
+            app.dependency_overrides.clear()
+
+    print(f"{'px':>6}{'jpeg KB':>9}{'':>9}{'request KB':>12}{'vs jpeg':>9}{'ms p50':>9}{'ms p95':>9}")
+    for size, jpeg_bytes, label, body_bytes, latencies in rows:
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{size:>6}{jpeg_bytes / 1024:>9.0f}{label:>9}{body_bytes / 1024:>12.0f}"
+              f"{body_bytes / jpeg_bytes:>9.2f}{p50:>9.1f}{p95:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
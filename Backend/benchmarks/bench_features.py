@@ -0,0 +1,78 @@
+"""
+Benchmark de features de ventana móvil: reescaneo por celda vs. ``FeatureEngine``.
+
+Genera un catálogo sintético (magnitudes con distribución Gutenberg-Richter,
+b = 1) repartido entre celdas y, tras cargar la historia, agrega los últimos días
+de a uno calculando los features de cada celda con eventos ese día:
+  - before: por celda tocada, releer su historia del último año con NumPy
+            (``rescan_features``, como un recálculo fuera de línea)
+  - after:  ``FeatureEngine.append`` con los eventos del día y ``features``
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_features
+    python -m benchmarks.bench_features --cells 2000 --events-per-day 2000
+"""
+import argparse
+import math
+import time
+from collections import defaultdict
+
+from api.test_helpers import rescan_features, synthetic_events
+
+
+def by_day(events):
+    grouped = defaultdict(list)
+    for event in events:
+        grouped[event[1]].append(event)
+    return [grouped[day] for day in sorted(grouped)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cells', type=int, default=500)
+    parser.add_argument('--days', type=int, default=3 * 365)
+    parser.add_argument('--events-per-day', type=int, default=400)
+    parser.add_argument('--append-days', type=int, default=30)
+    args = parser.parse_args()
+
+    from api.features import FeatureEngine
+
+    days = by_day(synthetic_events(args.cells, args.days, args.events_per_day))
+    history, appended = days[:-args.append_days], days[-args.append_days:]
+    print(f"{sum(map(len, days)):,} eventos en {args.cells} celdas; "
+          f"se agregan {args.append_days} días ({sum(map(len, appended)):,} eventos)\n")
+
+    cell_days, cell_magnitudes = defaultdict(list), defaultdict(list)
+    engine = FeatureEngine()
+    for events in history:
+        for cell, day, magnitude in events:
+            cell_days[cell].append(day)
+            cell_magnitudes[cell].append(magnitude)
+        engine.append(events)
+
+    rescan_s = engine_s = 0.0
+    for events in appended:
+        day = events[0][1]
+        start = time.perf_counter()
+        for cell, _, magnitude in events:
+            cell_days[cell].append(day)
+            cell_magnitudes[cell].append(magnitude)
+        expected = {cell: rescan_features(cell_days[cell], cell_magnitudes[cell], day) for cell in {e[0] for e in events}}
+        rescan_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = {cell: engine.features(cell) for cell in engine.append(events)}
+        engine_s += time.perf_counter() - start
+
+        for cell, row in expected.items():
+            for column, value in row.items():
+                got = actual[cell][column]
+                assert (value is None and got is None) or math.isclose(got, value, rel_tol=1e-9), (cell, column)
+
+    print(f"{'':10}{'ms por día':>12}")
+    print(f"{'before':10}{rescan_s / len(appended) * 1000:>12.2f}")
+    print(f"{'after':10}{engine_s / len(appended) * 1000:>12.2f}   ({rescan_s / engine_s:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark de inferencia: ``RandomForestClassifier.predict`` vs. la exportación compacta.
+
+Entrena un bosque como el de ``train_models`` (100 árboles, profundidad 10) sobre
+datos sintéticos, lo exporta con ``forest_export.compact_model``, lo guarda con
+joblib y lo vuelve a cargar con ``mmap_mode='r'``. Para cada tamaño de lote mide
+p50/p99 de latencia de ambos caminos y verifica que las predicciones coincidan.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_forest_export
+    python -m benchmarks.bench_forest_export --batch-sizes 1 12 10000 --repeats 300
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from api.forest_export import compact_model
+from api.test_helpers import synthetic_data
+
+
+def percentiles(fn, X, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 12, 10_000])
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--train-rows', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    X_train, y_train = synthetic_data(args.train_rows, rng)
+    forest = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42).fit(X_train, y_train)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'risk_classifier_bench.compact.joblib')
+        joblib.dump(compact_model(forest), path)
+        compact = joblib.load(path, mmap_mode='r')
+        print(f"{compact.feature.shape[0]:,} nodos, {os.path.getsize(path) / 1e6:.1f} MB en disco "
+              f"(mmap: {type(compact.value).__name__})\n")
+
+        print(f"{'batch':>7}  {'sklearn p50':>11} {'p99':>8}  {'compact p50':>11} {'p99':>8}  {'speedup p50':>11}")
+        for batch_size in args.batch_sizes:
+            X, _ = synthetic_data(batch_size, rng)
+            assert np.array_equal(forest.predict(X), compact.predict(X))
+            repeats = max(5, args.repeats * 12 // max(batch_size, 12))
+            sk_p50, sk_p99 = percentiles(forest.predict, X, repeats)
+            cf_p50, cf_p99 = percentiles(compact.predict, X, repeats)
+            print(f"{batch_size:>7,}  {sk_p50:>9.3f}ms {sk_p99:>6.3f}ms  {cf_p50:>9.3f}ms {cf_p99:>6.3f}ms  "
+                  f"{sk_p50 / cf_p50:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
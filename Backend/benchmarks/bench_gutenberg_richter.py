@@ -0,0 +1,59 @@
+"""
+Benchmark de la estimación Gutenberg-Richter por celda: bucle por celda vs. agrupada.
+
+Genera un catálogo sintético (b = 1, con detección incompleta bajo Mc = 2.5) y mide:
+  - before: un bucle de Python por celda (histograma, máxima curvatura y Aki-Utsu
+            sobre los eventos de la celda, ``per_cell_gr``)
+  - after:  ``estimate_gr`` con todas las celdas en operaciones agrupadas
+  - bootstrap: ``estimate_gr(bootstrap=N)`` con 1 proceso y con ``--workers``
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_gutenberg_richter
+    python -m benchmarks.bench_gutenberg_richter --cells 20000 --events 2000000 --bootstrap 200 --workers 4
+"""
+import argparse
+import time
+
+import numpy as np
+
+from api.test_helpers import per_cell_gr, synthetic_catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cells', type=int, default=10_000)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--bootstrap', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    from api.gutenberg_richter import estimate_gr
+
+    cells, magnitudes = synthetic_catalog(args.cells, args.events)
+    print(f"{len(magnitudes):,} eventos en {args.cells:,} celdas\n")
+
+    start = time.perf_counter()
+    expected = per_cell_gr(cells, magnitudes)
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = estimate_gr(cells, magnitudes)
+    grouped_s = time.perf_counter() - start
+
+    mc, b_value = result['mc'].to_numpy(), result['b_value'].to_numpy()
+    expected_mc = np.array([expected[label][0] for label in result.index])
+    expected_b = np.array([expected[label][1] for label in result.index])
+    assert np.allclose(mc, expected_mc) and np.allclose(b_value, expected_b, equal_nan=True)
+
+    print(f"{'':22}{'s':>8}")
+    print(f"{'before (bucle)':22}{loop_s:>8.2f}")
+    print(f"{'after (agrupado)':22}{grouped_s:>8.2f}   ({loop_s / grouped_s:.0f}x)")
+    for workers in (1, args.workers):
+        start = time.perf_counter()
+        estimate_gr(cells, magnitudes, bootstrap=args.bootstrap, workers=workers)
+        print(f"{f'bootstrap {args.bootstrap}, {workers} proc.':22}{time.perf_counter() - start:>8.2f}")
+    print(f"\nb mediano {np.nanmedian(b_value):.3f}, Mc mediano {np.nanmedian(mc):.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark de ``ingest_catalog``: filas por segundo cargando un catálogo sintético.
+
+Sobre una copia de prediction.db genera un catálogo de N filas (filas reales
+remuestreadas con ``cell_id`` nuevos) en CSV y NDJSON y mide, partiendo siempre
+de la tabla original:
+  - csv:           índices mantenidos fila por fila
+  - csv deferred:  índices secundarios reconstruidos al final (``defer_indexes``)
+  - ndjson deferred
+  - csv upsert:    el mismo CSV otra vez, con todas las filas ya presentes
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_ingest
+    python -m benchmarks.bench_ingest --rows 500000
+"""
+import argparse
+import csv
+import json
+import random
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_prediction import setup_django
+
+
+def write_catalogs(workdir, rows):
+    from django.db import connection
+    from api.ingest import INGEST_COLUMNS
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(INGEST_COLUMNS)} FROM prediction")
+        source = cursor.fetchall()
+
+    rng = random.Random(0)
+    csv_path, ndjson_path = Path(workdir) / 'catalog.csv', Path(workdir) / 'catalog.ndjson'
+    with open(csv_path, 'w', newline='') as csv_file, open(ndjson_path, 'w') as ndjson_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(INGEST_COLUMNS)
+        for i in range(rows):
+            row = (f'bench{i:09d}',) + rng.choice(source)[1:]
+            writer.writerow(['' if value is None else value for value in row])
+            ndjson_file.write(json.dumps(dict(zip(INGEST_COLUMNS, map(str_date, row)))) + '\n')
+    return str(csv_path), str(ndjson_path)
+
+
+def str_date(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def reset(base_record_id):
+    from django.db import connection
+    from api.rollups import refresh_rollups
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM prediction WHERE record_id > %s", [base_record_id])
+    refresh_rollups(full=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_django(workdir)
+
+        import logging
+        logging.disable(logging.WARNING)
+        from django.db import connection
+        from api.ingest import ingest_catalog
+
+        csv_path, ndjson_path = write_catalogs(workdir, args.rows)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT MAX(record_id), COUNT(*) FROM prediction")
+            base_record_id, base_rows = cursor.fetchone()
+        print(f"Catálogo: {args.rows:,} filas sobre una tabla de {base_rows:,}\n")
+
+        print(f"{'':18}{'s':>8}{'filas/s':>12}{'índices s':>11}{'insert.':>10}{'actual.':>10}")
+        for label, path, defer, fresh in (
+            ('csv', csv_path, False, True),
+            ('csv upsert', csv_path, False, False),
+            ('csv deferred', csv_path, True, True),
+            ('ndjson deferred', ndjson_path, True, True),
+        ):
+            if fresh:
+                reset(base_record_id)
+            stats = ingest_catalog([path], defer_indexes=defer)
+            print(f"{label:18}{stats['seconds']:>8.2f}{stats['rows_per_second']:>12,.0f}"
+                  f"{stats['index_seconds']:>11.2f}{stats['inserted']:>10,}{stats['updated']:>10,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark de latencia de ``POST /api/predictions/generate``.
+
+Compara el camino de inferencia anterior con el actual sobre una copia de
+prediction.db y modelos entrenados en un directorio temporal:
+  - before: 100 filas por request, features derivados de todas y refit del
+            StandardScaler (con medianas de la propia fila) en cada predicción
+  - after:  1 fila y ``FeaturePipeline.transform`` con medianas y scaler congelados
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_prediction
+    python -m benchmarks.bench_prediction --countries Chile Peru --requests 300
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(workdir):
+    """Django sobre una copia de prediction.db y con los modelos en ``workdir``."""
+    db_path = Path(workdir) / 'prediction.db'
+    shutil.copy(BASE_DIR / 'prediction.db', db_path)
+    os.environ['ML_MODEL_DIR'] = str(Path(workdir) / 'models')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'logic.settings')
+
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = str(db_path)
+    settings.ALLOWED_HOSTS = ['testserver']
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+@contextmanager
+def legacy_inference():
+    """Reproducir el trabajo por request del camino anterior (refit del scaler en cada predicción)."""
+    import numpy as np
+    from sklearn.preprocessing import StandardScaler
+    from api.ml_service import FeaturePipeline, ml_service
+
+    original_load = ml_service.load_data_from_db
+    original_transform = FeaturePipeline.transform
+
+    def load(country_code=None, limit=None):
+        return original_load(country_code=country_code, limit=100 if limit == 1 else limit)
+
+    def transform(self, df):
+        X = df.head(1).reindex(columns=self.features).astype(float)
+        X = X.fillna(X.median())
+        with warnings.catch_warnings():
+            # Columnas sin valores en la fila: el refit produce NaN (el camino anterior fallaba aquí)
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nan_to_num(StandardScaler().fit_transform(X))
+
+    ml_service.load_data_from_db = load
+    FeaturePipeline.transform = transform
+    try:
+        yield
+    finally:
+        ml_service.load_data_from_db = original_load
+        FeaturePipeline.transform = original_transform
+
+
+def measure(client, countries, requests):
+    latencies = []
+    for i in range(requests):
+        country = countries[i % len(countries)]
+        start = time.perf_counter()
+        response = client.post('/api/predictions/generate', {'country': country}, content_type='application/json')
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.content
+    latencies.sort()
+    return {
+        'mean': statistics.fmean(latencies),
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--countries', nargs='+', default=['Chile', 'Peru', 'Ecuador'])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_django(workdir)
+
+        import logging
+        logging.disable(logging.WARNING)
+        from django.test import Client
+        from api.ml_service import ml_service
+
+        print('Entrenando modelos...')
+        for country in args.countries:
+            if not ml_service.train_models(country_code=country):
+                raise SystemExit(f'No se pudieron entrenar los modelos de {country}')
+
+        client = Client()
+        results = {}
+        for label, context in (('before', legacy_inference), ('after', nullcontext)):
+            with context():
+                measure(client, args.countries, args.warmup)
+                results[label] = measure(client, args.countries, args.requests)
+
+        print(f"\n{'':8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for label, r in results.items():
+            print(f"{label:8}{r['mean']:>10.2f}{r['p50']:>10.2f}{r['p95']:>10.2f}")
+        print(f"\nspeedup p50: {results['before']['p50'] / results['after']['p50']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
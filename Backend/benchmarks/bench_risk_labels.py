@@ -0,0 +1,64 @@
+"""
+Benchmark de ``create_risk_labels``: ``DataFrame.apply`` fila por fila vs. columnar.
+
+Compara, para 10k/1M/10M filas sintéticas:
+  - apply:    reglas originales evaluadas por fila (``legacy_risk_labels``)
+  - columnar: ``ml_service.risk_labels`` con ``np.digitize`` sobre columnas completas
+
+El recorrido por fila se mide hasta ``--apply-cap`` filas y se extrapola linealmente.
+También verifica que ambas etiquetas coincidan en la muestra medida.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_risk_labels
+    python -m benchmarks.bench_risk_labels --sizes 10000 1000000 --apply-cap 50000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'logic.settings')
+import django  # noqa: E402
+django.setup()
+
+from api.ml_service import RISK_LEVELS, risk_labels  # noqa: E402
+from api.test_helpers import legacy_risk_labels, synthetic_frame  # noqa: E402
+
+
+def run(n, args, rng):
+    df = synthetic_frame(n, rng)
+
+    start = time.perf_counter()
+    labels = risk_labels(df['max_mag_last90d'], df['eq_count_m3_last7d'], df['prob_m45_next7d'])
+    levels = RISK_LEVELS[labels]
+    columnar_s = time.perf_counter() - start
+
+    sample = df.head(min(n, args.apply_cap))
+    start = time.perf_counter()
+    legacy_levels, legacy_labels = legacy_risk_labels(sample)
+    apply_s = (time.perf_counter() - start) * n / len(sample)
+
+    assert np.array_equal(legacy_labels.to_numpy(), labels[:len(sample)])
+    assert list(legacy_levels) == list(levels[:len(sample)])
+
+    estimated = '*' if len(sample) < n else ' '
+    print(f"{n:>10,}  {apply_s:>10.3f}{estimated} {columnar_s:>10.4f}  {apply_s / columnar_s:>9.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--apply-cap', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'rows':>10}  {'apply s':>11} {'columnar s':>10}  {'speedup':>10}")
+    for n in args.sizes:
+        run(n, args, rng)
+    print("* extrapolado desde --apply-cap filas")
+
+
+if __name__ == '__main__':
+    main()
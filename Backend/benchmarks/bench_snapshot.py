@@ -0,0 +1,103 @@
+"""
+Benchmark de carga del catálogo completo: cursor vs. snapshot Parquet.
+
+Sobre una copia de la base de datos exporta un snapshot y compara:
+  - frame:   ``load_data_from_db()`` sin límite (todas las columnas de
+             PREDICTION_COLUMNS a un DataFrame), por cursor y desde el snapshot
+  - columns: solo ``country_code``, ``event_date`` y ``max_mag_last90d`` a
+             arreglos NumPy (cursor + fetchall vs. ``snapshot.read_columns``)
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_snapshot
+    python -m benchmarks.bench_snapshot --db /ruta/a/prediction_grande.db --repeats 3
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from benchmarks.bench_prediction import BASE_DIR
+
+COLUMNS = ['country_code', 'event_date', 'max_mag_last90d']
+
+
+def setup_django(workdir, source_db):
+    db_path = Path(workdir) / 'prediction.db'
+    shutil.copy(source_db, db_path)
+    os.environ['PREDICTION_SNAPSHOT_DIR'] = str(Path(workdir) / 'snapshots')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'logic.settings')
+
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = str(db_path)
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def cursor_columns():
+    import numpy as np
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM prediction")
+        rows = cursor.fetchall()
+    values = list(zip(*rows))
+    return {
+        'country_code': np.array(values[0], dtype=object),
+        'event_date': np.array(values[1], dtype=object),
+        'max_mag_last90d': np.array(values[2], dtype=float),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=str(BASE_DIR / 'prediction.db'))
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_django(workdir, args.db)
+
+        import logging
+        logging.disable(logging.WARNING)
+        from api import snapshot
+        from api.ml_service import ml_service
+
+        manifest = snapshot.write_snapshot()
+        size = sum(p.stat().st_size for p in Path(snapshot.SNAPSHOT_DIR).rglob('*.parquet'))
+        print(f"Snapshot: {manifest['rows']:,} filas, {manifest['files']} archivos, "
+              f"{size / 1e6:.1f} MB, exportado en {manifest['seconds']:.2f}s\n")
+
+        with mock.patch.object(snapshot, 'current_snapshot', return_value=None):
+            cursor_frame_s, frame = timed(ml_service.load_data_from_db, args.repeats)
+            cursor_columns_s, _ = timed(cursor_columns, args.repeats)
+        snapshot_frame_s, snapshot_frame = timed(ml_service.load_data_from_db, args.repeats)
+        snapshot_columns_s, columns = timed(lambda: snapshot.read_columns(COLUMNS), args.repeats)
+
+        assert len(frame) == len(snapshot_frame) == len(columns['max_mag_last90d']) == manifest['rows']
+        assert frame['record_id'].tolist() == snapshot_frame['record_id'].tolist()
+
+        print(f"{'':10}{'cursor s':>10}{'snapshot s':>12}{'speedup':>10}")
+        for label, before, after in (
+            ('frame', cursor_frame_s, snapshot_frame_s),
+            ('columns', cursor_columns_s, snapshot_columns_s),
+        ):
+            print(f"{label:10}{before:>10.3f}{after:>12.3f}{before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Memoria por worker con los modelos de todos los países cargados.
+
+Entrena los modelos (o usa ``--model-dir``) y luego, para cada modo, arranca N
+procesos que imitan workers de Django: ``django.setup()``, carga de todos los
+bundles del registro y una predicción por país. Con los N procesos vivos a la
+vez se lee ``/proc/self/smaps_rollup`` de cada uno:
+  - before: ``joblib.load`` a memoria de los bosques de scikit-learn
+            (ML_COMPACT_MODELS=0, ML_MMAP_MODELS=0)
+  - after:  exportación compacta cargada con ``mmap_mode='r'``
+
+RSS cuenta completas las páginas compartidas en cada proceso; PSS las reparte
+entre los procesos que las comparten, así que la suma de PSS es la memoria real.
+Solo Linux.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_worker_memory
+    python -m benchmarks.bench_worker_memory --workers 8 --model-dir api/models
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_prediction import BASE_DIR, setup_django
+
+MODES = {
+    'before': {'ML_COMPACT_MODELS': '0', 'ML_MMAP_MODELS': '0'},
+    'after': {'ML_COMPACT_MODELS': '1', 'ML_MMAP_MODELS': '1'},
+}
+
+
+def memory_mb():
+    """Rss, Pss y memoria privada del proceso actual en MB (de smaps_rollup)."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+def worker(db_path, barrier, results):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'logic.settings')
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+
+    import logging
+    logging.disable(logging.WARNING)
+    from api.ml_service import ml_service
+    from api.model_registry import model_registry
+    from api.training import SOUTH_AMERICAN_COUNTRIES
+
+    before = memory_mb()
+    model_registry.warm()
+    ml_service.predict_many(SOUTH_AMERICAN_COUNTRIES)
+
+    # Medir con todos los workers vivos para que PSS refleje las páginas compartidas
+    barrier.wait()
+    results.put((os.getpid(), before, memory_mb()))
+    barrier.wait()
+
+
+def measure(mode, workers, db_path):
+    os.environ.update(MODES[mode])
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(db_path, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--model-dir', help='Modelos ya entrenados (por defecto se entrenan en un directorio temporal)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_django(workdir)
+        db_path = str(Path(workdir) / 'prediction.db')
+        if args.model_dir:
+            os.environ['ML_MODEL_DIR'] = str(Path(args.model_dir).resolve())
+        else:
+            from api.ml_service import ml_service
+            from api.training import GLOBAL_JOB, countries_with_data
+            print('Entrenando modelos...')
+            for country in countries_with_data() + [GLOBAL_JOB]:
+                if not ml_service.train_models(country_code=country):
+                    raise SystemExit(f'No se pudieron entrenar los modelos de {country or "global"}')
+
+        model_dir = Path(os.environ['ML_MODEL_DIR'])
+        sizes = {
+            'sklearn': sum(p.stat().st_size for p in model_dir.glob('*.joblib') if '.compact.' not in p.name),
+            'compact': sum(p.stat().st_size for p in model_dir.glob('*.compact.joblib')),
+        }
+        print(f"Artefactos en {model_dir}: scikit-learn {sizes['sklearn'] / 1e6:.1f} MB, "
+              f"compactos {sizes['compact'] / 1e6:.1f} MB\n")
+
+        print(f"{'':8}{'RSS antes':>10}{'RSS':>9}{'+RSS':>9}{'PSS':>9}{'privada':>9}   (MB por worker, promedio)")
+        for mode in MODES:
+            rows = measure(mode, args.workers, db_path)
+            mean = {
+                key: sum(row[2][key] for row in rows) / len(rows) for key in ('rss', 'pss', 'private')
+            }
+            rss_before = sum(row[1]['rss'] for row in rows) / len(rows)
+            total_pss = sum(row[2]['pss'] for row in rows)
+            print(f"{mode:8}{rss_before:>10.1f}{mean['rss']:>9.1f}{mean['rss'] - rss_before:>9.1f}"
+                  f"{mean['pss']:>9.1f}{mean['private']:>9.1f}   total PSS {args.workers} workers: {total_pss:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,12 @@
 from pathlib import Path
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / 'user.db'
 DATABASE_URL = f"sqlite:///{DB_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
 
 engine = create_engine(
     DATABASE_URL,
@@ -65,3 +67,30 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Motor async (aiosqlite) para los handlers de routers/auth.py: las consultas se esperan con
+# await en el event loop en lugar de ocupar un hilo del threadpool de Starlette mientras SQLite
+# responde (o espera un lock). El motor sync queda para el arranque (create_all) y los scripts.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"timeout": 10},
+    pool_pre_ping=True,
+)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # Mismos ajustes por conexión que el motor sync (journal_mode ya quedó en DELETE en el archivo)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=FULL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
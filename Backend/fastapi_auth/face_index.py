@@ -0,0 +1,405 @@
+"""
+Índice en memoria de los face_hash (pHash de 64 bits) de los usuarios registrados.
+
+Mantiene todos los hashes empaquetados en un arreglo NumPy ``uint64`` y, encima,
+un índice multi-band (multi-index hashing): el hash se divide en ``bands`` bandas
+y cada banda se guarda agrupada por valor (counting sort con tabla de offsets
+densa). Por el principio del palomar, si
+``distancia(h, q) <= r`` al menos una banda difiere en ``<= r // bands`` bits, así
+que basta con sondear esos vecinos en cada banda y verificar solo los candidatos
+en lugar de recorrer todos los usuarios.
+
+El índice se persiste en ``face_index.npz`` junto a ``user.db`` para que los
+workers no lo reconstruyan al arrancar; se invalida si ``user.db`` cambió desde
+que se guardó.
+
+Cada worker guarda la firma de ``user.db`` con la que su índice está al día. Al
+aplicar su propia escritura (``upsert``/``remove``) solo adopta la firma nueva si
+la de antes de su commit coincidía con la suya: si entre medio escribió otro
+proceso, el índice queda marcado como desactualizado (``is_stale()``) y se
+recarga desde la BD, y el ``.npz`` que guarda no lo acepta ningún worker nuevo.
+"""
+import os
+import struct
+import threading
+from functools import lru_cache
+from itertools import combinations
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+HASH_BITS = 64
+HASH_HEX_LEN = HASH_BITS // 4
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = BASE_DIR / 'user.db'
+INDEX_PATH = Path(os.getenv("FACE_INDEX_PATH", str(BASE_DIR / 'face_index.npz')))
+FACE_INDEX_BANDS = int(os.getenv("FACE_INDEX_BANDS", "4"))
+# Cantidad de altas/cambios que se revisan por fuerza bruta antes de reconstruir las bandas
+REBUILD_THRESHOLD = 1024
+
+# Bits en 1 de cada byte, para contar bits sin np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_table(values: np.ndarray) -> np.ndarray:
+    """Bits en 1 de cada uint64 sumando la tabla por byte (mismo resultado que np.bitwise_count)."""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _BYTE_POPCOUNT[values.view(np.uint8).reshape(values.shape + (8,))].sum(axis=-1, dtype=np.uint8)
+
+
+# np.bitwise_count existe desde numpy 2.0; con versiones anteriores se usa la tabla
+_popcount = getattr(np, "bitwise_count", _popcount_table)
+
+
+def parse_face_hash(face_hash: Optional[str]) -> Optional[int]:
+    """Convertir el hex de un pHash de 64 bits a entero; None si no es válido."""
+    if not face_hash or len(face_hash) != HASH_HEX_LEN:
+        return None
+    try:
+        return int(face_hash, 16)
+    except ValueError:
+        return None
+
+
+def db_signature(db_path: Path = DB_PATH) -> Tuple[int, int, int]:
+    """
+    Firma barata de user.db (mtime, tamaño, contador de cambios) para detectar escrituras
+    de otros procesos. El contador (bytes 24-27 de la cabecera de SQLite) sube en cada
+    commit con journal_mode=DELETE; mtime y tamaño solos no bastan (un alta casi nunca
+    agranda el archivo y dos commits seguidos pueden compartir mtime).
+    """
+    try:
+        st = os.stat(db_path)
+        with open(db_path, "rb") as fh:
+            fh.seek(24)
+            header = fh.read(4)
+        counter = struct.unpack(">I", header)[0] if len(header) == 4 else 0
+        return int(st.st_mtime_ns), int(st.st_size), counter
+    except OSError:
+        return 0, 0, 0
+
+
+@lru_cache(maxsize=None)
+def _probe_masks(band_bits: int, radius: int) -> np.ndarray:
+    """Máscaras XOR de todos los valores a distancia <= radius dentro de una banda."""
+    masks = [0]
+    for r in range(1, min(radius, band_bits) + 1):
+        for bits in combinations(range(band_bits), r):
+            m = 0
+            for b in bits:
+                m |= 1 << b
+            masks.append(m)
+    return np.asarray(masks, dtype=np.int64)
+
+
+class FaceIndex:
+    """Índice multi-band id de usuario -> pHash empaquetado."""
+
+    def __init__(self, bands: int = FACE_INDEX_BANDS, path: Optional[Path] = INDEX_PATH,
+                 db_path: Path = DB_PATH):
+        if HASH_BITS % bands or HASH_BITS // bands > 16:
+            raise ValueError(f"bands debe dividir {HASH_BITS} y dejar bandas de 16 bits o menos")
+        self.bands = bands
+        self.band_bits = HASH_BITS // bands
+        self.path = Path(path) if path else None
+        self.db_path = Path(db_path)
+        self._lock = threading.RLock()
+        self._reset(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64))
+        self._loaded = False
+        self._signature = (0, 0, 0)
+
+    # ------------------------------------------------------------------ estado
+
+    def _reset(self, ids: np.ndarray, hashes: np.ndarray) -> None:
+        self._ids = ids
+        self._hashes = hashes
+        self._alive = np.ones(ids.size, dtype=bool)
+        self._pos = {int(user_id): i for i, user_id in enumerate(ids.tolist())}
+        self._dirty = set()
+        self._build_bands()
+
+    def _build_bands(self) -> None:
+        mask = np.uint64((1 << self.band_bits) - 1)
+        self._band_offsets = []
+        self._band_perm = []
+        for band in range(self.bands):
+            keys = ((self._hashes >> np.uint64(band * self.band_bits)) & mask).astype(np.int64)
+            perm = np.argsort(keys, kind="stable")
+            # offsets[k]:offsets[k + 1] son las posiciones (en perm) con valor de banda k
+            counts = np.bincount(keys, minlength=1 << self.band_bits)
+            offsets = np.zeros(counts.size + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self._band_offsets.append(offsets)
+            self._band_perm.append(perm.astype(np.int32))
+        self._dirty = set()
+
+    def _compact(self) -> None:
+        alive = self._alive
+        self._reset(self._ids[alive], self._hashes[alive])
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def build(self, rows: Iterable[Tuple[int, Optional[str]]]) -> None:
+        """Reconstruir el índice a partir de pares (user_id, face_hash)."""
+        ids, hashes = [], []
+        for user_id, face_hash in rows:
+            value = parse_face_hash(face_hash)
+            if value is None:
+                continue
+            ids.append(user_id)
+            hashes.append(value)
+        with self._lock:
+            self._reset(np.asarray(ids, dtype=np.int64), np.asarray(hashes, dtype=np.uint64))
+            self._loaded = True
+
+    def load_rows(self, rows: Iterable[Tuple[int, Optional[str]]], signature: Tuple[int, int, int]) -> None:
+        """
+        Reconstruir desde filas (id, face_hash) leídas de user.db y guardar el índice.
+        ``signature`` es la firma tomada antes de leer las filas: si alguien escribió
+        durante la lectura, el índice queda desactualizado y se recarga en el próximo uso.
+        """
+        with self._lock:
+            self.build(rows)
+            self._signature = tuple(signature)
+            self.save()
+
+    def load_from_db(self, db) -> None:
+        """Cargar solo (id, face_hash) desde la tabla users, sin instanciar modelos ORM."""
+        from . import models
+
+        with self._lock:
+            signature = self.db_signature()
+            rows = db.query(models.User.id, models.User.face_hash).order_by(models.User.id).all()
+            self.load_rows(rows, signature)
+
+    def ensure_loaded(self, db) -> None:
+        """Usar el índice persistido si sigue vigente; si no, reconstruir desde la BD."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if not self.load_file():
+                self.load_from_db(db)
+
+    def db_signature(self) -> Tuple[int, int, int]:
+        """Firma actual de la user.db de este índice."""
+        return db_signature(self.db_path)
+
+    def is_stale(self) -> bool:
+        """True si user.db fue escrita después de la última sincronización."""
+        return self.db_signature() != self._signature
+
+    def sync(self, db) -> bool:
+        """Reconstruir desde la BD si otro proceso escribió en user.db. Devuelve True si recargó."""
+        if self._loaded and not self.is_stale():
+            return False
+        self.load_from_db(db)
+        return True
+
+    # ------------------------------------------------------------ persistencia
+
+    def save(self) -> None:
+        """Guardar el índice de forma atómica junto a user.db."""
+        if self.path is None:
+            return
+        with self._lock:
+            arrays = {
+                "ids": self._ids,
+                "hashes": self._hashes,
+                "alive": self._alive,
+                "dirty": np.fromiter(self._dirty, dtype=np.int64, count=len(self._dirty)),
+                "signature": np.asarray(self._signature, dtype=np.int64),
+                "bands": np.asarray(self.bands, dtype=np.int64),
+            }
+            for band in range(self.bands):
+                arrays[f"offsets_{band}"] = self._band_offsets[band]
+                arrays[f"perm_{band}"] = self._band_perm[band]
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            try:
+                with open(tmp_path, "wb") as fh:
+                    np.savez(fh, **arrays)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Error saving face index: {e}")
+
+    def load_file(self) -> bool:
+        """Cargar el índice persistido si existe y corresponde al estado actual de user.db."""
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            with np.load(self.path) as data:
+                if int(data["bands"]) != self.bands:
+                    return False
+                signature = tuple(int(v) for v in data["signature"])
+                if signature != self.db_signature():
+                    return False
+                ids, alive = data["ids"], data["alive"]
+                with self._lock:
+                    self._ids = ids
+                    self._hashes = data["hashes"]
+                    self._alive = alive
+                    self._pos = {
+                        int(user_id): i for i, user_id in enumerate(ids.tolist()) if alive[i]
+                    }
+                    self._band_offsets = [data[f"offsets_{b}"] for b in range(self.bands)]
+                    self._band_perm = [data[f"perm_{b}"] for b in range(self.bands)]
+                    self._dirty = set(data["dirty"].tolist())
+                    self._signature = signature
+                    self._loaded = True
+            return True
+        except Exception as e:
+            print(f"Error loading face index: {e}")
+            return False
+
+    # ------------------------------------------------------------- mutaciones
+
+    def _after_write(self, signature: Optional[Tuple[int, int, int]]) -> bool:
+        if len(self._dirty) > REBUILD_THRESHOLD:
+            self._compact()
+        # Solo si el índice estaba al día antes del commit propio y después hubo a lo sumo un
+        # commit (el propio; ninguno si no cambió nada), la firma nueva corresponde exactamente
+        # a lo que tiene; si no, se conserva la vieja e is_stale() sigue en True
+        current = self.db_signature()
+        in_sync = (
+            signature is not None
+            and tuple(signature) == self._signature
+            and (current == self._signature or current[2] == signature[2] + 1)
+        )
+        if in_sync:
+            self._signature = current
+        self.save()
+        return in_sync
+
+    def upsert(self, user_id: int, face_hash: Optional[str],
+               signature: Optional[Tuple[int, int, int]] = None) -> bool:
+        """
+        Agregar o actualizar el hash de un usuario (tras register/update).
+
+        ``signature`` es la firma de user.db tomada antes del commit que escribió el
+        usuario, con el lock de escritura de SQLite ya tomado (después del flush), de modo
+        que ningún otro proceso pudo escribir entre esa firma y el commit; después del
+        commit el contador de cambios tiene que haber subido en uno. Devuelve False
+        si el índice no estaba al día (u omitiendo ``signature``): el llamador debe
+        recargarlo desde la BD (``load_from_db``/``load_rows``).
+        """
+        if not self._loaded:
+            # Se cargará completo (archivo o BD) en el primer uso
+            return True
+        value = parse_face_hash(face_hash)
+        if value is None:
+            return self.remove([user_id], signature)
+        with self._lock:
+            pos = self._pos.get(int(user_id))
+            if pos is None:
+                pos = self._ids.size
+                self._ids = np.append(self._ids, np.int64(user_id))
+                self._hashes = np.append(self._hashes, np.uint64(value))
+                self._alive = np.append(self._alive, True)
+                self._pos[int(user_id)] = pos
+            else:
+                hashes = self._hashes.copy()
+                hashes[pos] = value
+                self._hashes = hashes
+                alive = self._alive.copy()
+                alive[pos] = True
+                self._alive = alive
+            # Las bandas no reflejan este hash: se revisa por fuerza bruta hasta reconstruir
+            self._dirty.add(pos)
+            return self._after_write(signature)
+
+    def remove(self, user_ids: Iterable[int], signature: Optional[Tuple[int, int, int]] = None) -> bool:
+        """Eliminar usuarios del índice (tras delete). ``signature`` y el resultado, como en ``upsert``."""
+        if not self._loaded:
+            return True
+        with self._lock:
+            alive = self._alive.copy()
+            for user_id in user_ids:
+                pos = self._pos.pop(int(user_id), None)
+                if pos is not None:
+                    alive[pos] = False
+                    self._dirty.discard(pos)
+            self._alive = alive
+            if alive.size and (~alive).sum() * 4 > alive.size:
+                self._compact()
+            return self._after_write(signature)
+
+    def touch(self, signature: Optional[Tuple[int, int, int]] = None) -> bool:
+        """
+        Registrar una escritura propia en users que no cambia ningún face_hash (p. ej. editar
+        el email o el rol): el índice sigue al día. ``signature`` y el resultado, como en ``upsert``.
+        """
+        if not self._loaded:
+            return True
+        with self._lock:
+            return self._after_write(signature)
+
+    # -------------------------------------------------------------- búsquedas
+
+    def _candidates(self, value: int, max_distance: int) -> np.ndarray:
+        """Posiciones cuyo hash coincide en al menos una banda a distancia <= max_distance // bands."""
+        masks = _probe_masks(self.band_bits, max_distance // self.bands)
+        band_mask = (1 << self.band_bits) - 1
+        found = []
+        for band in range(self.bands):
+            offsets = self._band_offsets[band]
+            probes = ((value >> (band * self.band_bits)) & band_mask) ^ masks
+            lo = offsets[probes]
+            lengths = offsets[probes + 1] - lo
+            total = int(lengths.sum())
+            if total == 0:
+                continue
+            # Concatenar los rangos [lo, hi) sin bucle Python
+            starts = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+            found.append(self._band_perm[band][starts + np.arange(total)].astype(np.int64))
+        if self._dirty:
+            found.append(np.fromiter(self._dirty, dtype=np.int64))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        # Puede haber duplicados (coinciden en varias bandas); no afectan al mínimo
+        return np.concatenate(found)
+
+    def distances(self, face_hash: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Distancias de Hamming (fuerza bruta vectorizada) contra todos los usuarios del índice."""
+        value = parse_face_hash(face_hash)
+        with self._lock:
+            alive = self._alive
+            ids, hashes = self._ids[alive], self._hashes[alive]
+        if value is None:
+            return ids, np.full(ids.size, HASH_BITS, dtype=np.uint8)
+        return ids, _popcount(np.bitwise_xor(hashes, np.uint64(value)))
+
+    def best_match(self, face_hash: str, max_distance: int) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Devolver (user_id, distancia) del usuario más cercano con distancia <= max_distance,
+        o (None, None) si no hay ninguno. En empate se elige el id menor, igual que el
+        recorrido secuencial original.
+        """
+        value = parse_face_hash(face_hash)
+        if value is None:
+            return None, None
+        max_distance = min(max_distance, HASH_BITS - 1)
+        with self._lock:
+            ids, hashes, alive = self._ids, self._hashes, self._alive
+            candidates = self._candidates(value, max_distance)
+        if candidates.size == 0:
+            return None, None
+        candidates = candidates[alive[candidates]]
+        dist = _popcount(np.bitwise_xor(hashes[candidates], np.uint64(value)))
+        within = dist <= max_distance
+        if not within.any():
+            return None, None
+        cand_ids, dist = ids[candidates[within]], dist[within]
+        best = np.lexsort((cand_ids, dist))[0]
+        return int(cand_ids[best]), int(dist[best])
+
+
+# Instancia global del índice (una por proceso)
+face_index = FaceIndex()
@@ -0,0 +1,271 @@
+"""
+Pool de procesos para el hash facial (base64 -> PIL -> pHash) fuera del hilo de la request.
+
+Decodificar, convertir y redimensionar con PIL y calcular la DCT del pHash es
+trabajo de CPU que retiene el GIL buena parte del tiempo. Hecho dentro de los
+handlers sync ocupaba los hilos del threadpool de Starlette: con una ráfaga de
+logins se agotaban y hasta ``/health`` quedaba esperando.
+
+``FaceHashPool`` lo manda a un ``ProcessPoolExecutor`` (``spawn``) con
+``FACE_WORKERS`` procesos. El handler espera con ``await`` sin ocupar ningún hilo
+(ver ``face_hash_from_form``, una dependencia async que reemplaza al campo
+``face_image`` del formulario). La cola es acotada: como mucho
+``FACE_WORKERS + FACE_QUEUE_SIZE`` imágenes en curso; las siguientes reciben un
+503 inmediato con ``Retry-After`` en lugar de acumular latencia.
+
+Las imágenes llegan como data URL (campo ``face_image`` del formulario) o como
+archivo binario multipart (``face_file``, ver ``face_hash_from_upload``): este
+último evita el ~33% extra del base64 y la copia de decodificarlo, y se limita a
+``FACE_IMAGE_MAX_BYTES`` (413 si lo supera).
+
+El base64 se decodifica en este proceso y, antes de ocupar un lugar en la cola,
+se consulta ``security.face_hash_cache`` con el digest de los bytes: un frame
+repetido (el frontend reintenta la captura) responde sin llegar al pool.
+
+``metrics()`` (expuesto en ``/metrics/face``) informa profundidad de cola,
+contadores, la caché y latencias por etapa (decode y digest en este proceso;
+image y phash dentro del worker; queue = espera + IPC; total) sobre las últimas
+``LATENCY_SAMPLES`` imágenes calculadas en el pool.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+from fastapi import File, Form, HTTPException, UploadFile, status
+
+from .security import decode_image_data, face_hash_cache, face_hash_from_image, prepare_face_image
+
+
+def _available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+FACE_WORKERS = int(os.getenv("FACE_WORKERS", "0")) or min(4, _available_cores())
+FACE_QUEUE_SIZE = int(os.getenv("FACE_QUEUE_SIZE", "16"))
+FACE_HASH_TIMEOUT = float(os.getenv("FACE_HASH_TIMEOUT", "10"))
+FACE_IMAGE_MAX_BYTES = int(os.getenv("FACE_IMAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+FACE_IMAGE_TYPES = ("image/jpeg", "image/png")
+LATENCY_SAMPLES = 1024
+STAGES = ("decode", "digest", "image", "phash", "queue", "total")
+
+
+class FaceHashBusy(Exception):
+    """El pool no acepta más imágenes (cola llena, tiempo agotado o pool caído)."""
+
+
+def hash_face_timed(data: bytes) -> Tuple[str, Dict[str, float]]:
+    """
+    Corre en el proceso del pool: pHash de los bytes de la imagen y segundos de cada
+    etapa. Igual que ``compute_face_hash_from_bytes``, una imagen inválida devuelve "".
+    """
+    timings = {}
+    start = time.perf_counter()
+    try:
+        image = prepare_face_image(data)
+        prepared = time.perf_counter()
+        timings["image"] = prepared - start
+        face_hash = face_hash_from_image(image)
+        timings["phash"] = time.perf_counter() - prepared
+    except Exception as e:
+        print(f"Error computing face hash: {e}")
+        face_hash = ""
+    timings["worker"] = time.perf_counter() - start
+    return face_hash, timings
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+class FaceHashPool:
+    """Procesos de hash facial con cola acotada, backpressure y métricas."""
+
+    def __init__(self, workers: int = FACE_WORKERS, queue_size: int = FACE_QUEUE_SIZE,
+                 timeout: float = FACE_HASH_TIMEOUT):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.capacity = self.workers + self.queue_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._counters = dict.fromkeys(("completed", "cached", "invalid", "rejected", "timeouts", "failures"), 0)
+        self._latencies = {stage: deque(maxlen=LATENCY_SAMPLES) for stage in STAGES}
+
+    # ------------------------------------------------------------------ ciclo de vida
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Arrancar los procesos por adelantado: el primer login no paga el spawn ni los imports."""
+        executor = self._get_executor()
+        for future in [executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        # Un worker murió (p. ej. sin memoria): el próximo hash crea un pool nuevo
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------ hash
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    async def hash(self, image_data: Union[str, bytes]) -> str:
+        """
+        pHash de la imagen (data URL o bytes): de la caché o calculado en el pool.
+        Lanza ``FaceHashBusy`` si no hay lugar.
+        """
+        start = time.perf_counter()
+        try:
+            data = decode_image_data(image_data) if isinstance(image_data, str) else image_data
+        except Exception as e:
+            print(f"Error processing base64 image: {e}")
+            self._count("invalid")
+            return ""
+        decoded = time.perf_counter()
+        key = face_hash_cache.digest(data)
+        face_hash = face_hash_cache.get(key)
+        if face_hash is not None:
+            self._count("cached")
+            return face_hash
+        digested = time.perf_counter()
+
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._counters["rejected"] += 1
+                raise FaceHashBusy("cola de procesamiento facial llena")
+            self._in_flight += 1
+
+        submitted = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(hash_face_timed, data)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._release()
+            self._count("failures")
+            self._discard_executor(executor)
+            raise FaceHashBusy(str(e))
+        # El lugar se libera cuando el worker termina (o la tarea se cancela antes de empezar),
+        # no cuando el cliente deja de esperar: la capacidad refleja el trabajo real del pool
+        future.add_done_callback(self._release)
+
+        try:
+            face_hash, timings = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            raise FaceHashBusy("tiempo de procesamiento facial agotado")
+        except BrokenProcessPool as e:
+            self._count("failures")
+            self._discard_executor(executor)
+            raise FaceHashBusy(str(e))
+
+        finished = time.perf_counter()
+        face_hash_cache.put(key, face_hash)
+        timings["decode"] = decoded - start
+        timings["digest"] = digested - decoded
+        timings["queue"] = max(0.0, finished - submitted - timings.pop("worker"))
+        timings["total"] = finished - start
+        with self._lock:
+            self._counters["completed" if face_hash else "invalid"] += 1
+            for stage, seconds in timings.items():
+                self._latencies[stage].append(seconds)
+        return face_hash
+
+    # ------------------------------------------------------------------ métricas
+
+    def metrics(self) -> dict:
+        with self._lock:
+            in_flight = self._in_flight
+            counters = dict(self._counters)
+            samples = {stage: np.asarray(values) for stage, values in self._latencies.items()}
+        latency_ms = {}
+        for stage, values in samples.items():
+            if values.size:
+                p50, p95 = np.percentile(values, [50, 95]) * 1000
+                latency_ms[stage] = {
+                    "count": int(values.size), "p50": round(float(p50), 2),
+                    "p95": round(float(p95), 2), "max": round(float(values.max()) * 1000, 2),
+                }
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": in_flight,
+            "queue_depth": max(0, in_flight - self.workers),
+            **counters,
+            "cache": face_hash_cache.stats(),
+            "latency_ms": latency_ms,
+        }
+
+
+face_pool = FaceHashPool()
+
+
+async def _pooled_hash(image_data: Union[str, bytes]) -> str:
+    try:
+        return await face_pool.hash(image_data)
+    except FaceHashBusy as e:
+        print(f"Face hashing rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado procesando rostros, reintente en unos segundos",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def face_hash_from_form(face_image: str = Form(...)) -> str:
+    """Dependencia: pHash del campo ``face_image`` (data URL de la cámara) calculado en el pool."""
+    return await _pooled_hash(face_image)
+
+
+async def face_hash_from_upload(face_file: UploadFile = File(...)) -> str:
+    """
+    Dependencia: pHash del archivo ``face_file`` (JPEG/PNG binario) calculado en el pool.
+    Se leen a lo sumo ``FACE_IMAGE_MAX_BYTES + 1`` bytes: un archivo mayor recibe 413
+    sin copiarlo entero a memoria (Starlette ya lo guardó en disco si pasaba de 1 MB).
+    """
+    if face_file.content_type not in FACE_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Tipo de imagen no soportado: {face_file.content_type} (usar JPEG o PNG)",
+        )
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"La imagen supera el máximo de {FACE_IMAGE_MAX_BYTES} bytes",
+    )
+    if face_file.size is not None and face_file.size > FACE_IMAGE_MAX_BYTES:
+        raise too_large
+    data = await face_file.read(FACE_IMAGE_MAX_BYTES + 1)
+    if len(data) > FACE_IMAGE_MAX_BYTES:
+        raise too_large
+    return await _pooled_hash(data)
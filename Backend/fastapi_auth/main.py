@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import auth
 from .db import Base, engine
+from .face_pool import face_pool
 from . import models
 
 app = FastAPI(title="FastAPI Auth", version="0.1.0")
@@ -24,18 +25,24 @@ app.include_router(auth.router, prefix="/auth", tags=["auth"])
 
 
 @app.get("/health")
-def health():
+async def health():
+    # async: responde en el event loop aunque el threadpool esté ocupado
     return {"status": "ok"}
 
 
+@app.get("/metrics/face")
+async def face_metrics():
+    """Profundidad de cola, contadores y latencias por etapa del pool de hash facial"""
+    return face_pool.metrics()
+
+
 @app.get("/test-face-processing")
-def test_face_processing():
+async def test_face_processing():
     """Endpoint de prueba para verificar que el procesamiento facial funciona"""
     try:
-        from .security import compute_face_hash_from_base64
         # Probar con una imagen base64 de prueba (puede ser cualquier imagen válida)
         test_image = "data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAYEBQYFBAYGBQYHBwYIChAKCgkJChQODwwQFxQYGBcUFhYaHSUfGhsjHBYWICwgIyYnKSopGR8tMC0oMCUoKSj/2wBDAQcHBwoIChMKChMoGhYaKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCj/wAARCAABAAEDASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAv/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAAAAX/xAAUEQEAAAAAAAAAAAAAAAAAAAAA/9oADAMBAAIRAxEAPwCdABmX/9k="
-        face_hash = compute_face_hash_from_base64(test_image)
+        face_hash = await face_pool.hash(test_image)
         return {
             "status": "ok",
             "face_processing_works": True,
@@ -53,3 +60,10 @@ def test_face_processing():
 def on_startup():
     # Crear tablas si no existen
     Base.metadata.create_all(bind=engine)
+    # Levantar los procesos de hash facial antes del primer login
+    face_pool.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    face_pool.shutdown()
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import get_db
+from ..db import get_async_db
 from .. import models, schemas
-from ..security import compute_face_hash_from_base64, is_same_face, create_access_token, hamming_distance
+from ..security import create_access_token
+from ..face_index import face_index
+from ..face_pool import face_hash_from_form, face_hash_from_upload
 from pydantic import EmailStr  # import permitido pero no se instancia
 from typing import Optional, List
 from uuid import uuid4
+import asyncio
 from datetime import datetime, timezone
 try:
     from zoneinfo import ZoneInfo  # Python 3.9+
@@ -15,18 +20,74 @@ except Exception:
 
 router = APIRouter()
 
+# Los handlers son async sobre AsyncSession (aiosqlite): las consultas no ocupan hilos del
+# threadpool. Lo que sigue siendo bloqueante va aparte con run_in_threadpool: actualizar
+# face_index, leer el .npz y reconstruirlo (numpy + guardar el .npz). Las filas (id, face_hash)
+# para reconstruirlo se leen con la sesión async, sin run_sync (que bloquearía el event loop).
+
+_face_index_reload = asyncio.Lock()
+
+
+async def _sync_face_index(db: AsyncSession) -> None:
+    """Cargar face_index (del .npz o de la BD) si falta, o recargarlo si user.db cambió."""
+    if face_index.loaded and not face_index.is_stale():
+        return
+    # Una sola recarga por proceso: los logins concurrentes esperan la misma
+    async with _face_index_reload:
+        if not face_index.loaded and await run_in_threadpool(face_index.load_file):
+            return
+        if face_index.loaded and not face_index.is_stale():
+            return
+        signature = face_index.db_signature()
+        rows = (await db.execute(
+            select(models.User.id, models.User.face_hash).order_by(models.User.id)
+        )).all()
+        await run_in_threadpool(face_index.load_rows, rows, signature)
+
+
+async def _commit_with_signature(db: AsyncSession):
+    """
+    Commit de una escritura en users devolviendo la firma de user.db de antes del commit.
+    El flush ya tomó el lock de escritura de SQLite: ningún otro proceso puede hacer commit
+    entre la firma y el nuestro, así face_index sabe si su estado incluía todo lo anterior.
+    """
+    await db.flush()
+    signature = face_index.db_signature()
+    await db.commit()
+    return signature
+
+
+async def _apply_to_face_index(db: AsyncSession, mutate, *args) -> None:
+    # upsert/remove devuelven False si otro proceso escribió antes: recargar desde la BD
+    if not await run_in_threadpool(mutate, *args):
+        await _sync_face_index(db)
+
 
 @router.post("/register", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
-def register_user(
+async def register_user(
     username: str = Form(...),
     dni: Optional[str] = Form(None),
     email: Optional[str] = Form(None),
-    face_image: str = Form(...),
-    db: Session = Depends(get_db),
+    face_hash: str = Depends(face_hash_from_form),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    # face_image debe ser un dataURL/base64 del frame de la cámara
-    face_hash = compute_face_hash_from_base64(face_image)
+    # face_hash: pHash del campo face_image (dataURL/base64 del frame de la cámara), calculado en el pool
+    return await _register_face(username, dni, email, face_hash, db)
 
+
+@router.post("/register/upload", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
+async def register_user_upload(
+    username: str = Form(...),
+    dni: Optional[str] = Form(None),
+    email: Optional[str] = Form(None),
+    face_hash: str = Depends(face_hash_from_upload),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Igual que /register, pero face_file es el JPEG/PNG binario (multipart/form-data) en lugar de un dataURL
+    return await _register_face(username, dni, email, face_hash, db)
+
+
+async def _register_face(username: str, dni: Optional[str], email: Optional[str], face_hash: str, db: AsyncSession):
     # Autogenerar email/dni si no se envían
     if not email:
         email = f"{username}+auto-{uuid4().hex[:6]}@local.test"
@@ -35,22 +96,27 @@ def register_user(
 
     # Si ya existe el username, actualizamos su face_hash en lugar de crear duplicados
     existing_by_username = (
-        db.query(models.User)
-        .filter(models.User.username == username)
-        .order_by(models.User.created_at.desc())
-        .first()
-    )
+        await db.execute(
+            select(models.User)
+            .where(models.User.username == username)
+            .order_by(models.User.created_at.desc())
+            .limit(1)
+        )
+    ).scalars().first()
     if existing_by_username:
         existing_by_username.face_hash = face_hash
-        db.commit()
-        db.refresh(existing_by_username)
+        signature = await _commit_with_signature(db)
+        await db.refresh(existing_by_username)
+        await _apply_to_face_index(
+            db, face_index.upsert, existing_by_username.id, existing_by_username.face_hash, signature
+        )
         # 200 OK sería semánticamente correcto, pero mantenemos 201 por compat.
         return existing_by_username
 
     # Validar unicidad por email y dni (para nuevos usuarios)
-    existing = db.query(models.User).filter(
-        (models.User.email == email) | (models.User.dni == dni)
-    ).first()
+    existing = (await db.execute(
+        select(models.User).where((models.User.email == email) | (models.User.dni == dni)).limit(1)
+    )).scalars().first()
     if existing:
         raise HTTPException(status_code=400, detail="Usuario ya existe por email o DNI")
 
@@ -71,77 +137,100 @@ def register_user(
         created_at=created_at_local,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    signature = await _commit_with_signature(db)
+    await db.refresh(user)
+    await _apply_to_face_index(db, face_index.upsert, user.id, user.face_hash, signature)
     return user
 
 
 @router.get("/users", response_model=List[schemas.UserOut])
-def list_users(db: Session = Depends(get_db)):
-    return db.query(models.User).all()
+async def list_users(db: AsyncSession = Depends(get_async_db)):
+    return (await db.execute(select(models.User))).scalars().all()
 
 
 @router.delete("/users/by-username/{username}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_by_username(username: str, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == username).first()
+async def delete_user_by_username(username: str, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(
+        select(models.User).where(models.User.username == username).limit(1)
+    )).scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    db.delete(user)
-    db.commit()
+    user_id = user.id
+    await db.delete(user)
+    signature = await _commit_with_signature(db)
+    await _apply_to_face_index(db, face_index.remove, [user_id], signature)
     return
 
 
 @router.delete("/users/by-username/{username}/all", status_code=status.HTTP_204_NO_CONTENT)
-def delete_all_users_by_username(username: str, db: Session = Depends(get_db)):
-    q = db.query(models.User).filter(models.User.username == username)
-    if q.count() == 0:
+async def delete_all_users_by_username(username: str, db: AsyncSession = Depends(get_async_db)):
+    user_ids = (await db.execute(
+        select(models.User.id).where(models.User.username == username)
+    )).scalars().all()
+    if not user_ids:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    q.delete(synchronize_session=False)
-    db.commit()
+    await db.execute(
+        delete(models.User).where(models.User.username == username).execution_options(synchronize_session=False)
+    )
+    signature = await _commit_with_signature(db)
+    await _apply_to_face_index(db, face_index.remove, user_ids, signature)
     return
 
 
 @router.post("/login/face", response_model=schemas.Token)
-def login_face(
-    face_image: str = Form(...),
-    db: Session = Depends(get_db),
+async def login_face(
+    provided_hash: str = Depends(face_hash_from_form),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Login solo con la cara: comparar pHash del rostro provisto con todos los almacenados.
     Seleccionar SIEMPRE la mejor coincidencia global y validar contra el umbral.
+    La búsqueda usa el índice multi-band de face_index, sin recorrer todas las filas.
+    El pHash del campo face_image se calcula en el pool de procesos (503 si está saturado).
+    """
+    return await _login_with_face_hash(provided_hash, db)
+
+
+@router.post("/login/face/upload", response_model=schemas.Token)
+async def login_face_upload(
+    provided_hash: str = Depends(face_hash_from_upload),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Igual que /login/face con el rostro en face_file: JPEG/PNG binario por multipart/form-data,
+    sin base64 (hasta FACE_IMAGE_MAX_BYTES; 413 si es mayor, 415 si no es JPEG/PNG).
     """
+    return await _login_with_face_hash(provided_hash, db)
+
+
+async def _login_with_face_hash(provided_hash: str, db: AsyncSession):
     from ..security import FACE_MATCH_THRESHOLD
 
-    provided_hash = compute_face_hash_from_base64(face_image)
     print(f"Provided face hash: {provided_hash}")
 
-    best_match_distance = 64
-    best_match_user = None
-
-    for candidate in db.query(models.User).all():
-        distance = hamming_distance(candidate.face_hash, provided_hash)
-        print(f"Comparing with user {candidate.username} (id={candidate.id}): distance={distance}")
-        if distance < best_match_distance:
-            best_match_distance = distance
-            best_match_user = candidate
+    # Búsqueda sub-lineal sobre el índice multi-band en memoria (solo se verifican candidatos).
+    # Antes de buscar se recarga si user.db cambió desde otro proceso (alta, re-registro o borrado):
+    # un hash re-registrado en otro worker podría dar un match viejo que igual existe en la BD
+    await _sync_face_index(db)
+    best_match_id, best_match_distance = face_index.best_match(provided_hash, FACE_MATCH_THRESHOLD)
+    best_match_user = await db.get(models.User, best_match_id) if best_match_id is not None else None
 
-    if not best_match_user or best_match_distance > FACE_MATCH_THRESHOLD:
+    if best_match_user is None:
         print(
-            "No match under threshold. Best match: "
-            f"{best_match_user.username if best_match_user else 'None'} with distance {best_match_distance},"
-            f" threshold={FACE_MATCH_THRESHOLD}"
+            f"No match under threshold={FACE_MATCH_THRESHOLD} among {len(face_index)} users"
         )
         raise HTTPException(
             status_code=401,
-            detail=f"Rostro no coincide con ningún usuario registrado. Mejor coincidencia: distancia {best_match_distance}",
+            detail=f"Rostro no coincide con ningún usuario registrado (umbral de distancia {FACE_MATCH_THRESHOLD})",
         )
 
+    print(f"Best match: {best_match_user.username} (id={best_match_id}): distance={best_match_distance}")
     token = create_access_token(subject=best_match_user.email)
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=schemas.UserOut)
-def me(token: str, db: Session = Depends(get_db)):
+async def me(token: str, db: AsyncSession = Depends(get_async_db)):
     # token simple en query o header (frontend lo pasará como header Authorization normalmente)
     # Permitimos query para simplificar pruebas; en prod, usar dependency OAuth2
     from ..security import decode_token
@@ -151,7 +240,9 @@ def me(token: str, db: Session = Depends(get_db)):
     except Exception:
         raise HTTPException(status_code=401, detail="Token inválido")
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = (await db.execute(
+        select(models.User).where(models.User.email == email).limit(1)
+    )).scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return user
@@ -169,20 +260,24 @@ class UserUpdate(BaseModel):
 
 
 @router.put("/users/{user_id}", response_model=schemas.UserOut)
-def update_user(user_id: int, payload: UserUpdate, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def update_user(user_id: int, payload: UserUpdate, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
     # Validaciones de unicidad básicas si cambian email o dni
     if payload.email and payload.email != user.email:
-        exists_email = db.query(models.User).filter(models.User.email == payload.email).first()
+        exists_email = (await db.execute(
+            select(models.User.id).where(models.User.email == payload.email).limit(1)
+        )).first()
         if exists_email:
             raise HTTPException(status_code=400, detail="Email ya está en uso")
         user.email = payload.email
 
     if payload.dni and payload.dni != user.dni:
-        exists_dni = db.query(models.User).filter(models.User.dni == payload.dni).first()
+        exists_dni = (await db.execute(
+            select(models.User.id).where(models.User.dni == payload.dni).limit(1)
+        )).first()
         if exists_dni:
             raise HTTPException(status_code=400, detail="DNI ya está en uso")
         user.dni = payload.dni
@@ -197,6 +292,9 @@ def update_user(user_id: int, payload: UserUpdate, db: Session = Depends(get_db)
             raise HTTPException(status_code=400, detail="Rol inválido")
         user.role = payload.role
 
-    db.commit()
-    db.refresh(user)
+    # También sin cambiar face_hash el commit sube el contador de user.db: avisar al índice para
+    # que no quede desactualizado (ni su .npz) y el próximo login no lo reconstruya desde la BD
+    signature = await _commit_with_signature(db)
+    await db.refresh(user)
+    await _apply_to_face_index(db, face_index.touch, signature)
     return user
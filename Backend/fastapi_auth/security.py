@@ -1,6 +1,10 @@
 import os
 import base64
+import hashlib
 import io
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -14,6 +18,12 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
 # Reducimos el umbral por defecto para evitar falsos positivos en phash (64 bits)
 # Recomendado: 6-10 según condiciones de iluminación. Permitimos override por ENV.
 FACE_MATCH_THRESHOLD = int(os.getenv("FACE_MATCH_THRESHOLD", "15"))
+FACE_IMAGE_SIZE = (256, 256)
+# Decodificar JPEG en modo draft (escalado en la DCT); FACE_JPEG_DRAFT=0 vuelve a la decodificación completa
+FACE_JPEG_DRAFT = os.getenv("FACE_JPEG_DRAFT", "1") != "0"
+# Caché de pHash por contenido: tope de memoria (bytes, 0 la desactiva) y vida de cada entrada (segundos)
+FACE_HASH_CACHE_MAX_BYTES = int(os.getenv("FACE_HASH_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+FACE_HASH_CACHE_TTL = float(os.getenv("FACE_HASH_CACHE_TTL", "120"))
 
 
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
@@ -26,11 +36,119 @@ def decode_token(token: str):
     return jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
 
 
+def decode_image_data(data_url: str) -> bytes:
+    """Bytes de la imagen a partir de un data URL ('data:image/jpeg;base64,...') o de base64 plano."""
+    header, b64data = data_url.split(",", 1) if "," in data_url else ("", data_url)
+    return base64.b64decode(b64data)
+
+
+def prepare_face_image(data: bytes, draft: bool = FACE_JPEG_DRAFT) -> Image.Image:
+    """
+    Imagen en escala de grises de 256x256 sobre la que se calcula el pHash.
+
+    Con ``draft`` un JPEG se decodifica directo a luminancia (sin pasar por RGB) y
+    reducido por 1/2, 1/4 u 1/8 en la DCT (la mayor reducción que no baja de
+    256x256): un frame de 1920x1080 se decodifica como 480x270 y cuesta un tercio.
+    El paso intermedio a 256x256 se mantiene porque de él depende el pHash. Los
+    píxeles cambian apenas, así que el hash puede diferir del de la decodificación
+    completa: en ``bench_face_decode`` difiere en ~2% de los frames de 640x480 y
+    ~9% de los de 1280x720 y 1920x1080, siempre en 2 bits como máximo, muy por
+    debajo de ``FACE_MATCH_THRESHOLD``. Otros formatos ignoran ``draft``.
+    """
+    image = Image.open(io.BytesIO(data))
+    if draft:
+        image.draft("L", FACE_IMAGE_SIZE)
+    return image.convert("L").resize(FACE_IMAGE_SIZE)
+
+
+def face_hash_from_image(image: Image.Image) -> str:
+    return str(imagehash.phash(image))
+
+
+class FaceHashCache:
+    """
+    LRU de pHash indexado por un digest (BLAKE2b de 128 bits) de los bytes de la imagen.
+
+    El login facial del frontend reintenta la captura en un loop y suele reenviar el
+    mismo frame: con el mismo contenido el pHash es el mismo, así que se devuelve sin
+    pasar por PIL ni la DCT. Solo coinciden bytes idénticos (un frame nuevo de la
+    cámara es otra entrada). Las entradas vencen a los ``ttl`` segundos y, al superar
+    ``max_bytes`` (estimado con ``ENTRY_BYTES`` por entrada), se descarta la menos
+    usada. Es seguro entre hilos. ``clock`` (por defecto ``time.monotonic``) permite
+    a los tests avanzar el tiempo sin esperar.
+    """
+
+    # Costo aproximado de una entrada: digest (49) + hash hex (65) + tupla (56) + float (24) + nodo del OrderedDict
+    ENTRY_BYTES = 320
+
+    def __init__(self, max_bytes: int = FACE_HASH_CACHE_MAX_BYTES, ttl: float = FACE_HASH_CACHE_TTL,
+                 clock=time.monotonic):
+        self.max_entries = max(0, max_bytes) // self.ENTRY_BYTES
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # digest -> (face_hash, vence)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expired = self.evictions = 0
+
+    @staticmethod
+    def digest(data: bytes) -> bytes:
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: bytes, face_hash: str) -> None:
+        if not self.max_entries or not face_hash:
+            return
+        with self._lock:
+            self._entries[key] = (face_hash, self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "approx_bytes": len(self._entries) * self.ENTRY_BYTES,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+
+face_hash_cache = FaceHashCache()
+
+
 def compute_face_hash_from_bytes(data: bytes) -> str:
     try:
-        image = Image.open(io.BytesIO(data)).convert("L").resize((256, 256))
-        ph = imagehash.phash(image)
-        return str(ph)
+        key = face_hash_cache.digest(data)
+        cached = face_hash_cache.get(key)
+        if cached is not None:
+            return cached
+        face_hash = face_hash_from_image(prepare_face_image(data))
+        face_hash_cache.put(key, face_hash)
+        return face_hash
     except Exception as e:
         print(f"Error computing face hash: {e}")
         return ""
@@ -39,8 +157,7 @@ def compute_face_hash_from_bytes(data: bytes) -> str:
 def compute_face_hash_from_base64(data_url: str) -> str:
     # expects data URL like 'data:image/jpeg;base64,...'
     try:
-        header, b64data = data_url.split(",", 1) if "," in data_url else ("", data_url)
-        raw = base64.b64decode(b64data)
+        raw = decode_image_data(data_url)
         return compute_face_hash_from_bytes(raw)
     except Exception as e:
         print(f"Error processing base64 image: {e}")
@@ -0,0 +1,43 @@
+"""
+Imágenes sintéticas compartidas por ``fastapi_auth.tests`` y los benchmarks: los
+tests las usan sin depender del paquete ``benchmarks``.
+"""
+import base64
+import io
+
+import numpy as np
+
+
+def synthetic_jpeg(size, seed=0):
+    """JPEG de ruido suavizado (un pHash estable, como el de una foto)."""
+    from PIL import Image, ImageFilter
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(size / 40))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def synthetic_face(size, seed=0):
+    """Data URL de ``synthetic_jpeg``, como lo envía el frontend."""
+    return "data:image/jpeg;base64," + base64.b64encode(synthetic_jpeg(size, seed)).decode()
+
+
+def synthetic_frame(width, height, seed=0, quality=85):
+    """JPEG con zonas suaves, bordes y ruido de sensor (un pHash que depende de la imagen)."""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, size=(height // 16, width // 16, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.BICUBIC)
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x, y, r = rng.integers(0, width), rng.integers(0, height), rng.integers(height // 10, height // 3)
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+    pixels = np.asarray(image.filter(ImageFilter.GaussianBlur(2)), dtype=np.float64)
+    pixels += rng.normal(0, 6, size=pixels.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
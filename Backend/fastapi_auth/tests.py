@@ -0,0 +1,626 @@
+"""
+Tests de fastapi_auth. No tocan user.db: la app corre sobre un SQLite temporal
+(ASGI en proceso con httpx) y el pool de hash facial, salvo un test, sobre hilos.
+
+Uso (desde Backend/):
+    python -m unittest fastapi_auth.tests
+"""
+import asyncio
+import io
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from unittest import mock
+
+import httpx
+import numpy as np
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .db import Base, get_async_db
+from . import face_index as face_index_module
+from .face_index import HASH_BITS, FaceIndex, _popcount_table, db_signature
+from .face_pool import FaceHashBusy, FaceHashPool
+from .main import app
+from .security import FACE_IMAGE_SIZE, FaceHashCache, face_hash_from_image, hamming_distance, prepare_face_image
+from .test_helpers import synthetic_face, synthetic_frame, synthetic_jpeg
+
+
+def random_hashes(rng, count):
+    return [f"{int(v):016x}" for v in rng.integers(0, 2 ** 64, size=count, dtype=np.uint64)]
+
+
+def flip_bits(face_hash, rng, bits):
+    value = int(face_hash, 16)
+    for bit in rng.choice(HASH_BITS, size=bits, replace=False):
+        value ^= 1 << int(bit)
+    return f"{value:016x}"
+
+
+def brute_force_match(index, face_hash, max_distance):
+    """Recorrido secuencial de referencia: menor distancia y, en empate, menor id."""
+    ids, distances = index.distances(face_hash)
+    within = distances <= max_distance
+    if not within.any():
+        return None, None
+    ids, distances = ids[within], distances[within]
+    best = np.lexsort((ids, distances))[0]
+    return int(ids[best]), int(distances[best])
+
+
+class FaceIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.db_path = self.workdir / "user.db"
+        self.npz_path = self.workdir / "face_index.npz"
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, face_hash TEXT, email TEXT)")
+            conn.execute("PRAGMA journal_mode=DELETE")
+
+    def rows(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT id, face_hash FROM users ORDER BY id").fetchall()
+
+    def new_index(self):
+        return FaceIndex(path=self.npz_path, db_path=self.db_path)
+
+    def load(self, index):
+        signature = index.db_signature()
+        index.load_rows(self.rows(), signature)
+
+    def write(self, sql, params=()):
+        """Escritura como la de los routers: firma con el lock de escritura tomado, luego commit."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(sql, params)
+            signature = db_signature(self.db_path)
+            conn.commit()
+            return cursor.lastrowid, signature
+        finally:
+            conn.close()
+
+    def test_best_match_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        hashes = random_hashes(rng, 3000)
+        # Algunos hashes cercanos entre sí para forzar empates y vecinos dentro del umbral
+        hashes[1000:1100] = [flip_bits(h, rng, 2) for h in hashes[:100]]
+        index = FaceIndex(path=None, db_path=self.db_path)
+        index.build(enumerate(hashes, start=1))
+        # Cambios incrementales: altas y re-registros (bandas sucias) y bajas
+        for user_id in range(3001, 3051):
+            index.upsert(user_id, flip_bits(hashes[user_id % 500], rng, 3))
+        for user_id in range(1, 40):
+            index.upsert(user_id, random_hashes(rng, 1)[0])
+        index.remove(range(100, 200))
+
+        for i in range(400):
+            query = flip_bits(hashes[(i * 7) % len(hashes)], rng, int(rng.integers(0, 14)))
+            for max_distance in (0, 5, 10, 20):
+                self.assertEqual(
+                    index.best_match(query, max_distance),
+                    brute_force_match(index, query, max_distance),
+                )
+
+    def test_popcount_table_matches_bitwise_count(self):
+        rng = np.random.default_rng(3)
+        values = rng.integers(0, 2 ** 64, size=5000, dtype=np.uint64)
+        values[:3] = [0, 2 ** 64 - 1, 1 << 63]
+        expected = np.array([bin(int(v)).count("1") for v in values])
+        np.testing.assert_array_equal(_popcount_table(values), expected)
+        if hasattr(np, "bitwise_count"):
+            np.testing.assert_array_equal(np.bitwise_count(values), expected)
+
+    def test_best_match_without_bitwise_count(self):
+        # numpy < 2.0 no tiene np.bitwise_count: el índice cuenta bits con la tabla por byte
+        rng = np.random.default_rng(5)
+        hashes = random_hashes(rng, 500)
+        index = FaceIndex(path=None, db_path=self.db_path)
+        index.build(enumerate(hashes, start=1))
+        with mock.patch.object(face_index_module, "_popcount", _popcount_table):
+            for i in range(100):
+                query = flip_bits(hashes[i], rng, int(rng.integers(0, 12)))
+                self.assertEqual(index.best_match(query, 10), brute_force_match(index, query, 10))
+
+    def test_dirty_entries_are_folded_into_bands(self):
+        rng = np.random.default_rng(9)
+        hashes = random_hashes(rng, 200)
+        index = FaceIndex(path=None, db_path=self.db_path)
+        index.build(enumerate(hashes, start=1))
+        with mock.patch.object(face_index_module, "REBUILD_THRESHOLD", 16):
+            for user_id in range(201, 221):
+                hashes.append(flip_bits(hashes[user_id % 50], rng, 1))
+                index.upsert(user_id, hashes[-1])
+        # Pasado el umbral se reconstruyeron las bandas: nada queda para la fuerza bruta
+        self.assertLess(len(index._dirty), 16)
+        for user_id, face_hash in enumerate(hashes, start=1):
+            self.assertEqual(index.best_match(face_hash, 0), (user_id, 0))
+
+    def test_npz_round_trip_and_invalidation(self):
+        rng = np.random.default_rng(13)
+        for face_hash in random_hashes(rng, 50):
+            self.write("INSERT INTO users (face_hash) VALUES (?)", (face_hash,))
+        self.write("INSERT INTO users (face_hash) VALUES (?)", ("not-a-hash",))
+        index = self.new_index()
+        self.load(index)
+        self.assertEqual(len(index), 50)
+        fresh = self.new_index()
+        self.assertTrue(fresh.load_file())
+        for user_id, face_hash in self.rows()[:50]:
+            self.assertEqual(fresh.best_match(face_hash, 0), (user_id, 0))
+        # Otra escritura en user.db invalida el .npz guardado
+        self.write("DELETE FROM users WHERE id = 1")
+        self.assertFalse(self.new_index().load_file())
+
+    def test_two_workers_sharing_db_and_npz(self):
+        rng = np.random.default_rng(11)
+        h1, h2, h3 = random_hashes(rng, 3)
+        user1, _ = self.write("INSERT INTO users (face_hash) VALUES (?)", (h1,))
+        worker_a, worker_b = self.new_index(), self.new_index()
+        self.load(worker_a)
+        self.load(worker_b)
+
+        # A registra al usuario 2: su índice estaba al día y queda al día
+        user2, signature = self.write("INSERT INTO users (face_hash) VALUES (?)", (h2,))
+        self.assertTrue(worker_a.upsert(user2, h2, signature))
+        self.assertFalse(worker_a.is_stale())
+
+        # B registra al usuario 3 sin haber visto el alta de A: no puede darse por sincronizado
+        user3, signature = self.write("INSERT INTO users (face_hash) VALUES (?)", (h3,))
+        self.assertFalse(worker_b.upsert(user3, h3, signature))
+        self.assertTrue(worker_b.is_stale())
+        # Ni el .npz que guardó B es válido para un worker nuevo
+        self.assertFalse(self.new_index().load_file())
+
+        self.load(worker_b)
+        self.assertFalse(worker_b.is_stale())
+        self.assertEqual(worker_b.best_match(h2, 0), (user2, 0))
+
+        fresh = self.new_index()
+        self.assertTrue(fresh.load_file())
+        for user_id, face_hash in ((user1, h1), (user2, h2), (user3, h3)):
+            self.assertEqual(fresh.best_match(face_hash, 0), (user_id, 0))
+
+        # A se entera de la escritura de B y, tras recargar, de la baja del usuario 1
+        self.assertTrue(worker_a.is_stale())
+        self.load(worker_a)
+        _, signature = self.write("DELETE FROM users WHERE id = ?", (user1,))
+        self.assertTrue(worker_a.remove([user1], signature))
+        self.assertEqual(worker_a.best_match(h1, 0), (None, None))
+        self.assertTrue(worker_b.is_stale())
+
+    def test_touch_adopts_signature_of_non_face_write(self):
+        user_id, _ = self.write("INSERT INTO users (face_hash) VALUES (?)", ("00000000000000ff",))
+        index, other = self.new_index(), self.new_index()
+        self.load(index)
+        self.load(other)
+        _, signature = self.write("UPDATE users SET email = ? WHERE id = ?", ("ana@local.test", user_id))
+        self.assertTrue(index.touch(signature))
+        self.assertFalse(index.is_stale())
+        self.assertEqual(index.best_match("00000000000000ff", 0), (user_id, 0))
+        # Un worker que no hizo la escritura sí queda desactualizado
+        self.assertTrue(other.is_stale())
+
+    def test_write_without_signature_marks_index_stale(self):
+        index = self.new_index()
+        self.load(index)
+        user_id, _ = self.write("INSERT INTO users (face_hash) VALUES (?)", ("00000000000000ff",))
+        self.assertFalse(index.upsert(user_id, "00000000000000ff"))
+        self.assertTrue(index.is_stale())
+
+
+class ThreadFaceHashPool(FaceHashPool):
+    """FaceHashPool sobre hilos: los tests reemplazan ``hash_face_timed`` sin lanzar procesos."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executors_created = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+                self.executors_created += 1
+            return self._executor
+
+
+def gated_hash(gate, failures=()):
+    """Reemplazo de ``hash_face_timed`` que espera ``gate``; las primeras llamadas lanzan ``failures``."""
+    failures = list(failures)
+
+    def hash_face_timed(data):
+        if failures:
+            raise failures.pop(0)
+        gate.wait(5)
+        return f"{len(data):016x}", {"image": 0.0, "phash": 0.0, "worker": 0.0}
+
+    return hash_face_timed
+
+
+class PoolTestCase(unittest.IsolatedAsyncioTestCase):
+    """Pools de hilos con caché de pHash propia (desactivada salvo que el test la cambie)."""
+
+    def setUp(self):
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+        self.cache = FaceHashCache(max_bytes=0)
+        patcher = mock.patch("fastapi_auth.face_pool.face_hash_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pool(self, **kwargs):
+        pool = ThreadFaceHashPool(**kwargs)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def gated(self, failures=()):
+        return mock.patch("fastapi_auth.face_pool.hash_face_timed", gated_hash(self.gate, failures))
+
+    async def wait_idle(self, pool):
+        for _ in range(200):
+            if not pool.metrics()["in_flight"]:
+                return
+            await asyncio.sleep(0.01)
+        self.fail("el pool no liberó sus lugares")
+
+
+class AppTestCase(PoolTestCase):
+    """La app de fastapi_auth sobre un user.db temporal, con face_index y pool de hash propios."""
+
+    async def asyncSetUp(self):
+        workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, workdir)
+        self.db_path = workdir / "user.db"
+        engine = create_async_engine(f"sqlite+aiosqlite:///{self.db_path}")
+        self.addAsyncCleanup(engine.dispose)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def temp_async_db():
+            async with sessions() as db:
+                yield db
+
+        app.dependency_overrides[get_async_db] = temp_async_db
+        self.addCleanup(app.dependency_overrides.clear)
+        self.face_index = FaceIndex(path=workdir / "face_index.npz", db_path=self.db_path)
+        self.face_pool = self.pool(workers=2)
+        for target, value in (("fastapi_auth.routers.auth.face_index", self.face_index),
+                              ("fastapi_auth.face_pool.face_pool", self.face_pool)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+
+class FaceHashPoolTests(PoolTestCase):
+    async def test_admission_capped_at_workers_plus_queue(self):
+        pool = self.pool(workers=2, queue_size=3)
+        with self.gated():
+            tasks = [asyncio.create_task(pool.hash(bytes(i + 1))) for i in range(5)]
+            await asyncio.sleep(0)
+            # 2 en los workers y 3 en cola: la sexta imagen se rechaza sin esperar
+            with self.assertRaises(FaceHashBusy):
+                await pool.hash(b"one too many")
+            metrics = pool.metrics()
+            self.assertEqual((metrics["in_flight"], metrics["queue_depth"], metrics["rejected"]), (5, 3, 1))
+            self.gate.set()
+            hashes = await asyncio.gather(*tasks)
+        self.assertEqual(hashes, [f"{i + 1:016x}" for i in range(5)])
+        metrics = pool.metrics()
+        self.assertEqual((metrics["in_flight"], metrics["completed"]), (0, 5))
+        self.assertEqual(metrics["latency_ms"]["total"]["count"], 5)
+
+    async def test_timeout_keeps_slot_until_worker_finishes(self):
+        pool = self.pool(workers=1, queue_size=0, timeout=0.05)
+        with self.gated():
+            with self.assertRaises(FaceHashBusy):
+                await pool.hash(b"slow frame")
+            metrics = pool.metrics()
+            self.assertEqual((metrics["timeouts"], metrics["in_flight"]), (1, 1))
+            with self.assertRaises(FaceHashBusy):
+                await pool.hash(b"next frame")
+            self.gate.set()
+            await self.wait_idle(pool)
+            self.assertEqual(await pool.hash(b"next frame"), f"{len(b'next frame'):016x}")
+
+    async def test_broken_pool_is_rebuilt_on_next_call(self):
+        pool = self.pool(workers=1)
+        self.gate.set()
+        with self.gated(failures=[BrokenProcessPool("worker murió")]):
+            with self.assertRaises(FaceHashBusy):
+                await pool.hash(b"frame")
+            self.assertEqual(pool.metrics()["failures"], 1)
+            self.assertIsNone(pool._executor)
+            self.assertEqual(await pool.hash(b"frame"), f"{len(b'frame'):016x}")
+        self.assertEqual(pool.executors_created, 2)
+        self.assertEqual(pool.metrics()["in_flight"], 0)
+
+    async def test_process_pool_hash_matches_inline(self):
+        data = synthetic_jpeg(128)
+        pool = FaceHashPool(workers=1, queue_size=0, timeout=60)
+        self.addCleanup(pool.shutdown)
+        self.assertEqual(await pool.hash(data), face_hash_from_image(prepare_face_image(data)))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FaceHashCacheTests(unittest.TestCase):
+    def cache(self, entries=8, ttl=120):
+        self.clock = FakeClock()
+        return FaceHashCache(max_bytes=entries * FaceHashCache.ENTRY_BYTES, ttl=ttl, clock=self.clock)
+
+    def test_entries_expire_after_ttl(self):
+        cache = self.cache(ttl=120)
+        key = cache.digest(b"frame")
+        cache.put(key, "00000000000000ff")
+        self.clock.now += 119.9
+        self.assertEqual(cache.get(key), "00000000000000ff")
+        self.clock.now += 0.2
+        self.assertIsNone(cache.get(key))
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"], stats["expired"]), (0, 1, 1, 1))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = self.cache(entries=3)
+        keys = [cache.digest(bytes([i])) for i in range(4)]
+        for i, key in enumerate(keys[:3]):
+            cache.put(key, f"{i:016x}")
+        cache.get(keys[0])
+        cache.put(keys[3], f"{3:016x}")
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual([cache.get(keys[i]) for i in (0, 2, 3)], [f"{i:016x}" for i in (0, 2, 3)])
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["max_entries"], stats["evictions"]), (3, 3, 1))
+        self.assertEqual(stats["approx_bytes"], 3 * FaceHashCache.ENTRY_BYTES)
+
+    def test_stats_count_hits_and_misses(self):
+        cache = self.cache()
+        key = cache.digest(b"frame")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "00000000000000ff")
+        cache.put(cache.digest(b"invalid"), "")
+        for _ in range(3):
+            cache.get(key)
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"], stats["hit_rate"]), (1, 3, 1, 0.75))
+
+    def test_zero_bytes_disables_cache(self):
+        cache = FaceHashCache(max_bytes=0)
+        key = cache.digest(b"frame")
+        cache.put(key, "00000000000000ff")
+        self.assertIsNone(cache.get(key))
+        self.assertEqual((cache.stats()["entries"], cache.stats()["max_entries"]), (0, 0))
+
+
+class CachedFaceHashPoolTests(PoolTestCase):
+    async def test_cached_frame_never_takes_a_pool_slot(self):
+        cache = FaceHashCache()
+        pool = self.pool(workers=1, queue_size=0)
+        cache.put(cache.digest(b"repeated frame"), "00000000000000ff")
+        with mock.patch("fastapi_auth.face_pool.face_hash_cache", cache), self.gated():
+            busy = asyncio.create_task(pool.hash(b"new frame"))
+            await asyncio.sleep(0)
+            # El pool está lleno, pero el frame repetido responde desde la caché
+            self.assertEqual(await pool.hash(b"repeated frame"), "00000000000000ff")
+            with self.assertRaises(FaceHashBusy):
+                await pool.hash(b"another new frame")
+            self.gate.set()
+            computed = await busy
+            # Lo calculado por el pool queda en la caché para el próximo reintento
+            self.assertEqual(await pool.hash(b"new frame"), computed)
+        metrics = pool.metrics()
+        self.assertEqual((metrics["cached"], metrics["completed"], metrics["rejected"]), (2, 1, 1))
+
+
+class FaceHashFormTests(AppTestCase):
+    async def test_full_pool_returns_503_with_retry_after(self):
+        self.face_pool = self.pool(workers=1, queue_size=0)
+        with mock.patch("fastapi_auth.face_pool.face_pool", self.face_pool), self.gated():
+            busy = asyncio.create_task(self.face_pool.hash(b"in the worker"))
+            await asyncio.sleep(0)
+            response = await self.client.post("/auth/login/face", data={"face_image": synthetic_face(64)})
+            self.gate.set()
+            await busy
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "1")
+        self.assertEqual(self.face_pool.metrics()["rejected"], 1)
+
+
+
+class FaceUploadTests(AppTestCase):
+    async def login(self, path, **kwargs):
+        response = await self.client.post(path, **kwargs)
+        self.assertEqual(response.status_code, 200, response.text)
+        me = await self.client.get("/auth/me", params={"token": response.json()["access_token"]})
+        return me.json()["username"]
+
+    async def test_upload_rejects_other_content_types(self):
+        for path in ("/auth/register/upload", "/auth/login/face/upload"):
+            with self.subTest(path=path):
+                response = await self.client.post(
+                    path, data={"username": "ana"}, files={"face_file": ("face.gif", b"GIF89a", "image/gif")},
+                )
+                self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.face_pool.metrics()["completed"], 0)
+
+    async def test_upload_over_max_bytes_returns_413(self):
+        jpeg = synthetic_jpeg(128)
+        with mock.patch("fastapi_auth.face_pool.FACE_IMAGE_MAX_BYTES", len(jpeg) - 1):
+            response = await self.client.post(
+                "/auth/login/face/upload", files={"face_file": ("face.jpg", jpeg, "image/jpeg")},
+            )
+        self.assertEqual(response.status_code, 413)
+        with mock.patch("fastapi_auth.face_pool.FACE_IMAGE_MAX_BYTES", len(jpeg)):
+            response = await self.client.post(
+                "/auth/register/upload", data={"username": "ana"}, files={"face_file": ("face.jpg", jpeg, "image/jpeg")},
+            )
+        self.assertEqual(response.status_code, 201)
+
+    async def test_upload_and_data_url_match_the_same_user(self):
+        # ana se registra con el archivo y beto con el data URL; cada uno entra por los dos caminos
+        response = await self.client.post(
+            "/auth/register/upload", data={"username": "ana"},
+            files={"face_file": ("ana.jpg", synthetic_jpeg(320, seed=1), "image/jpeg")},
+        )
+        self.assertEqual(response.status_code, 201)
+        response = await self.client.post(
+            "/auth/register", data={"username": "beto", "face_image": synthetic_face(320, seed=2)},
+        )
+        self.assertEqual(response.status_code, 201)
+        for username, seed in (("ana", 1), ("beto", 2)):
+            with self.subTest(username=username):
+                self.assertEqual(await self.login(
+                    "/auth/login/face/upload",
+                    files={"face_file": ("face.jpg", synthetic_jpeg(320, seed=seed), "image/jpeg")},
+                ), username)
+                self.assertEqual(await self.login(
+                    "/auth/login/face", data={"face_image": synthetic_face(320, seed=seed)},
+                ), username)
+
+
+
+class DraftDecodeTests(unittest.TestCase):
+    def test_draft_hash_within_two_bits_of_full_decode(self):
+        # Cota documentada en prepare_face_image (FACE_JPEG_DRAFT): a lo sumo 2 bits de diferencia
+        distances = []
+        for seed in range(12):
+            data = synthetic_frame(1280, 720, seed)
+            full = face_hash_from_image(prepare_face_image(data, draft=False))
+            draft = face_hash_from_image(prepare_face_image(data, draft=True))
+            distances.append(hamming_distance(full, draft))
+        self.assertLessEqual(max(distances), 2, distances)
+        # Con draft la imagen sigue siendo la de 256x256 en escala de grises
+        image = prepare_face_image(synthetic_frame(1280, 720), draft=True)
+        self.assertEqual((image.mode, image.size), ("L", FACE_IMAGE_SIZE))
+
+    def test_draft_does_not_change_png(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.open(io.BytesIO(synthetic_frame(1280, 720, seed=5))).save(buffer, format="PNG")
+        data = buffer.getvalue()
+        self.assertEqual(
+            prepare_face_image(data, draft=True).tobytes(), prepare_face_image(data, draft=False).tobytes(),
+        )
+
+
+
+class AuthRouterTests(AppTestCase):
+    async def register(self, username, seed, **fields):
+        response = await self.client.post(
+            "/auth/register", data={"username": username, "face_image": synthetic_face(128, seed), **fields},
+        )
+        self.assertIn(response.status_code, (200, 201), response.text)
+        return response.json()
+
+    async def login(self, seed):
+        return await self.client.post("/auth/login/face", data={"face_image": synthetic_face(128, seed)})
+
+    async def me(self, response):
+        self.assertEqual(response.status_code, 200, response.text)
+        return (await self.client.get("/auth/me", params={"token": response.json()["access_token"]})).json()
+
+    async def test_register_login_me_and_users(self):
+        ana = await self.register("ana", seed=1, email="ana@local.test", dni="111")
+        beto = await self.register("beto", seed=2)
+        self.assertEqual((ana["email"], ana["dni"], ana["role"]), ("ana@local.test", "111", "Usuario"))
+        self.assertEqual((await self.me(await self.login(seed=1)))["id"], ana["id"])
+        self.assertEqual((await self.me(await self.login(seed=2)))["id"], beto["id"])
+        self.assertEqual((await self.login(seed=3)).status_code, 401)
+
+        # Re-registrar el username cambia su rostro sin crear otro usuario
+        self.assertEqual((await self.register("ana", seed=3))["id"], ana["id"])
+        self.assertEqual((await self.me(await self.login(seed=3)))["id"], ana["id"])
+        self.assertEqual((await self.login(seed=1)).status_code, 401)
+
+        response = await self.client.post(
+            "/auth/register", data={"username": "otra", "email": "ana@local.test", "face_image": synthetic_face(128, 4)},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((await self.client.get("/auth/me", params={"token": "basura"})).status_code, 401)
+        users = (await self.client.get("/auth/users")).json()
+        self.assertEqual(sorted(user["username"] for user in users), ["ana", "beto"])
+
+    async def test_update_user(self):
+        ana = await self.register("ana", seed=1)
+        await self.register("beto", seed=2, email="beto@local.test")
+        response = await self.client.put(
+            f"/auth/users/{ana['id']}", json={"username": "ana.m", "email": "ana.m@local.test", "role": "Supervisor"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {key: response.json()[key] for key in ("username", "email", "role")},
+            {"username": "ana.m", "email": "ana.m@local.test", "role": "Supervisor"},
+        )
+        for payload in ({"email": "beto@local.test"}, {"role": "Rey"}):
+            with self.subTest(payload=payload):
+                self.assertEqual((await self.client.put(f"/auth/users/{ana['id']}", json=payload)).status_code, 400)
+        self.assertEqual((await self.client.put("/auth/users/999", json={"role": "CEO"})).status_code, 404)
+        self.assertEqual((await self.me(await self.login(seed=1)))["username"], "ana.m")
+
+    async def test_update_keeps_face_index_in_sync(self):
+        ana = await self.register("ana", seed=1)
+        await self.login(seed=1)
+        self.assertFalse(self.face_index.is_stale())
+        response = await self.client.put(f"/auth/users/{ana['id']}", json={"email": "ana@local.test"})
+        self.assertEqual(response.status_code, 200)
+        # La edición no deja el índice desactualizado ni invalida el .npz de los demás workers
+        self.assertFalse(self.face_index.is_stale())
+        self.assertTrue(FaceIndex(path=self.face_index.path, db_path=self.db_path).load_file())
+        with mock.patch.object(self.face_index, "load_rows") as reload:
+            self.assertEqual((await self.me(await self.login(seed=1)))["email"], "ana@local.test")
+        reload.assert_not_called()
+
+    async def test_delete_users(self):
+        ana = await self.register("ana", seed=1)
+        await self.register("beto", seed=2)
+        await self.register("beto", seed=3, email="beto2@local.test")
+        self.assertEqual((await self.me(await self.login(seed=1)))["id"], ana["id"])
+        self.assertEqual((await self.client.delete("/auth/users/by-username/ana")).status_code, 204)
+        self.assertEqual((await self.login(seed=1)).status_code, 401)
+        self.assertEqual((await self.client.delete("/auth/users/by-username/ana")).status_code, 404)
+        self.assertEqual((await self.client.delete("/auth/users/by-username/beto/all")).status_code, 204)
+        self.assertEqual((await self.login(seed=3)).status_code, 401)
+        self.assertEqual((await self.client.get("/auth/users")).json(), [])
+        self.assertEqual(len(self.face_index), 0)
+
+    async def test_concurrent_logins_reload_index_once(self):
+        ana = await self.register("ana", seed=1)
+        load_rows = self.face_index.load_rows
+
+        def slow_load_rows(rows, signature):
+            # Una recarga lenta: sin el lock, cada login concurrente haría la suya
+            threading.Event().wait(0.05)
+            load_rows(rows, signature)
+
+        # Otro proceso da de alta a beto: el índice de este worker queda desactualizado
+        with sqlite3.connect(self.db_path) as conn:
+            beto_id = conn.execute(
+                "INSERT INTO users (username, dni, email, role, face_hash) VALUES (?, ?, ?, ?, ?)",
+                ("beto", "222", "beto@local.test", "Usuario",
+                 face_hash_from_image(prepare_face_image(synthetic_jpeg(128, seed=2)))),
+            ).lastrowid
+        self.assertTrue(self.face_index.is_stale())
+
+        with mock.patch.object(self.face_index, "load_rows", side_effect=slow_load_rows) as reload:
+            responses = await asyncio.gather(*(self.login(seed=1 + i % 2) for i in range(8)))
+        self.assertEqual(reload.call_count, 1)
+        ids = [(await self.me(response))["id"] for response in responses]
+        self.assertEqual(ids, [ana["id"], beto_id] * 4)
+        self.assertFalse(self.face_index.is_stale())
+
+
+if __name__ == "__main__":
+    unittest.main()
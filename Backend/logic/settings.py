@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -125,6 +126,28 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caché de respuestas de la API (api/cache.py). Backend 'locmem' (por proceso) o
+# 'file' (compartido entre procesos); ambos desalojan por LRU al superar MAX_ENTRIES.
+API_CACHE_BACKEND = os.environ.get('API_CACHE_BACKEND', 'locmem')
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', 3600))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api-responses',
+        'TIMEOUT': API_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 500, 'CULL_FREQUENCY': 10},
+    },
+}
+if API_CACHE_BACKEND == 'file':
+    CACHES['api'].update({
+        'BACKEND': 'api.cache.LRUFileBasedCache',
+        'LOCATION': os.environ.get('API_CACHE_DIR', str(BASE_DIR / '.api_cache')),
+    })
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Solo para desarrollo
 CORS_ALLOW_CREDENTIALS = True